@@ -0,0 +1,89 @@
+""" cp2xlsx row rendering micro-benchmark.
+
+Computes the rows of every rulebase of a synthetic archive once, then times only writing them
+to worksheets with the firewall_row, nat_row and tp_row writers, and reports cells per second.
+Workbook serialization is left out. Run it on two revisions to compare row writers:
+
+    python benchmarks/rows.py -s medium
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import xlsxwriter  # noqa: E402
+
+from main import VERSION, Cp2xlsx  # noqa: E402
+from run import SCENARIOS  # noqa: E402
+from synthetic import generate_archive  # noqa: E402
+
+
+def write_rows(cp: Cp2xlsx, kind: str, rows: list[tuple], low_memory: bool) -> tuple[float, int]:
+    """ Write rows to a new worksheet
+
+    Args:
+        cp (Cp2xlsx): loaded archive
+        kind (str): firewall, nat or tp
+        rows (list[tuple]): entries of the kind's rows method
+        low_memory (bool): constant memory workbook
+
+    Returns:
+        tuple[float, int]: writing time and cells written
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        cp.low_memory = low_memory
+        cp.wb = xlsxwriter.Workbook(str(Path(output_dir) / 'rows.xlsx'), {'constant_memory': low_memory})
+        cp.init_styles()
+        ws = cp.add_worksheet(kind)
+        getattr(cp, f'{kind}_header')(ws)
+        write_row = getattr(cp, f'{kind}_row')
+        cells = cp.metrics.counters['cells']
+        start_time = time.perf_counter()
+        row = 1
+        for entry in rows:
+            row += write_row(ws, row, entry)
+        cp.finish_worksheet(ws, row)
+        elapsed = time.perf_counter() - start_time
+        cells = cp.metrics.counters['cells'] - cells
+        cp.wb.close()
+    return elapsed, cells
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cp2xlsx row rendering benchmark")
+    parser.add_argument("-s", "--scenario", choices=SCENARIOS.keys(), default="medium", help="scenario (default: medium)")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="runs per sheet, median is reported (default: 5)")
+    parser.add_argument("-sm", "--show-members", action="store_true", help="show group members")
+    parser.add_argument("-lm", "--low-memory", action="store_true", help="constant memory xlsx writing")
+    parser.add_argument("--workdir", default=Path(tempfile.gettempdir()) / "cp2xlsx-bench", type=Path, help="directory for generated archives")
+    args = parser.parse_args()
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    params = SCENARIOS[args.scenario]
+    archive = args.workdir / f"{args.scenario}-{'-'.join(str(v) for v in params.values())}.tar.gz"
+    if not archive.exists():
+        print(f"Generating {archive.name}...")
+        generate_archive(str(archive), **params)
+
+    cp = Cp2xlsx.open(str(archive), sm=args.show_members)
+    cp.select_package(cp._packages_[0])
+    cp._cached_groups_ = {}
+    print(f"cp2xlsx {VERSION}, {args.scenario}{' low memory' if args.low_memory else ''}")
+    total_time = total_cells = 0
+    for kind, name, attr in (('firewall', 'Global FW', '_gnet_'), ('firewall', 'Local FW', '_net_'), ('nat', 'NAT table', '_nat_'), ('tp', 'TP table', '_tp_')):
+        rows = list(getattr(cp, f'{kind}_rows')(getattr(cp, attr) or []))
+        runs = [write_rows(cp, kind, rows, args.low_memory) for _ in range(args.repeat)]
+        elapsed = statistics.median(run[0] for run in runs)
+        cells = runs[0][1]
+        total_time += elapsed
+        total_cells += cells
+        print(f"  {name:10} {len(rows):7} rows {cells:9} cells {elapsed:8.3f}s {cells / elapsed:12,.0f} cells/s")
+    print(f"  {'total':10} {'':12} {total_cells:9} cells {total_time:8.3f}s {total_cells / total_time:12,.0f} cells/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+""" cp2xlsx benchmark runner.
+
+Generates synthetic archives (cached in the work directory), converts each one in a fresh
+process and records time of every conversion phase and peak memory. Results are written
+as JSON so runs of different releases can be compared with --compare.
+
+Phases come from Cp2xlsx.metrics:
+    decompress      reading all archive members without parsing them
+    load            whole load_package: decompress, parse and index
+    load_package/*  load_package by archive member, decompression included
+    parse           load - decompress - index
+    index           ObjectStore build time (includes parsing of objects in stream mode)
+    gen_*_sheet     every sheet generator, by sheet name
+    *_rows          rows computed by sheet workers when jobs > 1
+    save_groups_to_files
+    wb.close        xlsxwriter serialization
+    export:FORMAT   csv, jsonl or parquet records of rules and objects
+    where_used      where-used index build (--analyze)
+    address_index   address index build (--analyze)
+    rule_coverage   shadowed and redundant rule detection (--coverage)
+    shard_files     waiting for shard workers (--max-rows with --shard-files)
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import statistics
+import sys
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from main import VERSION, Cp2xlsx, peak_rss  # noqa: E402
+from synthetic import generate_archive  # noqa: E402
+
+
+SCENARIOS = {
+    'small': {'objects': 5000, 'groups': 500, 'depth': 3, 'fanout': 8, 'rules': 1000, 'global_rules': 50, 'nat': 200, 'tp': 50, 'oversized': 0.01},
+    'medium': {'objects': 50000, 'groups': 5000, 'depth': 4, 'fanout': 10, 'rules': 10000, 'global_rules': 200, 'nat': 2000, 'tp': 500, 'oversized': 0.01},
+    'large': {'objects': 150000, 'groups': 15000, 'depth': 5, 'fanout': 12, 'rules': 40000, 'global_rules': 500, 'nat': 5000, 'tp': 2000, 'oversized': 0.005},
+    'deep': {'objects': 20000, 'groups': 4000, 'depth': 20, 'fanout': 6, 'rules': 5000, 'global_rules': 0, 'nat': 100, 'tp': 10, 'oversized': 0.05},
+}
+
+
+def run_once(archive: str, options: dict, analyze: bool = False) -> dict:
+    """ Convert archive once. Runs in a fresh worker process so peak RSS belongs to this run only.
+
+    Args:
+        archive (str): archive path
+        options (dict): Cp2xlsx keyword arguments
+        analyze (bool, optional): build where-used and address indexes too. Defaults to False.
+
+    Returns:
+        dict: phase timings, peak RSS and cache counters
+    """
+    start_time = time.perf_counter()
+    with tarfile.open(archive, 'r:gz') as tar:
+        for member in tar:
+            if member.isfile():
+                with tar.extractfile(member) as f:
+                    while f.read(1 << 20):
+                        pass
+    decompress = time.perf_counter() - start_time
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        start_time = time.perf_counter()
+        cp = Cp2xlsx(archive, output_dir=output_dir, quiet=True, **options)
+        if analyze:
+            cp.analyze()
+        total = time.perf_counter() - start_time
+    phases = {'decompress': decompress}
+    for name, phase in cp.metrics.phases.items():
+        # package phases are named package/phase, a synthetic archive has one package
+        if not name.startswith('load_package'):
+            name = name.split('/', 1)[-1]
+        phases['load' if name == 'load_package' else name] = phase['wall']
+    phases['index'] = cp._store_.build_time
+    phases['total'] = total
+    phases['parse'] = max(phases['load'] - decompress - phases['index'], 0.0)
+    return {
+        'phases': phases,
+        'peak_rss': peak_rss(),
+        'counters': dict(cp.metrics.counters),
+    }
+
+
+def run_scenario(name: str, params: dict, workdir: Path, options: dict, repeat: int, analyze: bool = False) -> dict:
+    """ Generate archive if needed and convert it several times
+
+    Args:
+        name (str): scenario name
+        params (dict): generate_archive parameters
+        workdir (Path): directory for generated archives
+        options (dict): Cp2xlsx keyword arguments
+        repeat (int): number of runs
+        analyze (bool, optional): build where-used and address indexes too. Defaults to False.
+
+    Returns:
+        dict: scenario results with median phase timings
+    """
+    archive = workdir / f"{name}-{'-'.join(str(v) for v in params.values())}.tar.gz"
+    if not archive.exists():
+        print(f"Generating {archive.name}...")
+        generate_archive(str(archive), **params)
+    # spawn gives every run a clean process: no shared caches, own peak RSS
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for i in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            runs.append(executor.submit(run_once, str(archive), options, analyze).result())
+        print(f"{name} run {i + 1}/{repeat}: {runs[-1]['phases']['total']:.2f}s")
+    phases = {phase: statistics.median(run['phases'][phase] for run in runs) for phase in runs[0]['phases']}
+    return {
+        'scenario': name,
+        'params': params,
+        'archive_size': archive.stat().st_size,
+        'median': phases,
+        'peak_rss': max(run['peak_rss'] or 0 for run in runs),
+        'runs': runs,
+    }
+
+
+def print_results(results: list[dict], baseline: dict | None) -> None:
+    """ Print phase table, with ratio to baseline results if given
+
+    Args:
+        results (list[dict]): scenario results
+        baseline (dict | None): earlier results file content
+    """
+    old = {result['scenario']: result for result in baseline['results']} if baseline else {}
+    for result in results:
+        print(f"\n{result['scenario']} ({result['archive_size'] / 2**20:.1f} MiB archive, peak RSS {result['peak_rss'] / 2**20:.0f} MiB)")
+        before = old.get(result['scenario'], {}).get('median', {})
+        for phase, value in result['median'].items():
+            line = f"  {phase:40} {value:9.3f}s"
+            if phase in before and before[phase] > 0:
+                line += f"  was {before[phase]:9.3f}s  x{value / before[phase]:.2f}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cp2xlsx benchmarks")
+    parser.add_argument("-s", "--scenario", action="append", choices=SCENARIOS.keys(), help="scenario to run, may be repeated (default: small)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs per scenario, median is reported (default: 3)")
+    parser.add_argument("-sm", "--show-members", action="store_true", help="show group members")
+    parser.add_argument("-sg", "--save-groups", choices=["no", "policy", "all"], default="no", help="save group members to files")
+    parser.add_argument("-sgf", "--save-groups-format", choices=["txt", "zip", "jsonl"], default="txt", help="saved groups format")
+    parser.add_argument("-lm", "--low-memory", action="store_true", help="constant memory xlsx writing")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes for sheet rows (default: 1)")
+    parser.add_argument("-f", "--format", action="append", choices=["xlsx", "csv", "jsonl", "parquet"], help="output format, may be repeated (default: xlsx)")
+    parser.add_argument("--no-stream", action="store_true", help="parse archive files whole")
+    parser.add_argument("--analyze", action="store_true", help="build where-used and address indexes after converting")
+    parser.add_argument("--no-compact", action="store_true", help="keep whole exported objects in memory")
+    parser.add_argument("--selective", action="store_true", help="read only archive members the outputs need")
+    parser.add_argument("--coverage", action="store_true", help="add the Rule coverage sheet")
+    parser.add_argument("--max-rows", type=int, default=1048576, help="rows per sheet before a rulebase is split")
+    parser.add_argument("--shard-files", action="store_true", help="write parts of split rulebases to workbooks of their own")
+    parser.add_argument("--workdir", default=Path(tempfile.gettempdir()) / "cp2xlsx-bench", type=Path, help="directory for generated archives")
+    parser.add_argument("-o", "--output", type=Path, help="results file (default: results-VERSION-TIMESTAMP.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare with")
+    args = parser.parse_args()
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    options = {'eg': True, 'sm': args.show_members, 'sg': args.save_groups, 'groups_format': args.save_groups_format, 'stream': not args.no_stream, 'low_memory': args.low_memory, 'jobs': args.jobs, 'formats': args.format or ['xlsx'], 'compact': not args.no_compact, 'selective': args.selective, 'coverage': args.coverage, 'max_rows': args.max_rows, 'shard_files': args.shard_files}
+    results = [run_scenario(name, SCENARIOS[name], args.workdir, options, args.repeat, args.analyze) for name in args.scenario or ['small']]
+    report = {
+        'version': VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': options,
+        'results': results,
+    }
+    output = args.output or Path(f"results-{VERSION}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    output.write_text(json.dumps(report, indent=2), encoding="UTF-8")
+    print_results(results, json.loads(args.compare.read_text(encoding="UTF-8")) if args.compare else None)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
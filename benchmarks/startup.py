@@ -0,0 +1,131 @@
+""" cp2xlsx startup benchmark.
+
+Runs quick command lines in fresh interpreters and compares their median wall time with a bare
+interpreter start. Modules each one imports are read from python -X importtime. Exits with 1 if a
+command goes over the startup budget or imports a module it must not, so it can guard a build:
+
+    python benchmarks/startup.py --budget 100
+
+tests/test_startup.py runs the same checks with a budget tolerant of a busy test machine.
+
+Commands:
+    import      import main, as the Python API and worker processes do
+    version     python -m main --version
+    help        python -m main --help
+    inspect     python -m main inspect on the small synthetic archive (no budget, it reads the archive)
+
+Commands run as python -m main: a script given by path is compiled on every start, main.py takes
+about 70 ms, while a module starts from its cached bytecode like a PyInstaller build does.
+"""
+import argparse
+import py_compile
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from synthetic import generate_archive  # noqa: E402
+from run import SCENARIOS  # noqa: E402
+
+
+# modules only conversion, export and serve code paths need
+HEAVY_MODULES = ('xlsxwriter', 'tqdm', 'tarfile', 'json', 'concurrent.futures', 'multiprocessing', 'http.server',
+                 'zipfile', 'csv', 'pickle', 'cProfile', 'pyarrow')
+# inspect reads the archive and index.json, nothing else on the list
+INSPECT_MODULES = ('tarfile', 'json')
+# milliseconds over a bare interpreter start; import main takes 25-35 ms on one core
+DEFAULT_BUDGET = 100.0
+
+
+def run_command(command: list[str], repeat: int) -> tuple[float, set[str]]:
+    """ Run command repeat times in a fresh interpreter
+
+    Args:
+        command (list[str]): arguments after the interpreter
+        repeat (int): number of runs
+
+    Returns:
+        tuple[float, set[str]]: median wall time and modules imported by the last run
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', *command], cwd=ROOT, capture_output=True, text=True)
+        times.append(time.perf_counter() - start_time)
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)} exited with {result.returncode}: {result.stderr[-1000:]}")
+    # import time: self [us] | cumulative | imported package
+    modules = {line.rsplit('|', 1)[1].strip() for line in result.stderr.splitlines() if line.startswith('import time:') and line.count('|') == 2}
+    return statistics.median(times), modules
+
+
+def check_startup(archive: Path, repeat: int, budget: float) -> tuple[float, list[dict]]:
+    """ Time the commands and find the heavy modules they import
+
+    Args:
+        archive (Path): archive for inspect
+        repeat (int): runs per command
+        budget (float): milliseconds a command may take over a bare interpreter start
+
+    Returns:
+        tuple[float, list[dict]]: bare interpreter start, and name, wall time, modules, heavy modules
+            imported and whether it went over the budget of every command
+    """
+    # name, command, budget applies, modules allowed from HEAVY_MODULES
+    commands = [
+        ('import', ['-c', 'import main'], True, ()),
+        ('version', ['-m', 'main', '--version'], True, ()),
+        ('help', ['-m', 'main', '--help'], True, ()),
+        ('inspect', ['-m', 'main', 'inspect', str(archive)], False, INSPECT_MODULES),
+    ]
+    # installed and PyInstaller builds start from bytecode, do not time compiling main.py
+    py_compile.compile(str(ROOT / 'main.py'), doraise=True)
+    bare, _ = run_command(['-c', 'pass'], repeat)
+    results = []
+    for name, command, budgeted, allowed in commands:
+        wall, modules = run_command(command, repeat)
+        results.append({
+            'name': name,
+            'wall': wall,
+            'modules': modules,
+            'heavy': sorted(module for module in HEAVY_MODULES if module in modules and module not in allowed),
+            'over': budgeted and (wall - bare) * 1000 > budget,
+        })
+    return bare, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cp2xlsx startup benchmark")
+    parser.add_argument("-r", "--repeat", type=int, default=10, help="runs per command, median is reported (default: 10)")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help=f"milliseconds a command may take over a bare interpreter start (default: {DEFAULT_BUDGET:.0f})")
+    parser.add_argument("--workdir", default=Path(tempfile.gettempdir()) / "cp2xlsx-bench", type=Path, help="directory for generated archives")
+    args = parser.parse_args()
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    params = SCENARIOS['small']
+    archive = args.workdir / f"small-{'-'.join(str(v) for v in params.values())}.tar.gz"
+    if not archive.exists():
+        print(f"Generating {archive.name}...")
+        generate_archive(str(archive), **params)
+
+    bare, results = check_startup(archive, args.repeat, args.budget)
+    print(f"{'interpreter':12} {bare * 1000:8.1f} ms")
+    failed = 0
+    for result in results:
+        line = f"{result['name']:12} {result['wall'] * 1000:8.1f} ms  +{(result['wall'] - bare) * 1000:7.1f} ms  {len(result['modules'])} modules"
+        if result['over']:
+            line += f"  OVER BUDGET ({args.budget:.0f} ms)"
+        if result['heavy']:
+            line += f"  imports {', '.join(result['heavy'])}"
+        failed += result['over'] or bool(result['heavy'])
+        print(line)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+""" Synthetic ShowPolicyPackage archive generator for cp2xlsx benchmarks.
+
+Archives follow the layout load_package expects: index.json, *objects.json,
+*gateway_objects.json and Network-Global / Network / NAT / Threat Prevention rulebases.
+"""
+import argparse
+import io
+import ipaddress
+import json
+import random
+import tarfile
+import time
+
+
+PACKAGE_NAME = 'Synthetic'
+DOMAIN = 'SMC User'
+
+
+def add_json(archive: tarfile.TarFile, name: str, data) -> None:
+    """ Add JSON document to archive as single-line file
+
+    Args:
+        archive (tarfile.TarFile): archive
+        name (str): member name
+        data: JSON document
+    """
+    payload = json.dumps(data, separators=(',', ':')).encode()
+    info = tarfile.TarInfo(name)
+    info.size = len(payload)
+    info.mtime = int(time.time())
+    archive.addfile(info, io.BytesIO(payload))
+
+
+def read_archive(path: str) -> dict:
+    """ Read JSON documents of an archive, e.g. to edit and write it again with write_archive
+
+    Args:
+        path (str): archive path
+
+    Returns:
+        dict: member name to JSON document
+    """
+    with tarfile.open(path, 'r:*') as archive:
+        return {member.name: json.load(archive.extractfile(member)) for member in archive if member.isfile()}
+
+
+def write_archive(path: str, members: dict) -> None:
+    """ Write JSON documents to archive
+
+    Args:
+        path (str): archive path
+        members (dict): member name to JSON document
+    """
+    with tarfile.open(path, 'w:gz') as archive:
+        for name, data in members.items():
+            add_json(archive, name, data)
+
+
+def gen_objects(rnd: random.Random, objects: int, groups: int, depth: int, fanout: int, huge_groups: int) -> dict:
+    """ Generate object database
+
+    Args:
+        rnd (random.Random): random generator
+        objects (int): number of address and service objects
+        groups (int): number of groups
+        depth (int): group nesting depth
+        fanout (int): members per group
+        huge_groups (int): groups large enough to overflow an xlsx cell
+
+    Returns:
+        dict: objects list and uid pools used by rule generation
+    """
+    result = [
+        {'uid': 'any', 'name': 'Any', 'type': 'CpmiAnyObject'},
+        {'uid': 'accept', 'name': 'Accept', 'type': 'RulebaseAction'},
+        {'uid': 'drop', 'name': 'Drop', 'type': 'RulebaseAction'},
+        {'uid': 'log', 'name': 'Log', 'type': 'Track'},
+        {'uid': 'none', 'name': 'None', 'type': 'Track'},
+        {'uid': 'policy-targets', 'name': 'Policy Targets', 'type': 'Global'},
+        {'uid': 'optimized', 'name': 'Optimized', 'type': 'ThreatProfile'},
+        {'uid': 'ips-protection', 'name': 'IPS protection', 'type': 'threat-protection'},
+    ]
+    hosts, networks, services = [], [], []
+    base = int(ipaddress.IPv4Address('10.0.0.0'))
+    for i in range(objects):
+        kind = i % 10
+        meta = {'meta-info': {'creator': 'admin', 'last-modifier': 'admin', 'lock': 'unlocked'}, 'color': 'black', 'icon': 'Objects/host', 'tags': []}
+        if kind < 6:
+            uid = f'host-{i}'
+            result.append({'uid': uid, 'name': f'host_{i:06d}_srv', 'type': 'host', 'ipv4-address': str(ipaddress.IPv4Address(base + i)), **meta})
+            hosts.append(uid)
+        elif kind < 8:
+            uid = f'net-{i}'
+            mask = rnd.choice([16, 20, 24, 28])
+            subnet = ipaddress.IPv4Network((base + i * 256) & ~((1 << (32 - mask)) - 1))
+            result.append({'uid': uid, 'name': f'net_{i:06d}', 'type': 'network', 'subnet4': str(subnet.network_address), 'mask-length4': mask, **meta})
+            networks.append(uid)
+        elif kind == 8:
+            uid = f'range-{i}'
+            first = base + i * 16
+            result.append({'uid': uid, 'name': f'range_{i:06d}', 'type': 'address-range', 'ipv4-address-first': str(ipaddress.IPv4Address(first)), 'ipv4-address-last': str(ipaddress.IPv4Address(first + 15)), **meta})
+            networks.append(uid)
+        else:
+            uid = f'svc-{i}'
+            proto = rnd.choice(['tcp', 'udp'])
+            port = rnd.randint(1, 65000)
+            port = f'{port}-{port + rnd.randint(1, 500)}' if rnd.random() < 0.1 else str(port)
+            result.append({'uid': uid, 'name': f'{proto}_{port}', 'type': f'service-{proto}', 'port': port, **meta})
+            services.append(uid)
+    addresses = hosts + networks
+
+    # groups are spread over levels, level 0 holds addresses only, higher levels also nest lower ones
+    levels: list[list[str]] = [[] for _ in range(max(depth, 1))]
+    for i in range(groups):
+        level = i % len(levels)
+        uid = f'grp-{i}'
+        members = rnd.sample(addresses, min(fanout, len(addresses)))
+        if level and levels[level - 1]:
+            members += rnd.sample(levels[level - 1], min(max(fanout // 4, 1), len(levels[level - 1])))
+        result.append({'uid': uid, 'name': f'grp_{i:05d}_l{level}', 'type': 'group', 'members': [{'uid': m} for m in members]})
+        levels[level].append(uid)
+
+    # each name is about 30 characters with its address, 1500 of them overflow 32767
+    huge = []
+    for i in range(huge_groups):
+        uid = f'huge-{i}'
+        members = rnd.sample(hosts, min(1500, len(hosts)))
+        result.append({'uid': uid, 'name': f'huge_group_{i}', 'type': 'group', 'members': [{'uid': m} for m in members]})
+        huge.append(uid)
+
+    for i in range(max(len(services) // 20, 1)):
+        members = rnd.sample(services, min(5, len(services)))
+        uid = f'svc-grp-{i}'
+        result.append({'uid': uid, 'name': f'svc_grp_{i}', 'type': 'service-group', 'members': [{'uid': m} for m in members]})
+        services.append(uid)
+
+    return {
+        'objects': result,
+        'addresses': addresses + [g for level in levels for g in level],
+        'services': services or ['any'],
+        'huge': huge,
+    }
+
+
+def pick(rnd: random.Random, pool: list[str], most: int) -> list[str]:
+    """ Pick 1..most random uids, sometimes Any
+
+    Args:
+        rnd (random.Random): random generator
+        pool (list[str]): uids
+        most (int): maximum count
+
+    Returns:
+        list[str]: uids
+    """
+    if rnd.random() < 0.05:
+        return ['any']
+    return rnd.sample(pool, min(rnd.randint(1, most), len(pool)))
+
+
+def gen_access_layer(rnd: random.Random, pools: dict, rules: int, oversized: float, prefix: str) -> list[dict]:
+    """ Generate access rulebase with a section every 100 rules
+
+    Args:
+        rnd (random.Random): random generator
+        pools (dict): uid pools from gen_objects
+        rules (int): number of rules
+        oversized (float): share of rules with a cell over the xlsx limit
+        prefix (str): uid prefix
+
+    Returns:
+        list[dict]: rulebase entries
+    """
+    result = []
+    for i in range(1, rules + 1):
+        if i % 100 == 1:
+            result.append({'uid': f'{prefix}-section-{i}', 'type': 'access-section', 'name': f'Section {i // 100 + 1}'})
+        source = pick(rnd, pools['addresses'], 4)
+        destination = pick(rnd, pools['addresses'], 4)
+        if pools['huge'] and rnd.random() < oversized:
+            (source if rnd.random() < 0.5 else destination).append(rnd.choice(pools['huge']))
+        result.append({
+            'uid': f'{prefix}-rule-{i}',
+            'type': 'access-rule',
+            'rule-number': i,
+            'name': f'rule {i}' if rnd.random() < 0.7 else '',
+            'source': source,
+            'source-negate': rnd.random() < 0.02,
+            'destination': destination,
+            'destination-negate': rnd.random() < 0.02,
+            'vpn': ['any'],
+            'service': pick(rnd, pools['services'], 3),
+            'service-negate': rnd.random() < 0.01,
+            'action': rnd.choice(['accept', 'accept', 'accept', 'drop']),
+            'track': {'type': rnd.choice(['log', 'none'])},
+            'time': ['any'],
+            'install-on': ['policy-targets'],
+            'enabled': rnd.random() < 0.95,
+            'comments': f'ticket #{rnd.randint(1000, 99999)}' if rnd.random() < 0.5 else '',
+            'hits': {'value': rnd.randint(0, 10**9)},
+        })
+    return result
+
+
+def gen_nat_layer(rnd: random.Random, pools: dict, rules: int) -> list[dict]:
+    """ Generate NAT rulebase
+
+    Args:
+        rnd (random.Random): random generator
+        pools (dict): uid pools from gen_objects
+        rules (int): number of rules
+
+    Returns:
+        list[dict]: rulebase entries
+    """
+    result = [{'uid': 'nat-section-auto', 'type': 'nat-section', 'name': 'Automatic Generated Rules'}]
+    for i in range(1, rules + 1):
+        result.append({
+            'uid': f'nat-rule-{i}',
+            'type': 'nat-rule',
+            'rule-number': i,
+            'original-source': rnd.choice(pools['addresses']),
+            'original-destination': rnd.choice(pools['addresses']),
+            'original-service': 'any',
+            'translated-source': rnd.choice(pools['addresses']),
+            'translated-destination': 'any',
+            'translated-service': 'any',
+            'install-on': ['policy-targets'],
+            'enabled': rnd.random() < 0.95,
+            'comments': '',
+        })
+    return result
+
+
+def gen_tp_layer(rnd: random.Random, pools: dict, rules: int) -> list[dict]:
+    """ Generate Threat Prevention rulebase, every fifth entry is an exception
+
+    Args:
+        rnd (random.Random): random generator
+        pools (dict): uid pools from gen_objects
+        rules (int): number of rules and exceptions
+
+    Returns:
+        list[dict]: rulebase entries
+    """
+    result = [{'uid': 'tp-section', 'type': 'threat-section', 'name': 'Threat Prevention'}]
+    rule_number = 0
+    for i in range(1, rules + 1):
+        entry = {
+            'uid': f'tp-{i}',
+            'name': f'tp {i}',
+            'protected-scope': pick(rnd, pools['addresses'], 2),
+            'protected-scope-negate': False,
+            'source': ['any'],
+            'source-negate': False,
+            'destination': pick(rnd, pools['addresses'], 2),
+            'destination-negate': False,
+            'service': ['any'],
+            'service-negate': False,
+            'action': 'optimized',
+            'track': 'log',
+            'install-on': ['policy-targets'],
+            'enabled': True,
+            'comments': '',
+        }
+        if i % 5 == 0 and rule_number:
+            entry.update({'type': 'threat-exception', 'exception-number': i, 'protection-or-site': ['ips-protection']})
+        else:
+            rule_number += 1
+            entry.update({'type': 'threat-rule', 'rule-number': rule_number})
+        result.append(entry)
+    return result
+
+
+def generate_archive(path: str, objects: int = 10000, groups: int = 1000, depth: int = 3, fanout: int = 10,
+                     rules: int = 2000, global_rules: int = 100, nat: int = 500, tp: int = 100,
+                     oversized: float = 0.01, seed: int = 0) -> dict:
+    """ Write synthetic policy package archive
+
+    Args:
+        path (str): archive path
+        objects (int, optional): number of address and service objects. Defaults to 10000.
+        groups (int, optional): number of groups. Defaults to 1000.
+        depth (int, optional): group nesting depth. Defaults to 3.
+        fanout (int, optional): members per group. Defaults to 10.
+        rules (int, optional): Local FW rules. Defaults to 2000.
+        global_rules (int, optional): Global FW rules. Defaults to 100.
+        nat (int, optional): NAT rules. Defaults to 500.
+        tp (int, optional): Threat Prevention rules. Defaults to 100.
+        oversized (float, optional): share of firewall rules with a cell over 32767 characters. Defaults to 0.01.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        dict: generation parameters
+    """
+    params = {'objects': objects, 'groups': groups, 'depth': depth, 'fanout': fanout, 'rules': rules,
+              'global_rules': global_rules, 'nat': nat, 'tp': tp, 'oversized': oversized, 'seed': seed}
+    rnd = random.Random(seed)
+    pools = gen_objects(rnd, objects, groups, depth, fanout, 3 if oversized > 0 else 0)
+    index = {'policyPackages': [{
+        'packageName': PACKAGE_NAME,
+        'objects': {'htmlFileName': f'{PACKAGE_NAME}_objects.html'},
+        'accessLayers': [
+            {'name': 'Network', 'domain': 'Global', 'htmlFileName': 'Network-Global.html'},
+            {'name': 'Network', 'domain': DOMAIN, 'htmlFileName': f'Network-{DOMAIN}.html'},
+        ],
+        'natLayer': {'name': 'NAT', 'domain': DOMAIN, 'htmlFileName': f'NAT-{DOMAIN}.html'},
+        'threatLayers': [{'name': 'Standard Threat Prevention', 'domain': DOMAIN, 'htmlFileName': f'Standard Threat Prevention-{DOMAIN}.html'}],
+    }], 'gatewayObjects': {'htmlFileName': f'{PACKAGE_NAME}_gateway_objects.html'}}
+    with tarfile.open(path, 'w:gz') as archive:
+        add_json(archive, 'index.json', index)
+        add_json(archive, f'{PACKAGE_NAME}_objects.json', pools['objects'])
+        add_json(archive, f'{PACKAGE_NAME}_gateway_objects.json', [{'uid': 'gw-1', 'name': 'gw1', 'type': 'simple-gateway', 'ipv4-address': '192.0.2.1'}])
+        add_json(archive, 'Network-Global.json', gen_access_layer(rnd, pools, global_rules, oversized, 'global'))
+        add_json(archive, f'Network-{DOMAIN}.json', gen_access_layer(rnd, pools, rules, oversized, 'local'))
+        add_json(archive, f'NAT-{DOMAIN}.json', gen_nat_layer(rnd, pools, nat))
+        add_json(archive, f'Standard Threat Prevention-{DOMAIN}.json', gen_tp_layer(rnd, pools, tp))
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic ShowPolicyPackage archive")
+    parser.add_argument("--objects", type=int, default=10000, help="address and service objects")
+    parser.add_argument("--groups", type=int, default=1000, help="groups")
+    parser.add_argument("--depth", type=int, default=3, help="group nesting depth")
+    parser.add_argument("--fanout", type=int, default=10, help="members per group")
+    parser.add_argument("--rules", type=int, default=2000, help="Local FW rules")
+    parser.add_argument("--global-rules", type=int, default=100, help="Global FW rules")
+    parser.add_argument("--nat", type=int, default=500, help="NAT rules")
+    parser.add_argument("--tp", type=int, default=100, help="Threat Prevention rules")
+    parser.add_argument("--oversized", type=float, default=0.01, help="share of firewall rules with a cell over 32767 characters")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("output", help="archive path")
+    args = parser.parse_args()
+    generate_archive(args.output, args.objects, args.groups, args.depth, args.fanout, args.rules,
+                     args.global_rules, args.nat, args.tp, args.oversized, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,232 +1,436 @@
+from __future__ import annotations
+
 import argparse
+import bisect
+import codecs
 import fnmatch
+import importlib.util
+import itertools
+import os
+import re
 import sys
+import threading
 import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
 from pathlib import Path
-import tarfile
-import json
+from typing import TYPE_CHECKING
+
+# xlsxwriter, tqdm, tarfile, json, concurrent.futures, http.server and other modules a code path
+# needs are imported where they are used: quick operations like --help, --version or inspect
+# then start without loading them, see benchmarks/startup.py
+# Type checkers and linters see them through the imports below
+if TYPE_CHECKING:
+    import tarfile
+    from concurrent.futures import Future
 
-import xlsxwriter
-from tqdm import tqdm
+    import xlsxwriter
 
 VERSION = '1.7.2'
 
-class Cp2xlsx:
-    def __init__(self, package: str, eg: bool, sm: bool, sg: str) -> None:
-        self.eg = eg
-        self.sm = sm
-        self.sg = sg
-        self.load_package(package)
-        self.verify_package()
-        self.package_name = self._index_['policyPackages'][0]['packageName']
-        self.wb = xlsxwriter.Workbook(f'{self.package_name}.xlsx')
-        self.init_styles()
-        self._cached_groups_ = {}
-        self._cached_objects_ = {}
-        self._cached_uids_ = {}
-        self.run()
+# layout of pickled cache entries: ObjectStore, CompactObject, GroupClosures, package state (Cp2xlsx.cache_state)
+# and sheet rows (IncrementalRows); bump it with any change to one of them, entries of another layout are never read
+CACHE_FORMAT = 1
 
+# rules in all sheets of a package below which sheet rows are computed in this process only
+PARALLEL_SHEETS_MIN_RULES = 5000
 
-    def run(self):
-        if self.eg:
-            if len(self._gnet_) == 0:
-                print("Global FW is empty.")
-            else:
-                self.gen_firewall_sheet('Global FW', self._gnet_)
-        if len(self._net_) == 0:
-            print("Local FW is empty.")
-        else:
-            self.gen_firewall_sheet('Local FW', self._net_)
-        if len(self._nat_) == 0:
-            print("NAT is empty.")
-        else:
-            self.gen_nat_sheet('NAT table', self._nat_)
-        if len(self._tp_) == 0:
-            print("TP is empty")
-        else:
-            self.gen_tp_sheet('TP table', self._tp_)
-        if self.sg != "no":
-            self.save_groups_to_files()
-        self.wb.close()
+# rows of an xlsx sheet, header included; longer rulebases are split into shards
+XLSX_MAX_ROWS = 1048576
+# columns of an xlsx sheet
+XLSX_MAX_COLS = 16384
+# characters of an xlsx cell, xlsxwriter truncates longer strings
+XLSX_MAX_CELL = 32767
 
+# threads creating group txt files, file creation is latency bound on network shares and scanned hosts
+GROUP_WRITER_THREADS = 16
+# group files written by one thread task
+GROUP_WRITER_BATCH = 256
 
-    def save_groups_to_files(self):
-        # create dir for txt files. empty dir if it exists
-        dir_path = Path(f"./{self.package_name}")
-        if dir_path.exists():
-            if dir_path.is_dir():
-                for file in dir_path.iterdir():
-                    file.unlink()
-            else:
-                dir_path.unlink()
-        else:
-            dir_path.mkdir()
+# archive members with rulebases and the Cp2xlsx attribute each one is loaded into, first match wins
+LAYER_PATTERNS = [
+    ('_gnet_', '*Network-Global*.json'),
+    ('_net_', '*Network*.json'),
+    ('_nat_', '*NAT*.json'),
+    ('_tp_', '*Threat Prevention*.json'),
+]
 
-        groups: list[dict] = []
-        groups_to_iterate = self._cached_groups_ if self.sg == "policy" else self._objects_
-        for obj in tqdm(groups_to_iterate, desc="Parsing groups", ncols=100, bar_format='{desc}\t: |{bar}| {n_fmt:5}/{total_fmt:5} [{elapsed_s:.2f}s]'):
-            if self.sg == "all":
-                obj_decoded = self.find_obj_by_uid(obj["uid"])
-            else:
-                obj_decoded = self.find_obj_by_uid(obj)
-            if 'group' in obj_decoded['type']:
-                group = {}
-                group["name"] = obj_decoded["name"]
-                group["members"] = []
-                for group_member in obj_decoded["members"]:
-                    member = self.object_to_str(group_member["uid"])
-                    group["members"].append(member)
-                groups.append(group)
-
-        for group in tqdm(groups, desc="Saving groups", ncols=100, bar_format='{desc}\t: |{bar}| {n_fmt:5}/{total_fmt:5} [{elapsed_s:.2f}s]'):
-            file_path = dir_path / f"{group["name"]}.txt"
-            with file_path.open("w", encoding="UTF-8") as file:
-                for member in group["members"]:
-                    file.write(member + "\n")
+# kinds of archive members Cp2xlsx loads, matched in this order like LAYER_PATTERNS
+MEMBER_PATTERNS = [
+    ('index', 'index.json'),
+    *LAYER_PATTERNS,
+    ('gateway_objects', '*gateway_objects.json'),
+    ('objects', '*objects.json'),
+]
+# every pattern in one expression, a member name is matched once instead of once per pattern
+MEMBER_KINDS = re.compile('|'.join(f'(?P<{kind}>{fnmatch.translate(os.path.normcase(pattern))})' for kind, pattern in MEMBER_PATTERNS))
 
 
-    def get_filename(self) -> str:
-        """ Get xlsx file name
+def member_kind(name: str) -> str | None:
+    """ Kind of archive member, same result as trying MEMBER_PATTERNS one by one with fnmatch
 
-        Returns:
-            str: file name
+    Args:
+        name (str): member name
+
+    Returns:
+        str | None: kind from MEMBER_PATTERNS, None if the member is not loaded
+    """
+    match = MEMBER_KINDS.match(os.path.normcase(name))
+    return match.lastgroup if match else None
+
+
+@contextmanager
+def open_archive(package: str, checkpoints: Path | None = None) -> Iterator[tarfile.TarFile]:
+    """ Open policy package archive for reading members in any order.
+    With indexed_gzip installed and a checkpoints path given, the gzip stream is read through
+    IndexedGzipFile: checkpoints saved by an earlier scan are imported, so seeking to a member
+    inflates at most one checkpoint interval. Otherwise seeks inflate the stream from its start.
+
+    Args:
+        package (str): archive path
+        checkpoints (Path | None, optional): gzip checkpoint index file, see PackageCache.checkpoints. Defaults to None.
+
+    Yields:
+        tarfile.TarFile: archive
+    """
+    import gzip
+    import tarfile
+    stream = None
+    if checkpoints is not None and importlib.util.find_spec('indexed_gzip') is not None:
+        import indexed_gzip
+        try:
+            stream = indexed_gzip.IndexedGzipFile(package, index_file=str(checkpoints) if checkpoints.exists() else None)
+        except OSError:
+            # damaged or foreign index file, build a new one
+            checkpoints.unlink(missing_ok=True)
+            stream = indexed_gzip.IndexedGzipFile(package)
+    if stream is None:
+        stream = gzip.open(package, 'rb')
+    try:
+        with tarfile.open(fileobj=stream, mode='r:') as archive:
+            yield archive
+    finally:
+        stream.close()
+
+
+def iter_json_array(stream, chunk_size: int = 1 << 16, started: bool = False):
+    """ Incrementally parse elements of a top-level JSON array from a binary stream.
+    Only the element being decoded is held as text. Non-array documents are yielded whole.
+
+    Args:
+        stream: binary file-like object
+        chunk_size (int, optional): read size. Defaults to 64 KiB.
+        started (bool, optional): the opening bracket was already read from stream. Defaults to False.
+
+    Yields:
+        array elements
+    """
+    import json
+    # json.loads shares key strings within a document, keep doing that across elements
+    keys = {}
+    decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: {keys.setdefault(k, k): v for k, v in pairs})
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+    read_size = chunk_size
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n':
+            pos += 1
+        if pos == len(buf) and not eof:
+            data = stream.read(read_size)
+            eof = not data
+            buf = utf8.decode(data, final=eof)
+            pos = 0
+            continue
+        if pos == len(buf):
+            if started:
+                raise json.JSONDecodeError("Unterminated array", buf, pos)
+            return
+        if not started:
+            if buf[pos] != '[':
+                yield json.loads(buf[pos:] + utf8.decode(stream.read(), final=True))
+                return
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == ']':
+            return
+        if buf[pos] == ',':
+            pos += 1
+            continue
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+            # a scalar at the end of the buffer may continue in the next chunk
+            complete = eof or isinstance(value, (dict, list)) or (end < len(buf) and buf[end] in ' \t\r\n,]')
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            data = stream.read(read_size)
+            eof = not data
+            buf = buf[pos:] + utf8.decode(data, final=eof)
+            pos = 0
+            # grow reads so a huge element is not re-parsed once per chunk
+            read_size *= 2
+            continue
+        read_size = chunk_size
+        pos = end
+        yield value
+
+
+# type field of a rulebase entry or object, an escaped quote inside a string value never matches
+TYPE_FIELD = re.compile(rb'"type"\s*:\s*"([^"\\]*)"')
+
+
+def count_types(stream, chunk_size: int = 1 << 20) -> Counter:
+    """ Count type fields of a JSON document without decoding it, see inspect_archive
+
+    Args:
+        stream: binary file-like object
+        chunk_size (int, optional): read size. Defaults to 1 MiB.
+
+    Returns:
+        Counter: type field values and their counts
+    """
+    counts = Counter()
+    tail = b''
+    while chunk := stream.read(chunk_size):
+        data = tail + chunk
+        last = 0
+        for match in TYPE_FIELD.finditer(data):
+            counts[match[1].decode()] += 1
+            last = match.end()
+        # a field cut by the chunk end is matched in the next round, a counted one is not kept
+        tail = data[max(last, len(data) - 256):]
+    return counts
+
+
+def peak_rss() -> int | None:
+    """ Peak resident set size of the current process
+
+    Returns:
+        int: size in bytes or None if the platform does not report it
+    """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + \
+                [(field, ctypes.c_size_t) for field in ('PeakWorkingSetSize', 'WorkingSetSize',
+                    'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage',
+                    'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    return None
+
+
+class Metrics:
+    """ Wall time, CPU time and peak memory of conversion phases plus event counters.
+    Peak RSS of a phase is the process peak when the phase ended.
+    """
+    def __init__(self) -> None:
+        self.phases: dict[str, dict] = {}
+        self.counters: Counter = Counter()
+
+
+    @contextmanager
+    def phase(self, name: str):
+        """ Measure the enclosed block, repeated phases are summed up
+
+        Args:
+            name (str): phase name
         """
-        return self.wb.filename
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            entry = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0, 'peak_rss': None})
+            entry['wall'] += time.perf_counter() - wall
+            entry['cpu'] += time.process_time() - cpu
+            entry['calls'] += 1
+            entry['peak_rss'] = peak_rss()
 
 
-    def verify_package(self) -> None:
-        """ Check if all files from archive were loaded
+    def count(self, name: str, n: int = 1) -> None:
+        """ Increase counter
+
+        Args:
+            name (str): counter name
+            n (int, optional): increment. Defaults to 1.
         """
-        if self._index_ is None:
-            print("File index.json is not found! Check archive integrity.")
-            input("Press Enter to exit.")
-            sys.exit()
-        if self._objects_ is None:
-            print("File *objects.json is not found! Check archive integrity.")
-            input("Press Enter to exit.")
-            sys.exit()
-        if self._gnet_ is None:
-            print("File '*Network-Global*.json' is not found. Skipping Global Firewall table...")
-        if self._net_ is None:
-            print("File '*Network*.json' is not found. Skipping Firewall table...")
-        if self._nat_ is None:
-            print("File '*NAT*.json' is not found. Skipping NAT table...")
-        if self._tp_ is None:
-            print("File '*Threat Prevention*.json' is not found. Skipping Threat Prevention table...")
-        if self._gwobj_ is None:
-            print("File '*gateway_objects.json' is not found.")
+        self.counters[name] += n
 
 
-    def init_styles(self) -> None:
-        """ Init workbook styles
+    def merge(self, other: 'Metrics') -> None:
+        """ Add phases and counters measured elsewhere, e.g. in a worker process
+
+        Args:
+            other (Metrics): metrics to add
         """
-        default = {'valign': 'vcenter', 'border': True}
-        self.style_default = self.wb.add_format(default)
+        for name, theirs in other.phases.items():
+            entry = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0, 'peak_rss': None})
+            entry['wall'] += theirs['wall']
+            entry['cpu'] += theirs['cpu']
+            entry['calls'] += theirs['calls']
+            entry['peak_rss'] = max(entry['peak_rss'] or 0, theirs['peak_rss'] or 0) or None
+        self.counters.update(other.counters)
 
-        title = {**default, **{'font_size': '12', 'bold': True, 'bottom': True, 'align': 'center', 'font_color': 'white', 'bg_color': 'gray'}}
-        self.style_title = self.wb.add_format(title)
 
-        section = {**default, **{'bold': True, 'align': 'center', 'bg_color': 'yellow'}}
-        self.style_section = self.wb.add_format(section)
+    def report(self) -> dict:
+        """ Metrics as a JSON-serializable dict
 
-        placeholder = {**default, **{'bold': True, 'align': 'left', 'bg_color': 'green'}}
-        self.style_placeholder = self.wb.add_format(placeholder)
+        Returns:
+            dict: report
+        """
+        return {
+            'version': VERSION,
+            'phases': self.phases,
+            'counters': dict(sorted(self.counters.items())),
+            'peak_rss': peak_rss(),
+        }
 
-        data = {**default, **{'text_wrap': True, 'align': 'left', 'valign': 'top'}}
-        self.style_data = self.wb.add_format(data)
 
-        data_neg = {**data, **{'font_color': 'red', 'italic': True}}
-        self.style_data_neg = self.wb.add_format(data_neg)
+    def save(self, path: str) -> None:
+        """ Write report to a JSON file
 
-        data_dis = {**data, **{'bg_color': '#c8c8c8'}}
-        self.style_data_dis = self.wb.add_format(data_dis)
+        Args:
+            path (str): file path
+        """
+        import json
+        Path(path).write_text(json.dumps(self.report(), indent=2), encoding="UTF-8")
 
-        data_dis_neg = {**data_neg, **data_dis}
-        self.style_data_dis_neg = self.wb.add_format(data_dis_neg)
 
-        data_temp = {**data, **{'bg_color': '#ffe994'}}
-        self.style_data_temp = self.wb.add_format(data_temp)
+class CompactObject:
+    """ Read-only stand-in for an exported object dict that keeps only the fields the converter reads.
+    Fields live in slots, group members become a tuple of uids and equal uid, name and type
+    strings are stored once, so an object takes a fraction of the memory of its JSON dict.
+    """
+    FIELDS = ('uid', 'name', 'type', 'members', 'ipv4-address', 'subnet4', 'mask-length4',
+              'ipv4-address-first', 'ipv4-address-last', 'ipv6-address', 'subnet6', 'mask-length6',
+              'ipv6-address-first', 'ipv6-address-last', 'port', 'end', 'end-never', 'comments')
+    __slots__ = tuple(field.replace('-', '_') for field in FIELDS)
+    _attrs_ = dict(zip(FIELDS, __slots__))
 
-        data_temp_neg = {**data_neg, **data_temp}
-        self.style_data_temp_neg = self.wb.add_format(data_temp_neg)
+    def __init__(self, obj: dict, strings: dict[str, str]) -> None:
+        for key, value in obj.items():
+            attr = self._attrs_.get(key)
+            if attr is None:
+                continue
+            if key == 'members':
+                value = tuple(strings.setdefault(uid, uid) for uid in (member if isinstance(member, str) else member['uid'] for member in value))
+            elif key in ('uid', 'name', 'type'):
+                value = strings.setdefault(value, value)
+            setattr(self, attr, value)
 
 
-    def get_style(self, enabled: bool=True, temp: bool=False, src_neg: bool=False, dst_neg: bool=False, serv_neg: bool=False, ps_neg: bool=False) -> dict:
-        """Get style for each cell in row
+    @classmethod
+    def project(cls, objects: Iterable[dict]) -> Iterator['CompactObject']:
+        """ Reduce objects one by one as they are parsed
 
         Args:
-            enabled (bool, optional): Is rule enabled?. Defaults to True.
-            temp (bool, optional): Is rule temp?. Defaults to False.
-            src_neg (bool, optional): Is source negated?. Defaults to False.
-            dst_neg (bool, optional): Is destination negated?. Defaults to False.
-            serv_neg (bool, optional): Is service negated?. Defaults to False.
-            ps_neg (bool, optional): Is protection scope negated?. Defaults to False.
+            objects (Iterable[dict]): exported objects
 
-        Returns:
-            dict: Dict of styles for cells
+        Yields:
+            CompactObject: reduced object
         """
-        if enabled:
-            if temp:
-                default = self.style_data_temp
-                src = self.style_data_temp_neg if src_neg else default
-                dst = self.style_data_temp_neg if dst_neg else default
-                serv = self.style_data_temp_neg if serv_neg else default
-                ps = self.style_data_temp_neg if ps_neg else default
-            else:
-                default = self.style_data
-                src = self.style_data_neg if src_neg else default
-                dst = self.style_data_neg if dst_neg else default
-                serv = self.style_data_neg if serv_neg else default
-                ps = self.style_data_neg if ps_neg else default
-        else: # if rule is disabled
-            default = self.style_data_dis
-            src = self.style_data_dis_neg if src_neg else default
-            dst = self.style_data_dis_neg if dst_neg else default
-            serv = self.style_data_dis_neg if serv_neg else default
-            ps = self.style_data_dis_neg if ps_neg else default
-        return {"default": default, "source": src, "destination": dst, "service": serv, "protection-scope": ps}
+        strings: dict[str, str] = {}
+        for obj in objects:
+            yield cls(obj, strings)
+
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, self._attrs_[key])
+        except (KeyError, AttributeError):
+            raise KeyError(key) from None
+
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._attrs_ and hasattr(self, self._attrs_[key])
+
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key, attr in self._attrs_.items() if hasattr(self, attr))
+
+
+    def keys(self) -> list[str]:
+        return list(self)
+
+
+    def items(self) -> list[tuple]:
+        return [(key, self[key]) for key in self]
+
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (CompactObject, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+
+    def __repr__(self) -> str:
+        return f"CompactObject({dict(self.items())!r})"
 
 
-    def load_package(self, package: str) -> None:
-        """ Open policy package archive and load JSONs into memory
+class ObjectStore:
+    """ UID-indexed store of package objects with secondary indexes by type and name
+    """
+    def __init__(self, objects: Iterable[dict] = ()) -> None:
+        self._by_uid_: dict[str, dict] = {}
+        self._by_type_: dict[str, list[dict]] = {}
+        self._by_name_: dict[str, list[dict]] = {}
+        self.build_time = 0.0
+        self.update(objects)
+
+
+    def update(self, objects: Iterable[dict]) -> None:
+        """ Add objects to all indexes
 
         Args:
-            package (str): archive path
+            objects (Iterable[dict]): objects
         """
-        self._index_ = None
-        self._net_ = None
-        self._gnet_ = None
-        self._nat_ = None
-        self._gwobj_ = None
-        self._objects_ = None
-        self._tp_ = None
-        with tarfile.open(package, "r:gz") as archive:
-            for file in archive:
-                if fnmatch.fnmatch(file.name, 'index.json'):
-                    with archive.extractfile(file) as f:
-                        self._index_ = json.loads(f.readline())
-                elif fnmatch.fnmatch(file.name, '*Network-Global*.json'):
-                    with archive.extractfile(file) as f:
-                        self._gnet_ = json.loads(f.readline())
-                elif fnmatch.fnmatch(file.name, '*Network*.json'):
-                    with archive.extractfile(file) as f:
-                        self._net_ = json.loads(f.readline())
-                elif fnmatch.fnmatch(file.name, '*NAT*.json'):
-                    with archive.extractfile(file) as f:
-                        self._nat_ = json.loads(f.readline())
-                elif fnmatch.fnmatch(file.name, '*Threat Prevention*.json'):
-                    with archive.extractfile(file) as f:
-                        self._tp_ = json.loads(f.readline())
-                elif fnmatch.fnmatch(file.name, '*gateway_objects.json'):
-                    with archive.extractfile(file) as f:
-                        self._gwobj_ = json.loads(f.readline())
-                elif fnmatch.fnmatch(file.name, '*objects.json'):
-                    with archive.extractfile(file) as f:
-                        self._objects_ = json.loads(f.readline())
+        start_time = time.perf_counter()
+        for obj in objects:
+            self.add(obj)
+        self.build_time += time.perf_counter() - start_time
 
 
-    def find_obj_by_uid(self, uid: str) -> dict | None:
-        """ Find object by uid
+    def add(self, obj: dict) -> None:
+        """ Add object to all indexes
+
+        Args:
+            obj (dict): object
+        """
+        self._by_uid_[obj['uid']] = obj
+        self._by_type_.setdefault(obj.get('type'), []).append(obj)
+        self._by_name_.setdefault(obj.get('name'), []).append(obj)
+
+
+    def get(self, uid: str) -> dict | None:
+        """ Get object by uid
 
         Args:
             uid (str): object uid
@@ -234,178 +438,3430 @@ class Cp2xlsx:
         Returns:
             dict: object
         """
-        if uid in self._cached_uids_:
-            return self._cached_uids_[uid]
-        for obj in self._objects_:
-            if obj['uid'] == uid:
-                self._cached_uids_[uid] = obj
-                return obj
-        return None
+        return self._by_uid_.get(uid)
 
 
-    def object_to_str(self, uid: str) -> str:
-        """ Represent object with a string
+    def by_type(self, obj_type: str) -> list[dict]:
+        """ Get all objects of type
 
         Args:
-            uid (str): object uid
+            obj_type (str): object type
 
         Returns:
-            str: object representation
+            list: objects
         """
-        if uid in self._cached_objects_:
-            return self._cached_objects_[uid]
-        obj = self.find_obj_by_uid(uid)
-        if not obj:
-            result = "!OBJECT NOT FOUND!"
-            self._cached_objects_[uid] = result
-            return result
+        return self._by_type_.get(obj_type, [])
 
-        if obj['type'] in ['host', 'simple-gateway', 'simple-cluster']:
-            result = f"{obj['name']} / {obj['ipv4-address']}"
-        elif obj['type'] == 'network':
-            result = f"{obj['name']} / {obj['subnet4']}/{obj['mask-length4']}"
-        elif obj['type'] == 'service-tcp':
-            result = f"tcp/{obj['port']}"
-        elif obj['type'] == 'service-udp':
-            result = f"udp/{obj['port']}"
-        elif obj['type'] == 'CpmiAnyObject':
-            result = "Any"
-        elif obj['type'] == 'time':
-            if obj['end-never']:
-                result = obj['name']
-                if obj['comments']:
-                    result += f' ({obj['comments']})'
-            else:
-                result = f"{obj['end']['iso-8601'][:-3].replace('T', ' ')}"
-            
-        else:
-            result = obj['name']
 
-        self._cached_objects_[uid] = result
-        return result
+    def by_name(self, name: str) -> list[dict]:
+        """ Get all objects with name. Names are not unique across domains.
+
+        Args:
+            name (str): object name
 
+        Returns:
+            list: objects
+        """
+        return self._by_name_.get(name, [])
 
-    def objects_to_str(self, uids: list | str) -> list:
-        """ Represent objects in list with a string
 
-        Args:
-            uids (list): list of objects uids
+    def groups(self) -> list[dict]:
+        """ Get all group-like objects (group, group-with-exclusion, service-group, etc.)
 
         Returns:
-            list: list of objects representations
+            list: objects
         """
-        if isinstance(uids, str):
-            uids = [uids]
         result = []
-        for uid in uids:
-            result.append(self.object_to_str(uid))
+        for obj_type, objects in self._by_type_.items():
+            if obj_type and 'group' in obj_type:
+                result.extend(objects)
         return result
 
 
-    @staticmethod
-    def list_to_str(l: list) -> str:
-        """ Convert list to string with new line
-
-        Args:
-            l (list): input list
+    def index_size(self) -> int:
+        """ Approximate memory used by the indexes themselves (objects are not counted)
 
         Returns:
-            str
+            int: size in bytes
         """
-        if not isinstance(l, list):
-            return l
-        return '\n'.join(l)
+        size = sys.getsizeof(self._by_uid_)
+        for index in (self._by_type_, self._by_name_):
+            size += sys.getsizeof(index)
+            for bucket in index.values():
+                size += sys.getsizeof(bucket)
+        return size
 
 
-    def expand_group(self, uids: list | str) -> list[str]:
-        """ Recursively expand group object.
+    def __contains__(self, uid: str) -> bool:
+        return uid in self._by_uid_
 
-        Args:
-            uids (list): list of objects uids
 
-        Returns:
-            list: list of uids of group members
-        """
-        if isinstance(uids, str):
-            uids = [uids]
-        result = []
-        for uid in uids:
-            if not isinstance(uid, str):
-                uid = uid['uid']
-            if uid in self._cached_groups_:
-                if self.sm:
-                    result = result + self._cached_groups_[uid]
-                else:
-                    result = result + [uid]
-                continue
-            obj = self.find_obj_by_uid(uid)
-            if 'group' in obj['type']:
-                expanded = self.expand_group(obj['members'])
-                self._cached_groups_[uid] = expanded
-                if self.sm:
-                    result = result + expanded
-            result = result + [uid]
-        # return result without duplicates
-        return list(dict.fromkeys(result))
+    def __iter__(self):
+        return iter(self._by_uid_.values())
 
 
-    @staticmethod
-    def write(ws: xlsxwriter.workbook.Worksheet, row: int, extra_row: int, col: int, extra_col: int, data: str, format: xlsxwriter.workbook.Format):
-        """ Single function for xlsxwriter merge_range write.
+    def __len__(self) -> int:
+        return len(self._by_uid_)
+
+
+class GroupClosures:
+    """ Transitive membership of groups.
+    An iterative Tarjan pass over the group graph finds groups that contain each other (cycles)
+    once per group and reports them in cycles. Membership is then collected with an iterative
+    walk that visits every nested group once and reuses closures already built for subgroups,
+    so nothing recurses and shared subgroups are not expanded over and over.
+    """
+    def __init__(self, store: ObjectStore) -> None:
+        self._store_ = store
+        self._closures_: dict[str, tuple[str, ...]] = {}
+        self._checked_: set[str] = set()
+        self._cyclic_: set[str] = set()
+        self.cycles: list[list[str]] = []
+
+
+    def is_group(self, uid: str) -> bool:
+        """ Check if object is a group
 
         Args:
-            ws (xlsxwriter.workbook.Worksheet): worksheet
-            row (int): row
-            extra_row (int): merge with extra rows
-            col (int): column
-            extra_col (int): merge with extra columns
-            data (str): data
-            format (xlsxwriter.workbook.Format): format
+            uid (str): object uid
+
+        Returns:
+            bool: True for group-like objects
         """
-        if extra_row or extra_col:
-            ws.merge_range(row, col, row + extra_row, col + extra_col, data, format)
-        else:
-            ws.write(row, col, data, format)
+        obj = self._store_.get(uid)
+        return obj is not None and 'group' in obj['type']
 
 
-    @staticmethod
-    def split_string(string: str) -> list:
-        """ Split string with len() > 32767 to comply with xlsx cell's max len
+    def members(self, uid: str) -> list[str]:
+        """ Direct members of group
 
         Args:
-            string (str): input string
+            uid (str): group uid
 
         Returns:
-            list: list of strings
+            list: list of members uids
         """
-        result = []
-        while len(string) > 32767:
-            last_new_line = string[:32767].rindex('\n')
-            result.append(string[:last_new_line])
-            string = string[last_new_line+1:]
-        result.append(string)
-        return result
+        return [member if isinstance(member, str) else member['uid'] for member in self._store_.get(uid).get('members', [])]
 
 
-    @staticmethod
-    def format_hits(num: int) -> str:
-        ds = [(1e15, 'Q'), (1e12, 'T'), (1e9, 'B'), (1e6, 'M'), (1e3, 'K')]
-        for d in ds:
-            head = num / d[0]
-            if head > 1:
-                return f"{head:.0f}{d[1]}"
-        return str(num)
+    def __contains__(self, uid: str) -> bool:
+        """ Check if closure of the group is already built
+        """
+        return uid in self._closures_
 
 
-    def gen_firewall_sheet(self, name: str, net_table: json) -> None:
-        """Firewall page generation
+    def get(self, uid: str) -> tuple[str, ...]:
+        """ Get uids of all group members, nested groups and their members included
 
         Args:
-            name (str): page name
-            net_table (json): net table object
+            uid (str): group uid
+
+        Returns:
+            tuple: members uids in order of appearance
+        """
+        closure = self._closures_.get(uid)
+        if closure is None:
+            if uid not in self._checked_:
+                self._find_cycles(uid)
+            closure = self._closures_[uid] = tuple(dict.fromkeys(self._expand(uid)))
+        return closure
+
+
+    def mark(self) -> tuple[int, frozenset[str], int]:
+        """ Current extent of closures, checked groups and cycles, see found_since
+
+        Returns:
+            tuple: mark
+        """
+        return len(self._closures_), frozenset(self._checked_), len(self.cycles)
+
+
+    def found_since(self, mark: tuple[int, frozenset[str], int]) -> dict:
+        """ Closures, checked groups and cycles found after mark was taken, for merge
+
+        Args:
+            mark (tuple): result of mark
+
+        Returns:
+            dict: findings
+        """
+        closures, checked, cycles = mark
+        return {
+            'closures': dict(itertools.islice(self._closures_.items(), closures, None)),
+            'checked': self._checked_ - checked,
+            'cycles': self.cycles[cycles:],
+        }
+
+
+    def merge(self, found: dict) -> None:
+        """ Take over findings of another instance over the same store, e.g. of a sheet worker.
+        A cycle is reported once even if both found it: a group is checked with its whole cycle.
+
+        Args:
+            found (dict): result of found_since
+        """
+        for cycle in found['cycles']:
+            if self._checked_.isdisjoint(cycle):
+                self.cycles.append(cycle)
+                self._cyclic_.update(cycle)
+        self._checked_.update(found['checked'])
+        for uid, closure in found['closures'].items():
+            self._closures_.setdefault(uid, closure)
+
+
+    def _find_cycles(self, root: str) -> None:
+        # Tarjan's strongly connected components, groups checked by earlier calls are skipped
+        index = {root: 0}
+        lowlink = {root: 0}
+        stack = [root]
+        on_stack = {root}
+        work = [(root, iter(self.members(root)))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child in self._checked_ or not self.is_group(child):
+                    continue
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(self.members(child))))
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    self._checked_.update(component)
+                    if len(component) > 1 or node in self.members(node):
+                        self.cycles.append(component)
+                        self._cyclic_.update(component)
+
+
+    def _expand(self, root: str) -> list[str]:
+        # depth-first walk, each group is followed by its members, then by the group itself.
+        # Closures of groups on a cycle depend on the entry point and are not reused.
+        result = []
+        visited = {root}
+        work = [(None, iter(self.members(root)))]
+        while work:
+            for member in work[-1][1]:
+                if member in self._closures_ and member not in self._cyclic_:
+                    result.extend(self._closures_[member])
+                elif member not in visited and self.is_group(member):
+                    visited.add(member)
+                    work.append((member, iter(self.members(member))))
+                    break
+                result.append(member)
+            else:
+                group, _ = work.pop()
+                if group is not None:
+                    result.append(group)
+        return result
+
+
+    def __len__(self) -> int:
+        return len(self._closures_)
+
+
+class RowOrderedWorksheet:
+    """ Worksheet proxy for xlsxwriter constant_memory mode.
+    xlsxwriter flushes a row to disk as soon as a later row is written, while merge_range
+    pads every row of the range at once. The proxy buffers writes, merges and set_row calls
+    of one block of rows and emits them strictly in row order when the next block starts.
+    Merges are then registered in Worksheet.merge, which xlsxwriter 3 serializes as is, so
+    the proxy does the checks merge_range would do and refuses other xlsxwriter versions.
+    """
+    def __init__(self, ws: xlsxwriter.workbook.Worksheet) -> None:
+        import xlsxwriter
+        if xlsxwriter.__version__.split('.')[0] != '3' or not isinstance(getattr(ws, 'merge', None), list):
+            raise RuntimeError(f"low memory mode needs xlsxwriter 3, {xlsxwriter.__version__} is installed")
+        self._ws_ = ws
+        self._cells_: dict[tuple[int, int], tuple] = {}
+        self._merges_: list[list[int]] = []
+        self._merged_: set[tuple[int, int]] = set()
+        self._rows_: dict[int, tuple] = {}
+        self._last_row_ = -1
+
+
+    def __getattr__(self, name: str):
+        return getattr(self._ws_, name)
+
+
+    def _next_block(self, first_row: int, last_row: int) -> None:
+        if first_row > self._last_row_:
+            self.flush()
+        self._last_row_ = max(self._last_row_, last_row)
+
+
+    def write(self, row: int, col: int, data, cell_format=None) -> None:
+        self._next_block(row, row)
+        self._cells_[(row, col)] = (data, cell_format, False)
+
+
+    def write_row(self, row: int, col: int, data, cell_format=None) -> int:
+        self._next_block(row, row)
+        for i, value in enumerate(data):
+            self._cells_[(row, col + i)] = (value, cell_format, False)
+        return 0
+
+
+    def merge_range(self, first_row: int, first_col: int, last_row: int, last_col: int, data, cell_format=None) -> None:
+        from xlsxwriter.exceptions import OverlappingRange
+        single_cell = first_row == last_row and first_col == last_col
+        if single_cell or not (0 <= first_row <= last_row < XLSX_MAX_ROWS and 0 <= first_col <= last_col < XLSX_MAX_COLS):
+            raise ValueError(f"invalid merge range {first_row}:{first_col}-{last_row}:{last_col}")
+        cells = [(row, col) for row in range(first_row, last_row + 1) for col in range(first_col, last_col + 1)]
+        # a range starting after the block cannot overlap it, a refused one must not extend it
+        if first_row <= self._last_row_ and not self._merged_.isdisjoint(cells):
+            raise OverlappingRange(f"merge range {first_row}:{first_col}-{last_row}:{last_col} overlaps a previous one")
+        self._next_block(first_row, last_row)
+        self._merged_.update(cells)
+        for cell in cells:
+            self._cells_[cell] = ("", cell_format, True)
+        self._cells_[(first_row, first_col)] = (data, cell_format, False)
+        self._merges_.append([first_row, first_col, last_row, last_col])
+
+
+    def set_row(self, row: int, height=None, cell_format=None, options=None) -> None:
+        self._next_block(row, row)
+        self._rows_[row] = (height, cell_format, options)
+
+
+    def flush(self) -> None:
+        """ Emit buffered block in row order
+        """
+        rows = sorted({row for row, _ in self._cells_} | self._rows_.keys())
+        cells = sorted(self._cells_.items())
+        for row in rows:
+            if row in self._rows_:
+                self._ws_.set_row(row, *self._rows_[row])
+        for (row, col), (data, cell_format, blank) in cells:
+            if blank:
+                self._ws_.write_blank(row, col, data, cell_format)
+            else:
+                self._ws_.write(row, col, data, cell_format)
+        # Every cell of a range is written above, the first with data and the rest blank with the same
+        # format, as merge_range writes them. A range lies inside its block (_next_block), blocks are
+        # disjoint row spans flushed once, and merge_range checked bounds and overlaps within the
+        # block, so no check of Worksheet.merge_range is skipped by registering the ranges directly.
+        self._ws_.merge.extend(self._merges_)
+        self._cells_ = {}
+        self._merges_ = []
+        self._merged_ = set()
+        self._rows_ = {}
+
+
+class IncrementalRows:
+    """ Sheet rows of the previous conversion of a package by rule fingerprint, for incremental runs.
+    A fingerprint digests the rule fields its row is rendered from and the hashes of the objects
+    they reference. A row shows an object as its string, see Cp2xlsx.object_to_str, so that string
+    is what the hash of an object covers; the hash of a group covers its members too, so a change
+    deep inside a group changes the fingerprints of all rules using it while the rest keep theirs.
+    Rule fields are digested by repr: a key order change between exports only costs a re-render.
+    """
+    # fields other than objects rows of a sheet kind read from an entry, see firewall_rows, nat_rows and tp_rows
+    RULE_FIELDS = {
+        'firewall': ('uid', 'type', 'rule-number', 'name', 'hits', 'comments', 'enabled', 'source-negate', 'destination-negate', 'service-negate'),
+        'nat': ('uid', 'type', 'rule-number', 'name', 'comments', 'enabled'),
+        'tp': ('uid', 'type', 'rule-number', 'exception-number', 'name', 'comments', 'enabled', 'source-negate', 'destination-negate',
+               'service-negate', 'protected-scope-negate'),
+    }
+    # fields with objects, in the order rows render them
+    OBJECT_FIELDS = {
+        'firewall': ('time', 'source', 'destination', 'vpn', 'service', 'install-on', 'action', 'track'),
+        'nat': ('original-source', 'original-destination', 'original-service', 'translated-source', 'translated-destination',
+                'translated-service', 'install-on'),
+        'tp': ('protection-or-site', 'protected-scope', 'source', 'destination', 'service', 'install-on', 'action', 'track'),
+    }
+
+    def __init__(self, closures: GroupClosures, object_to_str: Callable[[str], str], previous: dict[bytes, tuple] | None = None) -> None:
+        self._closures_ = closures
+        self._object_to_str_ = object_to_str
+        self._previous_ = previous or {}
+        # rows of this run, they replace the previous ones when saved
+        self.rows: dict[bytes, tuple] = {}
+        self._own_hashes_: dict[str, bytes] = {}
+        self._hashes_: dict[str, bytes] = {}
+        self.reused = 0
+        self.rendered = 0
+
+
+    def own_hash(self, uid: str) -> bytes:
+        """ Hash of an object as a row shows it, members of a group are left out
+
+        Args:
+            uid (str): object uid
+
+        Returns:
+            bytes: hash
+        """
+        import hashlib
+        value = self._own_hashes_.get(uid)
+        if value is None:
+            kind = 'group' if self._closures_.is_group(uid) else 'object'
+            value = self._own_hashes_[uid] = hashlib.blake2b(f"{kind}:{self._object_to_str_(uid)}".encode(), digest_size=16).digest()
+        return value
+
+
+    def object_hash(self, uid: str) -> bytes:
+        """ Hash of an object and, for a group, of everything nested in it.
+        Nested groups are walked depth first and a group is hashed with the hashes of its direct members,
+        so every group is hashed once. Groups that contain each other are hashed with their whole closure.
+
+        Args:
+            uid (str): object uid
+
+        Returns:
+            bytes: hash
+        """
+        import hashlib
+        hashes = self._hashes_
+        value = hashes.get(uid)
+        if value is not None:
+            return value
+        if not self._closures_.is_group(uid):
+            value = hashes[uid] = self.own_hash(uid)
+            return value
+        path = [uid]
+        on_path = {uid}
+        cyclic = set()
+        work = [iter(self._closures_.members(uid))]
+        while work:
+            for member in work[-1]:
+                if member in hashes:
+                    continue
+                if member in on_path:
+                    cyclic.update(path[path.index(member):])
+                elif self._closures_.is_group(member):
+                    path.append(member)
+                    on_path.add(member)
+                    work.append(iter(self._closures_.members(member)))
+                    break
+                else:
+                    hashes[member] = self.own_hash(member)
+            else:
+                work.pop()
+                group = path.pop()
+                on_path.discard(group)
+                if group in cyclic:
+                    members = b''.join(self.own_hash(member) for member in self._closures_.get(group))
+                else:
+                    members = b''.join(hashes[member] for member in self._closures_.members(group))
+                hashes[group] = hashlib.blake2b(self.own_hash(group) + members, digest_size=16).digest()
+        return hashes[uid]
+
+
+    def fingerprint(self, kind: str, entry: dict) -> tuple[bytes, list[str]]:
+        """ Fingerprint of a rulebase entry
+
+        Args:
+            kind (str): firewall, nat or tp
+            entry (dict): rulebase entry
+
+        Returns:
+            tuple[bytes, list[str]]: fingerprint and uids of the objects the entry references, in the order rows render them
+        """
+        import hashlib
+        content = [entry.get(field, ...) for field in self.RULE_FIELDS[kind]]
+        uids = []
+        for field in self.OBJECT_FIELDS[kind]:
+            value = entry.get(field, ...)
+            content.append(value)
+            if value is not ...:
+                uids.extend(WhereUsedIndex.uids(value))
+        hashes = self._hashes_
+        references = b''.join(hashes.get(uid) or self.object_hash(uid) for uid in uids)
+        return hashlib.blake2b(f"{kind}{content!r}".encode() + references, digest_size=16).digest(), uids
+
+
+    def get(self, key: bytes) -> tuple | None:
+        """ Row with this fingerprint rendered by this run, for another output format, or by the previous one
+
+        Args:
+            key (bytes): fingerprint
+
+        Returns:
+            tuple | None: row, None if the rule is new or changed
+        """
+        row = self.rows.get(key) or self._previous_.get(key)
+        if row is None:
+            self.rendered += 1
+        else:
+            self.reused += 1
+        return row
+
+
+    def put(self, key: bytes, row: tuple) -> None:
+        """ Keep row of this run
+
+        Args:
+            key (bytes): fingerprint
+            row (tuple): row
+        """
+        self.rows[key] = row
+
+
+class PackageCache:
+    """ On-disk cache of parsed policy package archives.
+    Entries are pickles keyed by the archive's SHA-256, the tool version and CACHE_FORMAT,
+    gzip checkpoint indexes of archives are kept next to them.
+    The least recently used entries are removed when the cache grows over max_size.
+    Loading a pickle can run code: cache_dir must not be writable by other users.
+    """
+    def __init__(self, cache_dir: str | None = None, max_size: int = 1024 * 2**20) -> None:
+        self.cache_dir = Path(cache_dir) if cache_dir else self.default_dir()
+        self.max_size = max_size
+
+
+    @staticmethod
+    def default_dir() -> Path:
+        """ Per-user cache directory
+
+        Returns:
+            Path: directory path
+        """
+        if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+            return Path(os.environ['LOCALAPPDATA']) / 'cp2xlsx' / 'cache'
+        if os.environ.get('XDG_CACHE_HOME'):
+            return Path(os.environ['XDG_CACHE_HOME']) / 'cp2xlsx'
+        return Path.home() / '.cache' / 'cp2xlsx'
+
+
+    @staticmethod
+    def key(package: str, variant: str = '') -> str:
+        """ Cache key of archive
+
+        Args:
+            package (str): archive path
+            variant (str, optional): suffix for states of the archive loaded another way. Defaults to ''.
+
+        Returns:
+            str: key
+        """
+        import hashlib
+        digest = hashlib.sha256()
+        with open(package, 'rb') as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+        return f"{digest.hexdigest()}-{VERSION}-{CACHE_FORMAT}{variant}"
+
+
+    def load(self, key: str) -> dict | None:
+        """ Load cached state
+
+        Args:
+            key (str): cache key
+
+        Returns:
+            dict: state or None on cache miss
+        """
+        import pickle
+        path = self.cache_dir / f"{key}.pickle"
+        try:
+            with path.open('rb') as f:
+                state = pickle.load(f)
+            # mtime is the LRU timestamp
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        return state
+
+
+    def save(self, key: str, state: dict) -> None:
+        """ Store state and evict least recently used entries over the size cap
+
+        Args:
+            key (str): cache key
+            state (dict): state
+        """
+        import pickle
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.cache_dir / f"{key}.pickle"
+        tmp_path = path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        with tmp_path.open('wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+
+    def checkpoints(self, key: str) -> Path:
+        """ Path of gzip checkpoint index of archive, see open_archive
+
+        Args:
+            key (str): cache key of archive
+
+        Returns:
+            Path: index file path, it may not exist
+        """
+        path = self.cache_dir / f"{key}.gzidx"
+        if path.exists():
+            os.utime(path)
+        return path
+
+
+    def save_checkpoints(self, key: str, stream) -> None:
+        """ Store gzip checkpoints of an archive read to its end and evict entries over the size cap
+
+        Args:
+            key (str): cache key of archive
+            stream: indexed_gzip.IndexedGzipFile the archive was read through
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.cache_dir / f"{key}.gzidx"
+        tmp_path = path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        stream.export_index(str(tmp_path))
+        os.replace(tmp_path, path)
+        self.evict()
+
+
+    def evict(self) -> None:
+        """ Remove least recently used entries until the cache fits max_size
+        """
+        entries = []
+        for path in itertools.chain(self.cache_dir.glob('*.pickle'), self.cache_dir.glob('*.gzidx')):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+class MemoryPackageCache(PackageCache):
+    """ PackageCache keeping parsed states in memory for a long-running process.
+    At most max_entries states are kept, least recently used are dropped first. States
+    missing in memory are looked up on disk, new ones are written there once when persist is set.
+    """
+    def __init__(self, cache_dir: str | None = None, max_size: int = 1024 * 2**20, max_entries: int = 8, persist: bool = True) -> None:
+        super().__init__(cache_dir, max_size)
+        self.max_entries = max_entries
+        self.persist = persist
+        self._states_: OrderedDict[str, dict] = OrderedDict()
+        self._lock_ = threading.Lock()
+
+
+    def load(self, key: str) -> dict | None:
+        with self._lock_:
+            state = self._states_.get(key)
+            if state is not None:
+                self._states_.move_to_end(key)
+                return state
+        state = super().load(key) if self.persist else None
+        if state is not None:
+            self.remember(key, state)
+        return state
+
+
+    def save(self, key: str, state: dict) -> None:
+        # a state grown in memory (more group closures) is not written to disk again
+        if not self.remember(key, state) and self.persist:
+            super().save(key, state)
+
+
+    def remember(self, key: str, state: dict) -> bool:
+        """ Keep state in memory, dropping least recently used states over max_entries
+
+        Args:
+            key (str): cache key
+            state (dict): state
+
+        Returns:
+            bool: True if a state was kept under this key already
+        """
+        with self._lock_:
+            known = key in self._states_
+            self._states_[key] = state
+            self._states_.move_to_end(key)
+            while len(self._states_) > self.max_entries:
+                self._states_.popitem(last=False)
+            return known
+
+
+    def entries(self) -> int:
+        """ Number of states in memory
+
+        Returns:
+            int: states
+        """
+        return len(self._states_)
+
+
+class WhereUsedIndex:
+    """ Reverse index of objects: groups containing them, transitively, and rule cells referencing them
+    """
+    # rulebase attribute: sheet name and rule fields with objects
+    RULE_FIELDS = {
+        '_gnet_': ('Global FW', ('source', 'destination', 'vpn', 'service', 'action', 'track', 'time', 'install-on')),
+        '_net_': ('Local FW', ('source', 'destination', 'vpn', 'service', 'action', 'track', 'time', 'install-on')),
+        '_nat_': ('NAT table', ('original-source', 'original-destination', 'original-service',
+                                'translated-source', 'translated-destination', 'translated-service', 'install-on')),
+        '_tp_': ('TP table', ('protected-scope', 'source', 'destination', 'protection-or-site', 'service', 'action', 'track', 'install-on')),
+    }
+    # objects every policy references implicitly, they are never reported unused
+    BUILTIN_TYPES = ('CpmiAnyObject', 'RulebaseAction', 'Track', 'Global')
+
+    def __init__(self, objects: Iterable[dict], packages: list[dict], gateways: Iterable[dict] = ()) -> None:
+        start_time = time.perf_counter()
+        self._objects_: dict[str, dict] = {}
+        self._gateways_: set[str] = set()
+        self._parents_: dict[str, list[str]] = {}
+        self._refs_: dict[str, list[tuple]] = {}
+        for obj in objects:
+            self.add(obj)
+        for obj in gateways:
+            if obj['uid'] not in self._objects_:
+                self._gateways_.add(obj['uid'])
+                self.add(obj)
+        order = 0
+        for package in packages:
+            for attr, (sheet, fields) in self.RULE_FIELDS.items():
+                for entry in package.get(attr) or []:
+                    if entry['type'] in ('place-holder', 'access-section', 'nat-section', 'threat-section'):
+                        continue
+                    order += 1
+                    if entry['type'] == 'threat-exception':
+                        rule_number = 'E' + str(entry['exception-number'])
+                    else:
+                        rule_number = str(entry['rule-number'])
+                    for position, field in enumerate(fields):
+                        for uid in dict.fromkeys(self.uids(entry.get(field))):
+                            self._refs_.setdefault(uid, []).append(
+                                ((order, position), package['packageName'], sheet, rule_number, entry.get('name', ''), field, entry.get(f'{field}-negate', False)))
+        self.build_time = time.perf_counter() - start_time
+
+
+    def add(self, obj: dict) -> None:
+        """ Add object, first one with the uid wins
+
+        Args:
+            obj (dict): object
+        """
+        uid = obj['uid']
+        if uid in self._objects_:
+            return
+        self._objects_[uid] = obj
+        if 'group' in obj['type']:
+            for member in self.members(uid):
+                self._parents_.setdefault(member, []).append(uid)
+
+
+    @classmethod
+    def uids(cls, value) -> list[str]:
+        """ Object uids of a rule cell: uid, object, list of them or track settings
+
+        Args:
+            value: rule field value
+
+        Returns:
+            list: uids
+        """
+        if isinstance(value, str):
+            return [value]
+        if isinstance(value, (list, tuple)):
+            return [uid for item in value for uid in cls.uids(item)]
+        if isinstance(value, dict):
+            if 'uid' in value:
+                return [value['uid']]
+            return cls.uids(value.get('type'))
+        return []
+
+
+    def get(self, uid: str) -> dict | None:
+        """ Get object by uid
+
+        Args:
+            uid (str): object uid
+
+        Returns:
+            dict: object
+        """
+        return self._objects_.get(uid)
+
+
+    def members(self, uid: str) -> list[str]:
+        """ Direct members of group
+
+        Args:
+            uid (str): group uid
+
+        Returns:
+            list: members uids
+        """
+        return [member if isinstance(member, str) else member['uid'] for member in self._objects_[uid].get('members', [])]
+
+
+    def containing_groups(self, uids: Iterable[str]) -> dict[str, str]:
+        """ Groups containing any of the objects, directly or through nested groups
+
+        Args:
+            uids (Iterable[str]): objects uids
+
+        Returns:
+            dict[str, str]: group uid and the object of uids it was reached from, nearest groups first
+        """
+        origin = {uid: uid for uid in uids}
+        groups = {}
+        work = list(origin)
+        while work:
+            level = []
+            for uid in work:
+                for parent in self._parents_.get(uid, []):
+                    if parent not in origin:
+                        origin[parent] = groups[parent] = origin[uid]
+                        level.append(parent)
+            work = level
+        return groups
+
+
+    def references(self, uid: str) -> list[tuple]:
+        """ Rule cells referencing the object directly
+
+        Args:
+            uid (str): object uid
+
+        Returns:
+            list: (policy order, package, sheet, rule number, rule name, field, negated)
+        """
+        return self._refs_.get(uid, [])
+
+
+    def where_used(self, uid: str) -> dict:
+        """ Groups containing the object and rule cells referencing it, directly or through those groups
+
+        Args:
+            uid (str): object uid
+
+        Returns:
+            dict: groups uids and rules as dicts with package, sheet, rule number, rule name,
+                field, negated and the group the rule references the object through (None if direct)
+        """
+        groups = self.containing_groups([uid])
+        rules = []
+        for ref_uid in [uid, *groups]:
+            for order, package, sheet, rule_number, name, field, negated in self.references(ref_uid):
+                rules.append((order, {
+                    'package': package,
+                    'sheet': sheet,
+                    'rule': rule_number,
+                    'name': name,
+                    'field': field,
+                    'negated': negated,
+                    'via': ref_uid if ref_uid != uid else None,
+                }))
+        rules.sort(key=lambda rule: rule[0])
+        return {'groups': list(groups), 'rules': [rule for _, rule in rules]}
+
+
+    def used(self) -> set[str]:
+        """ Objects referenced by rules, directly or as members of referenced groups
+
+        Returns:
+            set: uids
+        """
+        used = set(self._refs_)
+        work = [uid for uid in used if uid in self._objects_ and 'group' in self._objects_[uid]['type']]
+        while work:
+            for member in self.members(work.pop()):
+                if member not in used:
+                    used.add(member)
+                    if member in self._objects_ and 'group' in self._objects_[member]['type']:
+                        work.append(member)
+        return used
+
+
+    def unused(self) -> tuple[list[str], list[str]]:
+        """ Objects and groups no rule uses, directly or through groups. Gateways are not reported.
+
+        Returns:
+            tuple[list[str], list[str]]: uids of unused objects and of unused groups
+        """
+        used = self.used()
+        objects = []
+        groups = []
+        for uid, obj in self._objects_.items():
+            if uid in used or uid in self._gateways_ or obj['type'] in self.BUILTIN_TYPES:
+                continue
+            (groups if 'group' in obj['type'] else objects).append(uid)
+        return objects, groups
+
+
+    def __iter__(self):
+        return iter(self._objects_.values())
+
+
+    def __len__(self) -> int:
+        return len(self._objects_)
+
+
+class AddressIndex:
+    """ Index of address objects, answers which rules reference an address directly or through groups.
+    Hosts and networks are kept by prefix, so objects containing a queried address are found with
+    one lookup per prefix length. Objects inside a queried prefix are found by bisecting sorted
+    interval starts. Address ranges are not aligned to prefixes and are scanned.
+    """
+    # rule fields with network objects
+    NETWORK_FIELDS = ('source', 'destination', 'protected-scope', 'original-source', 'original-destination',
+                      'translated-source', 'translated-destination')
+
+    def __init__(self, where_used: WhereUsedIndex) -> None:
+        start_time = time.perf_counter()
+        self._where_used_ = where_used
+        self._prefixes_: dict[tuple[int, int, int], list[str]] = {}
+        self._starts_: dict[int, tuple[list[int], list[tuple[int, str]]]] = {}
+        self._ranges_: list[tuple[int, int, int, str]] = []
+        self._any_: list[str] = []
+        intervals = {4: [], 6: []}
+        for obj in where_used:
+            uid = obj['uid']
+            if obj['type'] == 'CpmiAnyObject':
+                self._any_.append(uid)
+            for version, first, last, prefixlen in self.intervals(obj):
+                intervals[version].append((first, last, uid))
+                if prefixlen is None:
+                    self._ranges_.append((version, first, last, uid))
+                else:
+                    self._prefixes_.setdefault((version, first, prefixlen), []).append(uid)
+        for version, items in intervals.items():
+            items.sort()
+            self._starts_[version] = ([first for first, _, _ in items], [(last, uid) for _, last, uid in items])
+        self.build_time = time.perf_counter() - start_time
+
+
+    @staticmethod
+    def intervals(obj: dict) -> list[tuple[int, int, int, int | None]]:
+        """ Addresses of object as integer intervals
+
+        Args:
+            obj (dict): object
+
+        Returns:
+            list: (IP version, first, last, prefix length or None for address ranges)
+        """
+        import ipaddress
+        result = []
+        for version, bits in ((4, 32), (6, 128)):
+            try:
+                if f'ipv{version}-address' in obj:
+                    address = int(ipaddress.ip_address(obj[f'ipv{version}-address']))
+                    result.append((version, address, address, bits))
+                if f'subnet{version}' in obj:
+                    network = ipaddress.ip_network(f"{obj[f'subnet{version}']}/{obj[f'mask-length{version}']}", strict=False)
+                    result.append((version, int(network.network_address), int(network.broadcast_address), network.prefixlen))
+                if f'ipv{version}-address-first' in obj:
+                    first = int(ipaddress.ip_address(obj[f'ipv{version}-address-first']))
+                    last = int(ipaddress.ip_address(obj[f'ipv{version}-address-last']))
+                    result.append((version, min(first, last), max(first, last), None))
+            except (KeyError, ValueError):
+                # empty or malformed address, e.g. a host with IPv6 address only
+                continue
+        return result
+
+
+    def find_objects(self, address: str, include_any: bool = True) -> list[str]:
+        """ Find address objects overlapping an address or prefix
+
+        Args:
+            address (str): IPv4/IPv6 address or prefix, e.g. 10.1.2.3 or 10.1.0.0/16
+            include_any (bool, optional): include Any objects. Defaults to True.
+
+        Raises:
+            ValueError: address is not valid
+
+        Returns:
+            list: objects uids
+        """
+        import ipaddress
+        network = ipaddress.ip_network(address.strip(), strict=False)
+        version = network.version
+        bits = network.max_prefixlen
+        first = int(network.network_address)
+        last = int(network.broadcast_address)
+        found = {}
+        # hosts and networks containing the query
+        for prefixlen in range(network.prefixlen + 1):
+            key = (version, first >> (bits - prefixlen) << (bits - prefixlen), prefixlen)
+            for uid in self._prefixes_.get(key, []):
+                found[uid] = True
+        # everything starting inside the query
+        starts, items = self._starts_[version]
+        for i in range(bisect.bisect_left(starts, first), bisect.bisect_right(starts, last)):
+            found[items[i][1]] = True
+        for range_version, range_first, range_last, uid in self._ranges_:
+            if range_version == version and range_first <= last and range_last >= first:
+                found[uid] = True
+        if include_any:
+            found.update(dict.fromkeys(self._any_, True))
+        return list(found)
+
+
+    def query(self, address: str, include_any: bool = True) -> list[dict]:
+        """ Find rules referencing an address or prefix through any object or group containing it
+
+        Args:
+            address (str): IPv4/IPv6 address or prefix, e.g. 10.1.2.3 or 10.1.0.0/16
+            include_any (bool, optional): include rules matching it through Any. Defaults to True.
+
+        Raises:
+            ValueError: address is not valid
+
+        Returns:
+            list[dict]: matches in policy order: package, sheet, rule number, rule name, field,
+                negated, object referenced by the rule and the address object it contains
+        """
+        # groups remember the address object they were reached from
+        via = {uid: uid for uid in self.find_objects(address, include_any)}
+        via.update(self._where_used_.containing_groups(via))
+        matches = []
+        for uid, address_uid in via.items():
+            for order, package, sheet, rule_number, name, field, negated in self._where_used_.references(uid):
+                if field not in self.NETWORK_FIELDS:
+                    continue
+                if uid in self._any_ and field.startswith('translated-'):
+                    # Any in translated fields of NAT rules means the original is kept
+                    continue
+                matches.append((order, {
+                    'package': package,
+                    'sheet': sheet,
+                    'rule': rule_number,
+                    'name': name,
+                    'field': field,
+                    'negated': negated,
+                    'object': self._where_used_.get(uid)['name'],
+                    'via': self._where_used_.get(address_uid)['name'],
+                }))
+        matches.sort(key=lambda match: match[0])
+        return [match for _, match in matches]
+
+
+    def __len__(self) -> int:
+        return sum(len(starts) for starts, _ in self._starts_.values())
+
+
+class RuleCoverage:
+    """ Firewall rules no connection can reach because earlier rules match all of it.
+    Source and destination become sets of address intervals (IPv6 after IPv4 on one axis), services
+    sets of tcp/udp port intervals, groups are flattened and objects without addresses or ports are
+    compared by uid. A rule is shadowed when an earlier rule with another action covers it, redundant
+    when the covering rule has the same action, and fully covered when no single rule does but earlier
+    rules covering it in two fields together cover the third.
+
+    Candidates come from a sweep over interval endpoints of each field: it keeps the bitset of rules
+    containing the current point, and a rule covering another contains all of its endpoints. Bitsets
+    of the fields are intersected and only the remaining candidates are compared exactly, so the work
+    follows the number of intervals and findings rather than the number of rule pairs.
+    Rulebases are (sheet name, entries) pairs in the order rules are matched. Disabled rules, inline
+    layers and rules with negated services or negated objects without addresses are left out.
+    """
+    # a field set is None for Any, else interval starts, interval ends and opaque uids
+    ADDRESS_LAST = (1 << 32) + (1 << 128) - 1
+    UDP_OFFSET = 65536
+    PORT = re.compile(r'^\s*(?:(\d+)\s*-\s*(\d+)|([<>]=?)?\s*(\d+))\s*$')
+    FIELDS = ('source', 'destination', 'service')
+
+    def __init__(self, store: ObjectStore, closures: GroupClosures, rulebases: list[tuple[str, list]]) -> None:
+        start_time = time.perf_counter()
+        self._store_ = store
+        self._closures_ = closures
+        self._sets_: dict[tuple, tuple | None] = {}
+        self.skipped = 0
+        self.candidates = 0
+        self.rules: list[dict] = []
+        rules = []
+        for sheet, entries in rulebases:
+            for entry in entries:
+                if entry['type'] != 'access-rule' or not entry['enabled'] or 'inline-layer' in entry:
+                    continue
+                fields = self.rule_fields(entry)
+                if fields is None:
+                    self.skipped += 1
+                    continue
+                rules.append((sheet, entry, fields))
+        self.rules = [{'sheet': sheet, 'rule': str(entry['rule-number']), 'name': entry.get('name', ''),
+                       'action': self.name(entry['action'])} for sheet, entry, _ in rules]
+        self.findings = self.find(rules)
+        self.build_time = time.perf_counter() - start_time
+
+
+    def name(self, value) -> str:
+        """ Names of objects in a rule cell
+
+        Args:
+            value: rule field value
+
+        Returns:
+            str: names joined with new lines
+        """
+        names = []
+        for uid in WhereUsedIndex.uids(value):
+            obj = self._store_.get(uid)
+            names.append(obj['name'] if obj else uid)
+        return '\n'.join(names)
+
+
+    @staticmethod
+    def field_set(intervals: list[tuple[int, int]], tokens: Iterable[str]) -> tuple:
+        """ Merge intervals into a field set
+
+        Args:
+            intervals (list[tuple[int, int]]): first and last values
+            tokens (Iterable[str]): opaque object uids
+
+        Returns:
+            tuple: interval starts, interval ends, uids
+        """
+        starts, ends = [], []
+        end = -2
+        for first, last in sorted(intervals):
+            if first > end + 1:
+                starts.append(first)
+                ends.append(last)
+                end = last
+            elif last > end:
+                end = ends[-1] = last
+        return tuple(starts), tuple(ends), frozenset(tokens)
+
+
+    @classmethod
+    def union(cls, sets: list[tuple | None]) -> tuple | None:
+        """ Merge field sets
+
+        Args:
+            sets (list[tuple | None]): field sets
+
+        Returns:
+            tuple | None: field set, None if one of them is Any
+        """
+        if any(field is None for field in sets):
+            return None
+        if len(sets) == 1:
+            return sets[0]
+        return cls.field_set([interval for starts, ends, _ in sets for interval in zip(starts, ends)],
+                             [token for _, _, tokens in sets for token in tokens])
+
+
+    @classmethod
+    def port_range(cls, port: str) -> tuple[int, int] | None:
+        """ Ports of a tcp or udp service
+
+        Args:
+            port (str): port as exported, e.g. 443, 1000-2000, >1023 or <1024
+
+        Returns:
+            tuple[int, int] | None: first and last port, None if the port is not understood
+        """
+        match = cls.PORT.match(str(port))
+        if not match:
+            return None
+        first, last, op, number = match.groups()
+        if first is not None:
+            first, last = sorted((int(first), int(last)))
+        else:
+            number = int(number)
+            first, last = {
+                None: (number, number), '>': (number + 1, 65535), '>=': (number, 65535),
+                '<': (0, number - 1), '<=': (0, number),
+            }[op]
+        first, last = max(first, 0), min(last, 65535)
+        return (first, last) if first <= last else None
+
+
+    def object_set(self, uid: str, kind: str) -> tuple | None:
+        """ Field set of one object, groups flattened
+
+        Args:
+            uid (str): object uid
+            kind (str): address or service
+
+        Returns:
+            tuple | None: field set, None for Any
+        """
+        key = (uid, kind)
+        if key in self._sets_:
+            return self._sets_[key]
+        obj = self._store_.get(uid)
+        if obj is None:
+            result = self.field_set([], (uid,))
+        elif obj['type'] == 'CpmiAnyObject':
+            result = None
+        elif obj['type'] != 'group-with-exclusion' and self._closures_.is_group(uid):
+            # nested groups add nothing their members do not
+            result = self.union([self.object_set(member, kind) for member in self._closures_.get(uid)
+                                 if not self._closures_.is_group(member) or self._store_.get(member)['type'] == 'group-with-exclusion'])
+        elif kind == 'address':
+            intervals = [(first + (1 << 32), last + (1 << 32)) if version == 6 else (first, last)
+                         for version, first, last, _ in AddressIndex.intervals(obj)]
+            result = self.field_set(intervals, () if intervals else (uid,))
+        else:
+            ports = self.port_range(obj['port']) if obj['type'] in ('service-tcp', 'service-udp') and obj.get('port') else None
+            if ports is None:
+                result = self.field_set([], (uid,))
+            else:
+                offset = self.UDP_OFFSET if obj['type'] == 'service-udp' else 0
+                result = self.field_set([(ports[0] + offset, ports[1] + offset)], ())
+        self._sets_[key] = result
+        return result
+
+
+    def cell_set(self, value, kind: str, negate: bool = False) -> tuple | None | bool:
+        """ Field set of a rule cell
+
+        Args:
+            value: rule field value
+            kind (str): address or service
+            negate (bool, optional): cell is negated. Defaults to False.
+
+        Returns:
+            tuple | None | bool: field set, None for Any, False if it can not be compared
+        """
+        uids = tuple(WhereUsedIndex.uids(value))
+        key = (uids, kind, negate)
+        if key in self._sets_:
+            return self._sets_[key]
+        result = self.union([self.object_set(uid, kind) for uid in uids])
+        if negate:
+            if kind != 'address' or (result is not None and result[2]):
+                # the complement of services or of objects without addresses is unknown
+                result = False
+            elif result is None:
+                result = ((), (), frozenset())
+            else:
+                starts, ends, _ = result
+                gaps, previous = [], 0
+                for first, last in zip(starts, ends):
+                    if first > previous:
+                        gaps.append((previous, first - 1))
+                    previous = last + 1
+                if previous <= self.ADDRESS_LAST:
+                    gaps.append((previous, self.ADDRESS_LAST))
+                result = self.field_set(gaps, ())
+        self._sets_[key] = result
+        return result
+
+
+    def rule_fields(self, entry: dict) -> tuple | None:
+        """ Field sets of a rule and what limits it as a covering rule
+
+        Args:
+            entry (dict): access rule
+
+        Returns:
+            tuple | None: source, destination and service sets, action uids, whether it may cover
+                other rules, vpn and install-on uids (empty for Any); None if it can not be compared
+        """
+        fields = (
+            self.cell_set(entry['source'], 'address', entry.get('source-negate', False)),
+            self.cell_set(entry['destination'], 'address', entry.get('destination-negate', False)),
+            self.cell_set(entry['service'], 'service', entry.get('service-negate', False)),
+        )
+        if any(field is False for field in fields):
+            return None
+        # a rule limited in time does not cover rules for the rest of the time
+        timed = bool(self.context(entry.get('time')))
+        return (*fields, frozenset(WhereUsedIndex.uids(entry['action'])), not timed,
+                self.context(entry.get('vpn')), self.context(entry.get('install-on')))
+
+
+    def context(self, value) -> frozenset:
+        """ Uids of a vpn, time or install-on cell, empty for Any and Policy Targets
+
+        Args:
+            value: rule field value
+
+        Returns:
+            frozenset: uids
+        """
+        uids = frozenset(WhereUsedIndex.uids(value))
+        for uid in uids:
+            obj = self._store_.get(uid)
+            if obj is not None and (obj['type'] == 'CpmiAnyObject' or (obj['type'] == 'Global' and obj['name'] == 'Policy Targets')):
+                return frozenset()
+        return uids
+
+
+    @staticmethod
+    def contains(outer: tuple | None, inner: tuple | None) -> bool:
+        """ Check if field set outer includes inner
+
+        Args:
+            outer (tuple | None): field set
+            inner (tuple | None): field set
+
+        Returns:
+            bool: True if every value of inner is in outer
+        """
+        if outer is None:
+            return True
+        if inner is None or not inner[2] <= outer[2]:
+            return False
+        starts, ends, _ = outer
+        for first, last in zip(inner[0], inner[1]):
+            i = bisect.bisect_right(starts, first) - 1
+            if i < 0 or ends[i] < last:
+                return False
+        return True
+
+
+    @staticmethod
+    def overlaps(a: tuple | None, b: tuple | None) -> bool:
+        """ Check if field sets have a common value
+
+        Args:
+            a (tuple | None): field set
+            b (tuple | None): field set
+
+        Returns:
+            bool: True if they overlap
+        """
+        if a is None or b is None:
+            return True
+        if a[2] & b[2]:
+            return True
+        i = j = 0
+        while i < len(a[0]) and j < len(b[0]):
+            if a[0][i] <= b[1][j] and b[0][j] <= a[1][i]:
+                return True
+            if a[1][i] < b[1][j]:
+                i += 1
+            else:
+                j += 1
+        return False
+
+
+    @staticmethod
+    def sweep(sets: list[tuple | None], masks: list[int]) -> list[int]:
+        """ For every rule, bitset of the rules containing its whole field set
+        (the converse is not true: containing all endpoints is only necessary)
+
+        Args:
+            sets (list[tuple | None]): field set of every rule
+            masks (list[int]): bitset of the rules that may cover each rule
+
+        Returns:
+            list[int]: bitsets within masks
+        """
+        # events are position, query flag and rule packed into one int, they sort much faster than tuples
+        shift = len(sets).bit_length()
+        index = (1 << shift) - 1
+        query = 1 << shift
+        events = []
+        any_rules = 0
+        with_token: dict[str, int] = {}
+        for i, field in enumerate(sets):
+            if field is None:
+                any_rules |= 1 << i
+                continue
+            starts, ends, tokens = field
+            for first, last in zip(starts, ends):
+                # a rule enters at its first value and leaves after its last, queries see entered rules
+                events.append(first << shift + 1 | i)
+                events.append(last + 1 << shift + 1 | i)
+                events.append(first << shift + 1 | query | i)
+                if last != first:
+                    events.append(last << shift + 1 | query | i)
+            for token in tokens:
+                with_token[token] = with_token.get(token, 0) | 1 << i
+        events.sort()
+        result = list(masks)
+        running = 0
+        for event in events:
+            i = event & index
+            if event & query:
+                result[i] &= running
+            else:
+                running ^= 1 << i
+        for i, field in enumerate(sets):
+            if field is None:
+                result[i] = any_rules & masks[i]
+                continue
+            for token in field[2]:
+                result[i] &= with_token[token]
+            result[i] |= any_rules & masks[i]
+        return result
+
+
+    def find(self, rules: list[tuple]) -> list[dict]:
+        """ Find covered rules
+
+        Args:
+            rules (list[tuple]): sheet, rule entry and rule_fields of every rule in match order
+
+        Returns:
+            list[dict]: sheet, rule number, name, action, status, by (covering rule numbers, with
+                the sheet if it is another one) and covering_action
+        """
+        covering = 0
+        masks = []
+        for i, (_, _, fields) in enumerate(rules):
+            masks.append(covering)
+            if fields[4]:
+                covering |= 1 << i
+        per_field = [self.sweep([fields[k] for _, _, fields in rules], masks) for k in range(3)]
+
+        def covers(i: int, j: int, fields: tuple[int, ...]) -> bool:
+            outer, inner = rules[i][2], rules[j][2]
+            return (not outer[5] or (inner[5] and inner[5] <= outer[5])) and \
+                (not outer[6] or (inner[6] and inner[6] <= outer[6])) and \
+                all(self.contains(outer[k], inner[k]) for k in fields)
+
+        def bits(bitset: int) -> Iterator[int]:
+            while bitset:
+                low = bitset & -bitset
+                yield low.bit_length() - 1
+                bitset ^= low
+
+        findings = []
+        for j, (sheet, entry, fields) in enumerate(rules):
+            candidates = per_field[0][j] & per_field[1][j] & per_field[2][j]
+            self.candidates += candidates.bit_count()
+            by = [i for i in bits(candidates) if covers(i, j, (0, 1, 2))]
+            if by:
+                status = 'redundant' if rules[by[0]][2][3] == fields[3] else 'shadowed'
+            else:
+                status = 'fully covered'
+                # rules covering two fields of this one may cover the third together
+                for k, (a, b) in ((2, (0, 1)), (1, (0, 2)), (0, (1, 2))):
+                    if fields[k] is None:
+                        continue
+                    candidates = per_field[a][j] & per_field[b][j]
+                    self.candidates += candidates.bit_count()
+                    found = [i for i in bits(candidates) if covers(i, j, (a, b))]
+                    if found and self.contains(self.union([rules[i][2][k] for i in found]), fields[k]):
+                        by = [i for i in found if self.overlaps(rules[i][2][k], fields[k])]
+                        break
+            if not by:
+                continue
+            findings.append({
+                **self.rules[j],
+                'status': status,
+                'by': [self.rules[i]['rule'] if self.rules[i]['sheet'] == sheet else f"{self.rules[i]['sheet']} {self.rules[i]['rule']}" for i in by],
+                'covering_action': '\n'.join(dict.fromkeys(self.rules[i]['action'] for i in by)),
+            })
+        return findings
+
+
+    def __len__(self) -> int:
+        return len(self.findings)
+
+
+class PolicyDiff:
+    """ Changes between two archives: rules matched by uid within every rulebase of a package,
+    objects matched by uid and, for ones whose uid changed, by content hash.
+    Every rule and object is hashed once, so nothing is compared pairwise.
+    """
+    # fields that change without a policy change
+    IGNORED_FIELDS = ('meta-info', 'hits', 'rule-number', 'exception-number')
+    # rulebase attribute: sheet name, kind of row builder
+    RULEBASES = {
+        '_gnet_': ('Global FW', 'firewall'),
+        '_net_': ('Local FW', 'firewall'),
+        '_nat_': ('NAT table', 'nat'),
+        '_tp_': ('TP table', 'tp'),
+    }
+    COLUMNS = {
+        'firewall': ['№', 'Name', 'Source', 'Destinaton', 'VPN', 'Service', 'Action', 'Track', 'Time', 'Install on', 'Comment'],
+        'nat': ['№', 'Original Source', 'Original Destination', 'Original Services', 'Translated Source', 'Translated Destination', 'Translated Services', 'Install on', 'Comments'],
+        'tp': ['№', 'Name', 'Protected Scope', 'Source', 'Destination', 'Protection/Site', 'Services', 'Action', 'Track', 'Install on', 'Comments'],
+    }
+
+    def __init__(self, old: 'Cp2xlsx', new: 'Cp2xlsx') -> None:
+        start_time = time.perf_counter()
+        self.old = old
+        self.new = new
+        self.rules: list[dict] = []
+        self.objects: list[dict] = []
+        old_packages = {package['packageName']: package for package in old._packages_}
+        new_packages = {package['packageName']: package for package in new._packages_}
+        for name in dict.fromkeys([*old_packages, *new_packages]):
+            for attr in self.RULEBASES:
+                self.diff_rules(name, attr, (old_packages.get(name) or {}).get(attr) or [], (new_packages.get(name) or {}).get(attr) or [])
+        self.diff_objects()
+        self.build_time = time.perf_counter() - start_time
+
+
+    @classmethod
+    def digest(cls, item: dict, ignored: tuple[str, ...] = ()) -> bytes:
+        """ Content hash of rule or object
+
+        Args:
+            item (dict): rule or object
+            ignored (tuple[str, ...], optional): more fields to leave out. Defaults to ().
+
+        Returns:
+            bytes: digest
+        """
+        import hashlib
+        import json
+        content = {key: value for key, value in item.items() if key not in cls.IGNORED_FIELDS and key not in ignored}
+        return hashlib.blake2b(json.dumps(content, sort_keys=True, ensure_ascii=False).encode(), digest_size=16).digest()
+
+
+    @staticmethod
+    def in_order(positions: list[int]) -> set[int]:
+        """ Longest increasing subsequence: the largest set of positions that kept their relative order
+
+        Args:
+            positions (list[int]): old positions of common rules in new order
+
+        Returns:
+            set[int]: positions that did not move
+        """
+        tails: list[int] = []
+        tail_indexes: list[int] = []
+        previous = [-1] * len(positions)
+        for i, position in enumerate(positions):
+            j = bisect.bisect_left(tails, position)
+            if j == len(tails):
+                tails.append(position)
+                tail_indexes.append(i)
+            else:
+                tails[j] = position
+                tail_indexes[j] = i
+            previous[i] = tail_indexes[j - 1] if j else -1
+        result = set()
+        i = tail_indexes[-1] if tail_indexes else -1
+        while i >= 0:
+            result.add(positions[i])
+            i = previous[i]
+        return result
+
+
+    def diff_rules(self, package: str, attr: str, old_table: list, new_table: list) -> None:
+        """ Record added, removed, moved and modified rules of one rulebase
+
+        Args:
+            package (str): package name
+            attr (str): rulebase attribute
+            old_table (list): old rulebase
+            new_table (list): new rulebase
+        """
+        old_rules = {entry['uid']: entry for entry in old_table if 'uid' in entry and 'section' not in entry['type']}
+        new_rules = {entry['uid']: entry for entry in new_table if 'uid' in entry and 'section' not in entry['type']}
+        old_positions = {uid: i for i, uid in enumerate(old_rules)}
+        kept = self.in_order([old_positions[uid] for uid in new_rules if uid in old_positions])
+        for uid, entry in new_rules.items():
+            old_entry = old_rules.get(uid)
+            if old_entry is None:
+                change = ['added']
+            else:
+                change = []
+                if self.digest(old_entry) != self.digest(entry):
+                    change.append('modified')
+                if old_positions[uid] not in kept:
+                    change.append('moved')
+                if not change:
+                    continue
+            self.rules.append({'change': change, 'package': package, 'rulebase': attr, 'old': old_entry, 'new': entry})
+        for uid, entry in old_rules.items():
+            if uid not in new_rules:
+                self.rules.append({'change': ['removed'], 'package': package, 'rulebase': attr, 'old': entry, 'new': None})
+
+
+    def diff_objects(self) -> None:
+        """ Record added, removed, modified and replaced (same content, other uid) objects
+        """
+        old_store = self.old._store_
+        new_store = self.new._store_
+        added = []
+        for obj in new_store:
+            old_obj = old_store.get(obj['uid'])
+            if old_obj is None:
+                added.append(obj)
+            elif self.digest(old_obj) != self.digest(obj):
+                self.objects.append({'change': 'modified', 'old': old_obj, 'new': obj})
+        removed = {}
+        for obj in old_store:
+            if obj['uid'] not in new_store:
+                removed.setdefault(self.digest(obj, ('uid',)), []).append(obj)
+        for obj in added:
+            candidates = removed.get(self.digest(obj, ('uid',)))
+            if candidates:
+                self.objects.append({'change': 'replaced', 'old': candidates.pop(), 'new': obj})
+            else:
+                self.objects.append({'change': 'added', 'old': None, 'new': obj})
+        for candidates in removed.values():
+            for obj in candidates:
+                self.objects.append({'change': 'removed', 'old': obj, 'new': None})
+
+
+    def summary(self) -> Counter:
+        """ Number of changes by kind
+
+        Returns:
+            Counter: ('rules' or 'objects', change) counts
+        """
+        result = Counter()
+        for rule in self.rules:
+            for change in rule['change']:
+                result['rules', change] += 1
+        for obj in self.objects:
+            result['objects', obj['change']] += 1
+        return result
+
+
+    @staticmethod
+    def cells(cp: 'Cp2xlsx', kind: str, entry: dict) -> list[str]:
+        """ Render rule the way its sheet shows it, cells over the xlsx limit are cut
+
+        Args:
+            cp (Cp2xlsx): converter with the archive the rule comes from
+            kind (str): firewall, nat or tp
+            entry (dict): rule
+
+        Returns:
+            list[str]: cells in COLUMNS order followed by the rule state
+        """
+        payload = next(getattr(cp, f'{kind}_rows')([entry]))
+        if payload[0] == 'place-holder':
+            # where the Local layer goes in the Global one: number and name as the sheet shows them, no state
+            return [payload[1], payload[2]] + [''] * (len(PolicyDiff.COLUMNS[kind]) - 1)
+        values = list(payload[1:-1])
+        enabled, _, src_neg, dst_neg, serv_neg, ps_neg = payload[-1]
+        if kind == 'firewall':
+            # hits change on every export, chunks are joined back into one cell
+            del values[1]
+            for i in (2, 3):
+                values[i] = values[i][0] if len(values[i]) == 1 else values[i][0][:32760] + '\n...'
+        state = [] if enabled else ['disabled']
+        state.extend(name for negated, name in ((src_neg, 'source negated'), (dst_neg, 'destination negated'),
+            (serv_neg, 'service negated'), (ps_neg, 'protected scope negated')) if negated)
+        return [value if value is not None else '' for value in values] + [', '.join(state)]
+
+
+    def object_changes(self, old: dict | None, new: dict | None) -> str:
+        """ Describe how object changed: members added and removed, other fields old and new value
+
+        Args:
+            old (dict | None): old object
+            new (dict | None): new object
+
+        Returns:
+            str: changes, one per line
+        """
+        import json
+        if old is None or new is None:
+            return ''
+        lines = []
+        for key in dict.fromkeys([*old, *new]):
+            if key in self.IGNORED_FIELDS or key == 'uid' or old.get(key) == new.get(key):
+                continue
+            if key == 'members':
+                old_members = [self.old.object_to_str(uid) for uid in WhereUsedIndex.uids(old.get(key))]
+                new_members = [self.new.object_to_str(uid) for uid in WhereUsedIndex.uids(new.get(key))]
+                lines.extend(f"+ {member}" for member in new_members if member not in old_members)
+                lines.extend(f"- {member}" for member in old_members if member not in new_members)
+            else:
+                lines.append(f"{key}: {json.dumps(old.get(key), ensure_ascii=False)} -> {json.dumps(new.get(key), ensure_ascii=False)}")
+        return '\n'.join(lines)
+
+
+    def save(self, filename: str) -> str:
+        """ Write workbook with a summary, a sheet of changed rules per rulebase and changed objects.
+        Modified rules take two rows, the old one and the new one with changed cells highlighted.
+
+        Args:
+            filename (str): xlsx file name
+
+        Returns:
+            str: xlsx file name
+        """
+        import xlsxwriter
+        wb = xlsxwriter.Workbook(filename)
+        default = {'valign': 'top', 'border': True, 'text_wrap': True, 'align': 'left'}
+        style_title = wb.add_format({**default, 'font_size': '12', 'bold': True, 'align': 'center', 'font_color': 'white', 'bg_color': 'gray'})
+        style_data = wb.add_format(default)
+        style_old = wb.add_format({**default, 'font_color': '#808080', 'italic': True})
+        style_changed = wb.add_format({**default, 'bg_color': '#ffeb9c'})
+        style_change = {
+            'added': wb.add_format({**default, 'bg_color': '#c6efce'}),
+            'removed': wb.add_format({**default, 'bg_color': '#ffc7ce', 'font_strikeout': True}),
+            'modified': style_changed,
+            'moved': wb.add_format({**default, 'bg_color': '#ddebf7'}),
+            'replaced': wb.add_format({**default, 'bg_color': '#ddebf7'}),
+        }
+
+        ws = wb.add_worksheet('Summary')
+        ws.set_column('A:B', 20)
+        ws.set_column('C:C', 10)
+        for col, title in enumerate(('Items', 'Change', 'Count')):
+            ws.write(0, col, title, style_title)
+        for row, ((items, change), count) in enumerate(sorted(self.summary().items()), 1):
+            ws.write(row, 0, items, style_data)
+            ws.write(row, 1, change, style_change[change])
+            ws.write(row, 2, count, style_data)
+
+        for attr, (sheet, kind) in self.RULEBASES.items():
+            rules = [rule for rule in self.rules if rule['rulebase'] == attr]
+            if not rules:
+                continue
+            ws = wb.add_worksheet(sheet)
+            columns = ['Change', 'Package', *self.COLUMNS[kind], 'State']
+            ws.set_column(0, 1, 15)
+            ws.set_column(2, 2, 7)
+            ws.set_column(3, len(columns) - 1, 30)
+            for col, title in enumerate(columns):
+                ws.write(0, col, title, style_title)
+            ws.freeze_panes(1, 0)
+            row = 1
+            for rule in rules:
+                change = ', '.join(rule['change'])
+                if 'removed' in rule['change']:
+                    ws.write(row, 0, change, style_change['removed'])
+                    ws.write(row, 1, rule['package'], style_data)
+                    for col, value in enumerate(self.cells(self.old, kind, rule['old']), 2):
+                        ws.write(row, col, value, style_change['removed'])
+                    row = row + 1
+                    continue
+                new_cells = self.cells(self.new, kind, rule['new'])
+                old_cells = self.cells(self.old, kind, rule['old']) if rule['old'] is not None else None
+                if 'modified' in rule['change']:
+                    ws.write(row, 0, 'was', style_old)
+                    ws.write(row, 1, rule['package'], style_old)
+                    for col, value in enumerate(old_cells, 2):
+                        ws.write(row, col, value, style_old)
+                    row = row + 1
+                if 'moved' in rule['change']:
+                    change += f" from {old_cells[0]}"
+                ws.write(row, 0, change, style_change[rule['change'][0]])
+                ws.write(row, 1, rule['package'], style_data)
+                for col, value in enumerate(new_cells, 2):
+                    if old_cells is None:
+                        style = style_change['added']
+                    elif col > 2 and value != old_cells[col - 2]:
+                        style = style_changed
+                    else:
+                        style = style_data
+                    ws.write(row, col, value, style)
+                row = row + 1
+
+        if self.objects:
+            ws = wb.add_worksheet('Objects')
+            ws.set_column('A:A', 12)
+            ws.set_column('B:C', 30)
+            ws.set_column('D:D', 20)
+            ws.set_column('E:E', 40)
+            ws.set_column('F:F', 60)
+            for col, title in enumerate(('Change', 'Object', 'Was', 'Type', 'UID', 'Changes')):
+                ws.write(0, col, title, style_title)
+            ws.freeze_panes(1, 0)
+            for row, obj in enumerate(self.objects, 1):
+                current = obj['new'] or obj['old']
+                ws.write(row, 0, obj['change'], style_change[obj['change']])
+                ws.write(row, 1, (self.new if obj['new'] else self.old).object_to_str(current['uid']), style_data)
+                ws.write(row, 2, self.old.object_to_str(obj['old']['uid']) if obj['old'] and obj['new'] else '', style_old)
+                ws.write(row, 3, current['type'], style_data)
+                ws.write(row, 4, current['uid'] if obj['change'] != 'replaced' else f"{obj['old']['uid']} -> {obj['new']['uid']}", style_data)
+                ws.write(row, 5, self.object_changes(obj['old'], obj['new']), style_data)
+        wb.close()
+        return wb.filename
+
+
+# Cp2xlsx of the sheet worker process, see init_sheet_worker
+_sheet_worker = None
+
+
+def init_sheet_worker(cp: 'Cp2xlsx') -> None:
+    """ Keep loaded package in a sheet worker process, it is shared by all sheets the worker computes
+
+    Args:
+        cp (Cp2xlsx): converter with the package loaded
+    """
+    global _sheet_worker
+    _sheet_worker = cp
+    _sheet_worker.quiet = True
+
+
+def build_sheet_rows(kind: str, name: str, attr: str) -> tuple[list[tuple], dict, dict, Metrics]:
+    """ Compute rows of one sheet in a sheet worker process
+
+    Args:
+        kind (str): firewall, nat or tp
+        name (str): sheet name
+        attr (str): rulebase attribute
+
+    Returns:
+        tuple[list[tuple], dict, dict, Metrics]: rows, groups used by them, group closures and cycles
+            found on the way (GroupClosures.found_since) and metrics of the computation
+    """
+    cp = _sheet_worker
+    cp.metrics = Metrics()
+    cp._cached_groups_ = {}
+    mark = cp._closures_.mark()
+    with cp.metrics.phase(f'{cp.package_name}/{kind}_rows:{name}'):
+        rows = list(getattr(cp, f'{kind}_rows')(getattr(cp, attr)))
+    return rows, cp._cached_groups_, cp._closures_.found_since(mark), cp.metrics
+
+
+def write_shard_file(path: str, package_name: str, kind: str, sheet: str, rows: list[tuple], low_memory: bool) -> Metrics:
+    """ Write one shard of a rulebase into a workbook of its own in a shard worker process.
+    Rows are rendered already, so the writer needs nothing of the loaded package.
+
+    Args:
+        path (str): workbook path
+        package_name (str): policy package name, for metrics
+        kind (str): firewall, nat or tp
+        sheet (str): sheet name
+        rows (list[tuple]): entries of the kind's rows method
+        low_memory (bool): constant memory xlsx writing
+
+    Returns:
+        Metrics: metrics of the writing
+    """
+    import xlsxwriter
+    # only the writing methods are used, they need styles, metrics and the workbook
+    cp = Cp2xlsx.__new__(Cp2xlsx)
+    cp.package_name = package_name
+    cp.low_memory = low_memory
+    cp.quiet = True
+    cp.max_rows = XLSX_MAX_ROWS
+    cp.shard_files = False
+    cp.metrics = Metrics()
+    cp._cells_ = 0
+    cp._shards_ = []
+    cp.wb = xlsxwriter.Workbook(path, {'constant_memory': low_memory})
+    cp.init_styles()
+    with cp.metrics.phase(f'{package_name}/shard:{Path(path).name}'):
+        cp.write_shards(kind, sheet, rows)
+        cp.wb.close()
+    return cp.metrics
+
+
+class RecordWriter(ABC):
+    """ Streaming writer of flat records, base of the non-xlsx output formats.
+    Columns are (name, type) pairs, type is 'str' or 'bool'.
+    """
+    extension = ''
+
+    def __init__(self, path: Path, columns: list[tuple[str, str]]) -> None:
+        self.path = path
+        self.columns = columns
+
+
+    @abstractmethod
+    def write(self, record: dict) -> None:
+        """ Write record, missing columns are empty
+
+        Args:
+            record (dict): column values
+        """
+
+
+    @abstractmethod
+    def close(self) -> None:
+        """ Flush and close output file
+        """
+
+
+    def __enter__(self) -> 'RecordWriter':
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class CsvWriter(RecordWriter):
+    extension = 'csv'
+
+    def __init__(self, path: Path, columns: list[tuple[str, str]]) -> None:
+        import csv
+        super().__init__(path, columns)
+        # BOM lets Excel detect the encoding
+        self._file_ = path.open('w', encoding='utf-8-sig', newline='')
+        self._writer_ = csv.DictWriter(self._file_, [name for name, _ in columns])
+        self._writer_.writeheader()
+
+
+    def write(self, record: dict) -> None:
+        self._writer_.writerow(record)
+
+
+    def close(self) -> None:
+        self._file_.close()
+
+
+class JsonLinesWriter(RecordWriter):
+    extension = 'jsonl'
+
+    def __init__(self, path: Path, columns: list[tuple[str, str]]) -> None:
+        super().__init__(path, columns)
+        self._file_ = path.open('w', encoding='UTF-8')
+
+
+    def write(self, record: dict) -> None:
+        import json
+        self._file_.write(json.dumps({name: record.get(name) for name, _ in self.columns}, ensure_ascii=False))
+        self._file_.write('\n')
+
+
+    def close(self) -> None:
+        self._file_.close()
+
+
+class ParquetWriter(RecordWriter):
+    """ Parquet writer, needs pyarrow. Records are written in row groups of batch_size,
+    string columns are dictionary-encoded since rule cells repeat a lot.
+    """
+    extension = 'parquet'
+
+    def __init__(self, path: Path, columns: list[tuple[str, str]], batch_size: int = 50000) -> None:
+        import pyarrow
+        import pyarrow.parquet
+        super().__init__(path, columns)
+        self._pa_ = pyarrow
+        self._types_ = {'str': pyarrow.dictionary(pyarrow.int32(), pyarrow.string()), 'bool': pyarrow.bool_()}
+        self._schema_ = pyarrow.schema([(name, self._types_[kind]) for name, kind in columns])
+        self._writer_ = pyarrow.parquet.ParquetWriter(str(path), self._schema_, use_dictionary=True, compression='zstd')
+        self._batch_: list[dict] = []
+        self.batch_size = batch_size
+
+
+    @staticmethod
+    def available() -> bool:
+        """ Check if pyarrow is installed
+
+        Returns:
+            bool: True if parquet files can be written
+        """
+        return importlib.util.find_spec('pyarrow') is not None
+
+
+    def write(self, record: dict) -> None:
+        self._batch_.append(record)
+        if len(self._batch_) >= self.batch_size:
+            self.flush()
+
+
+    def flush(self) -> None:
+        """ Write buffered records as a row group
+        """
+        if not self._batch_:
+            return
+        arrays = []
+        for name, kind in self.columns:
+            values = [record.get(name) for record in self._batch_]
+            if kind == 'str':
+                arrays.append(self._pa_.array(values, self._pa_.string()).dictionary_encode())
+            else:
+                arrays.append(self._pa_.array(values, self._pa_.bool_()))
+        self._writer_.write_table(self._pa_.Table.from_arrays(arrays, schema=self._schema_))
+        self._batch_ = []
+
+
+    def close(self) -> None:
+        self.flush()
+        self._writer_.close()
+
+
+# output formats besides xlsx
+RECORD_WRITERS = {writer.extension: writer for writer in (CsvWriter, JsonLinesWriter, ParquetWriter)}
+
+
+class PackageError(Exception):
+    """ Policy package archive is incomplete or malformed
+    """
+
+
+class Cp2xlsx:
+    # columns of rule records written by record writers, one schema for all rulebases
+    RULE_COLUMNS = [
+        ('package', 'str'), ('rulebase', 'str'), ('section', 'str'), ('type', 'str'), ('number', 'str'), ('name', 'str'),
+        ('hits', 'str'), ('protected_scope', 'str'), ('source', 'str'), ('destination', 'str'), ('vpn', 'str'),
+        ('protection_site', 'str'), ('service', 'str'), ('action', 'str'), ('track', 'str'), ('time', 'str'),
+        ('original_source', 'str'), ('original_destination', 'str'), ('original_service', 'str'),
+        ('translated_source', 'str'), ('translated_destination', 'str'), ('translated_service', 'str'),
+        ('install_on', 'str'), ('comments', 'str'), ('enabled', 'bool'), ('source_negate', 'bool'),
+        ('destination_negate', 'bool'), ('service_negate', 'bool'), ('protected_scope_negate', 'bool'),
+    ]
+    OBJECT_COLUMNS = [('uid', 'str'), ('name', 'str'), ('type', 'str'), ('value', 'str'), ('members', 'str')]
+    COVERAGE_COLUMNS = [('sheet', 'str'), ('rule', 'str'), ('name', 'str'), ('status', 'str'), ('by', 'str'),
+                        ('action', 'str'), ('covering_action', 'str')]
+    RULEBASE_ATTRS = frozenset(attr for attr, _ in LAYER_PATTERNS)
+    # options render may change between renders of one loaded archive
+    RENDER_OPTIONS = ('eg', 'sm', 'sg', 'groups_format', 'formats', 'low_memory', 'jobs', 'output_dir', 'quiet', 'coverage',
+                      'max_rows', 'shard_files', 'incremental')
+    # get_style key of every column of a rule row by sheet kind, see init_styles
+    ROW_STYLE_COLUMNS = {
+        'firewall': ('default', 'default', 'default', 'source', 'destination', 'default', 'service', 'default', 'default', 'default', 'default', 'default'),
+        'nat': ('default',) * 9,
+        'tp': ('default', 'default', 'protection-scope', 'source', 'destination', 'default', 'service', 'default', 'default', 'default', 'default'),
+    }
+    # set_row options of rule rows, they are grouped one outline level below sections
+    OUTLINE_ROW = {'level': 1, 'hidden': False}
+
+    def __init__(self, package: str, eg: bool, sm: bool, sg: str, stream: bool = True, low_memory: bool = False, output_dir: str = '.', quiet: bool = False, jobs: int = 1, cache: PackageCache | None = None, convert: bool = True, formats: Iterable[str] = ('xlsx',), compact: bool = True, selective: bool = False, groups_format: str = 'txt', coverage: bool = False, max_rows: int = XLSX_MAX_ROWS, shard_files: bool = False, incremental: bool = False, archive_key: str | None = None, count_lookups: bool = False) -> None:
+        self.eg = eg
+        self.sm = sm
+        self.sg = sg
+        self.groups_format = groups_format
+        self.stream = stream
+        self.low_memory = low_memory
+        self.output_dir = Path(output_dir)
+        self.quiet = quiet
+        self.jobs = jobs
+        self.cache = cache
+        self.formats = list(formats)
+        self.compact = compact
+        self.selective = selective
+        self.coverage = coverage
+        self.max_rows = max_rows
+        self.shard_files = shard_files
+        self.incremental = incremental
+        # per-lookup hit and miss counters update a dict in the hottest loops, they are kept for metrics reports only
+        self.count_lookups = count_lookups
+        self._incremental_ = None
+        self._shards_ = []
+        self._shard_pool_ = None
+        self._shard_futures_ = []
+        self._cached_objects_ = {}
+        self._cached_cells_ = {}
+        self._cached_groups_ = {}
+        self._cells_ = 0
+        self._where_used_ = None
+        self._address_index_ = None
+        self._rule_coverage_ = {}
+        self.metrics = Metrics()
+        self._filenames_ = []
+        self.load(package, convert, archive_key)
+        if convert:
+            self._filenames_ = self.convert_packages()
+        self.save_state()
+
+
+    @classmethod
+    def open(cls, package: str, eg: bool = True, sm: bool = True, sg: str = "no", quiet: bool = True, **options) -> 'Cp2xlsx':
+        """ Load stage of the library API: load and check an archive without converting it.
+        The result can be analyzed (analyze, where_used, address_index) and rendered any number of times,
+        problems raise PackageError or OSError instead of prompting.
+
+        Args:
+            package (str): archive path
+            eg (bool, optional): export global firewall rules. Defaults to True.
+            sm (bool, optional): show group members. Defaults to True.
+            sg (str, optional): save groups: no, policy or all. Defaults to "no".
+            quiet (bool, optional): no progress output. Defaults to True.
+            **options: other Cp2xlsx keyword arguments except convert
+
+        Returns:
+            Cp2xlsx: loaded archive
+        """
+        return cls(package, eg, sm, sg, quiet=quiet, convert=False, **options)
+
+
+    def load(self, package: str, convert: bool = True, archive_key: str | None = None) -> None:
+        """ Read the archive, or its parsed state from the cache, and check it
+
+        Args:
+            package (str): archive path
+            convert (bool, optional): packages will be converted, see skipped_members. Defaults to True.
+            archive_key (str | None, optional): PackageCache.key of the archive if the caller has it already. Defaults to None.
+
+        Raises:
+            PackageError: mandatory file is missing
+        """
+        self._skipped_ = self.skipped_members(convert)
+        if self.cache and archive_key is None:
+            archive_key = self.cache.key(package)
+        variant = ('-compact' if self.compact else '') + ''.join(f"-no{kind.strip('_')}" for kind in sorted(self._skipped_))
+        self._cache_key_ = f"{archive_key}{variant}" if self.cache else None
+        state = self.cache.load(self._cache_key_) if self.cache else None
+        if state is not None and set(state) != set(self.cache_state_keys()):
+            # written by a build with another state layout
+            state = None
+        if state is None:
+            with self.metrics.phase('load_package'):
+                self.load_package(package, archive_key)
+            self._saved_closures_ = -1
+        else:
+            with self.metrics.phase('restore_state'):
+                self.restore_state(state)
+            self._saved_closures_ = len(self._closures_)
+            self.log("Package loaded from cache.")
+        self.verify_package()
+
+
+    def analyze(self) -> tuple[WhereUsedIndex, AddressIndex]:
+        """ Analysis stage of the library API: build the where-used and address indexes now
+        instead of on first use, their build time goes to metrics
+
+        Returns:
+            tuple[WhereUsedIndex, AddressIndex]: indexes
+        """
+        return self.where_used(), self.address_index()
+
+
+    def render(self, **options) -> list[str]:
+        """ Render stage of the library API: convert every policy package of the loaded archive.
+        It may be called again with other options, loaded tables, group closures and rendered cells
+        are reused. Metrics add up over all renders.
+
+        Args:
+            **options: RENDER_OPTIONS to change, e.g. sm=False or formats=['csv'], the rest keep their values
+
+        Raises:
+            TypeError: unknown option
+            ValueError: Global rules are requested but a selective load skipped them
+
+        Returns:
+            list[str]: file names
+        """
+        unknown = set(options) - set(self.RENDER_OPTIONS)
+        if unknown:
+            raise TypeError(f"unknown render options: {', '.join(sorted(unknown))}")
+        if options.get('eg', self.eg) and '_gnet_' in self._skipped_:
+            raise ValueError("Global rules were not loaded, open the archive with eg=True or selective=False")
+        for name, value in options.items():
+            setattr(self, name, value)
+        self.output_dir = Path(self.output_dir)
+        self.formats = list(self.formats)
+        self._filenames_ = self.convert_packages()
+        self.save_state()
+        return self._filenames_
+
+
+    def save_state(self) -> None:
+        """ Store parsed state in the cache if it was read from the archive or its group closures grew since
+        """
+        if self.cache and len(self._closures_) > self._saved_closures_:
+            self.cache.save(self._cache_key_, self.cache_state())
+            self._saved_closures_ = len(self._closures_)
+
+
+    def skipped_members(self, convert: bool) -> set[str]:
+        """ Kinds of archive members (see MEMBER_PATTERNS) the requested outputs do not need.
+        Nothing is skipped unless the instance is selective.
+
+        Args:
+            convert (bool): packages are converted, not only loaded for analysis
+
+        Returns:
+            set[str]: member kinds
+        """
+        skipped = set()
+        if self.selective:
+            if not self.eg:
+                skipped.add('_gnet_')
+            if convert:
+                # gateway objects are only read by the where-used index
+                skipped.add('gateway_objects')
+        return skipped
+
+
+    @staticmethod
+    def cache_state_keys() -> tuple[str, ...]:
+        """ Keys of cache_state
+
+        Returns:
+            tuple: keys
+        """
+        return ('index', 'gwobj', 'layers', 'store', 'closures')
+
+
+    def cache_state(self) -> dict:
+        """ Parsed archive state for PackageCache
+
+        Returns:
+            dict: state
+        """
+        return {
+            'index': self._index_,
+            'gwobj': self._gwobj_,
+            'layers': self._layers_,
+            'store': self._store_,
+            'closures': self._closures_,
+        }
+
+
+    def restore_state(self, state: dict) -> None:
+        """ Restore parsed archive state from PackageCache instead of loading the archive
+
+        Args:
+            state (dict): state
+        """
+        self._index_ = state['index']
+        self._gwobj_ = state['gwobj']
+        self._layers_ = state['layers']
+        self._store_ = state['store']
+        self._closures_ = state['closures']
+        self._packages_ = self.resolve_packages() if self._index_ is not None else []
+
+
+    def convert_packages(self) -> list[str]:
+        """ Convert every policy package of the archive into its own workbook.
+        With several jobs packages are converted in worker processes, each gets a copy of loaded tables.
+
+        Returns:
+            list[str]: file names
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        if self.jobs > 1 and len(self._packages_) > 1:
+            quiet, jobs = self.quiet, self.jobs
+            workers = min(self.jobs, len(self._packages_))
+            # spare jobs go to sheet workers of every package
+            self.quiet, self.jobs = True, max(self.jobs // workers, 1)
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(self.convert_package_in_worker, self._packages_))
+            finally:
+                self.quiet, self.jobs = quiet, jobs
+            filenames = []
+            for package_filenames, metrics in results:
+                self.metrics.merge(metrics)
+                filenames.extend(package_filenames)
+            for filename in filenames:
+                self.log(f"{filename} is ready.")
+            return filenames
+        return [filename for package in self._packages_ for filename in self.convert_package(package)]
+
+
+    def convert_package(self, package: dict) -> list[str]:
+        """ Convert one policy package into every output format
+
+        Args:
+            package (dict): package name and its rulebases, see resolve_packages
+
+        Returns:
+            list[str]: file names
+        """
+        import xlsxwriter
+        self.select_package(package)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._cached_groups_ = {}
+        cycles = len(self._closures_.cycles)
+        self._incremental_ = rows_key = None
+        if self.incremental and self.cache is None:
+            self.log("Incremental conversion needs the package cache, converting in full.")
+        elif self.incremental:
+            rows_key = self.rows_cache_key()
+            state = self.cache.load(rows_key)
+            self._incremental_ = IncrementalRows(self._closures_, self.object_to_str, state['rows'] if state else None)
+        filenames = []
+        for fmt in self.formats:
+            if fmt == 'xlsx':
+                # constant_memory streams every finished row to a temp file instead of keeping the sheet in memory
+                self.wb = xlsxwriter.Workbook(str(self.output_dir / f'{self.package_name}.xlsx'), {'constant_memory': self.low_memory})
+                self.init_styles()
+                self.run()
+                filenames.append(self.wb.filename)
+                filenames.extend(str(self.output_dir / shard['file']) for shard in self._shards_ if shard['file'])
+            else:
+                with self.metrics.phase(f'{self.package_name}/export:{fmt}'):
+                    filenames.extend(self.export(fmt))
+        if self.sg != "no":
+            with self.metrics.phase(f'{self.package_name}/save_groups_to_files'):
+                self.save_groups_to_files()
+        self.metrics.count('groups.used', len(self._cached_groups_))
+        if rows_key:
+            incremental, self._incremental_ = self._incremental_, None
+            self.cache.save(rows_key, {'rows': incremental.rows})
+            self.metrics.count('incremental.reused', incremental.reused)
+            self.metrics.count('incremental.rendered', incremental.rendered)
+            self.log(f"Incremental conversion: {incremental.reused} rows reused, {incremental.rendered} rendered.")
+        # sorted, the order a cycle is found in depends on the sheet worker that found it first
+        for names in sorted(sorted(self.find_obj_by_uid(uid)['name'] for uid in cycle) for cycle in self._closures_.cycles[cycles:]):
+            self.log(f"Groups contain each other: {', '.join(names)}")
+        if self.count_lookups:
+            counters = self.metrics.counters
+            self.log(f"Rendered cells cache: {counters['rendered_cells.hits']} hits, {counters['rendered_cells.misses']} misses.")
+        return filenames
+
+
+    def rows_cache_key(self) -> str:
+        """ Cache key of the rows of the current package's last conversion into the output directory, see IncrementalRows
+
+        Returns:
+            str: key
+        """
+        import hashlib
+        target = f"{self.output_dir.resolve()}|{self.package_name}|{self.sm}"
+        return f"rows-{hashlib.sha256(target.encode()).hexdigest()}-{VERSION}-{CACHE_FORMAT}"
+
+
+    def convert_package_in_worker(self, package: dict) -> tuple[list[str], Metrics]:
+        """ Convert one policy package in a worker process, metrics are collected apart from the parent's
+
+        Args:
+            package (dict): package name and its rulebases, see resolve_packages
+
+        Returns:
+            tuple[list[str], Metrics]: file names and metrics of the conversion
+        """
+        self.metrics = Metrics()
+        return self.convert_package(package), self.metrics
+
+
+    def select_package(self, package: dict) -> None:
+        """ Make package current for sheet generation
+
+        Args:
+            package (dict): package name and its rulebases, see resolve_packages
+        """
+        self.package_name = package['packageName']
+        self._gnet_ = package['_gnet_']
+        self._net_ = package['_net_']
+        self._nat_ = package['_nat_']
+        self._tp_ = package['_tp_']
+
+
+    def run(self):
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        def phase(name: str):
+            return self.metrics.phase(f'{self.package_name}/{name}')
+
+        # kind of sheet generator, sheet name, rulebase attribute
+        sheets = []
+        if self.eg:
+            if not self._gnet_:
+                self.log("Global FW is empty.")
+            else:
+                sheets.append(('firewall', 'Global FW', '_gnet_'))
+        if not self._net_:
+            self.log("Local FW is empty.")
+        else:
+            sheets.append(('firewall', 'Local FW', '_net_'))
+        if not self._nat_:
+            self.log("NAT is empty.")
+        else:
+            sheets.append(('nat', 'NAT table', '_nat_'))
+        if not self._tp_:
+            self.log("TP is empty")
+        else:
+            sheets.append(('tp', 'TP table', '_tp_'))
+        if self.coverage:
+            sheets.append(('coverage', 'Rule coverage', None))
+
+        self._shards_ = []
+        executor = None
+        if self.jobs > 1 and not self.low_memory and not self._incremental_ and len(sheets) > 1 and \
+                sum(len(getattr(self, attr)) for _, _, attr in sheets if attr) >= PARALLEL_SHEETS_MIN_RULES:
+            # rows of all sheets are computed concurrently, this process only writes them in order
+            executor = ProcessPoolExecutor(max_workers=min(self.jobs, len(sheets)), initializer=init_sheet_worker, initargs=(self,))
+        try:
+            futures = [executor.submit(build_sheet_rows, kind, name, attr) for kind, name, attr in sheets if attr] if executor else []
+            if futures and self.coverage:
+                # found while workers compute rows of the other sheets
+                self.rule_coverage()
+            for i, (kind, name, attr) in enumerate(sheets):
+                if attr is None:
+                    coverage = self.rule_coverage()
+                    with phase(f'gen_{kind}_sheet:{name}'):
+                        self.gen_coverage_sheet(name, coverage)
+                    continue
+                rows = self.collect_rows(futures[i]) if futures else None
+                with phase(f'gen_{kind}_sheet:{name}'):
+                    getattr(self, f'gen_{kind}_sheet')(name, getattr(self, attr), rows)
+            if self._shard_pool_:
+                with phase('shard_files'):
+                    for future in as_completed(self._shard_futures_):
+                        self.metrics.merge(future.result())
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+            if self._shard_pool_:
+                self._shard_pool_.shutdown(cancel_futures=True)
+                self._shard_pool_, self._shard_futures_ = None, []
+        if self._shards_:
+            with phase('gen_index_sheet'):
+                self.gen_index_sheet('Index')
+        with phase('wb.close'):
+            self.wb.close()
+
+
+    def export(self, fmt: str) -> list[str]:
+        """ Write rules of the current package and all objects as records: one per rule,
+        cells fully expanded and never split, sections and rulebases are columns.
+
+        Args:
+            fmt (str): output format, see RECORD_WRITERS
+
+        Returns:
+            list[str]: rules, objects and, with coverage, rule coverage file names
+        """
+        writer_class = RECORD_WRITERS[fmt]
+        rules_path = self.output_dir / f'{self.package_name}.rules.{writer_class.extension}'
+        objects_path = self.output_dir / f'{self.package_name}.objects.{writer_class.extension}'
+        records = 0
+        with writer_class(rules_path, self.RULE_COLUMNS) as writer:
+            for record in self.rule_records(fmt):
+                writer.write(record)
+                records += 1
+        with writer_class(objects_path, self.OBJECT_COLUMNS) as writer:
+            for obj in self.progress(self._store_, f"Objects ({fmt})"):
+                writer.write({
+                    'uid': obj['uid'],
+                    'name': obj.get('name'),
+                    'type': obj.get('type'),
+                    'value': self.object_to_str(obj['uid']),
+                    'members': self.list_to_str(self.objects_to_str(self._closures_.members(obj['uid']))) if 'group' in obj['type'] else None,
+                })
+                records += 1
+        self.metrics.count('records', records)
+        if not self.coverage:
+            return [str(rules_path), str(objects_path)]
+        coverage_path = self.output_dir / f'{self.package_name}.coverage.{writer_class.extension}'
+        findings = self.rule_coverage().findings
+        with writer_class(coverage_path, self.COVERAGE_COLUMNS) as writer:
+            for finding in findings:
+                writer.write({**finding, 'by': '\n'.join(finding['by'])})
+        self.metrics.count('records', len(findings))
+        return [str(rules_path), str(objects_path), str(coverage_path)]
+
+
+    def rule_records(self, fmt: str) -> Iterator[dict]:
+        """ Flatten rulebases of the current package into records with RULE_COLUMNS,
+        cells are rendered by the row builders of the sheets
+
+        Args:
+            fmt (str): output format, for progress bars only
+
+        Yields:
+            dict: record
+        """
+        rulebases = [('Global FW', 'firewall', self._gnet_)] if self.eg else []
+        rulebases += [('Local FW', 'firewall', self._net_), ('NAT table', 'nat', self._nat_), ('TP table', 'tp', self._tp_)]
+        for rulebase, kind, table in rulebases:
+            section = None
+            for payload in self.sheet_rows(kind, self.progress(table or [], f"{rulebase} ({fmt})")):
+                if payload[0].endswith('section'):
+                    section = payload[-1]
+                    continue
+                record = {'package': self.package_name, 'rulebase': rulebase, 'section': section, 'type': payload[0], 'number': payload[1]}
+                if payload[0] == 'place-holder':
+                    record['name'] = payload[2]
+                    yield record
+                    continue
+                if kind == 'firewall':
+                    _, _, hits, name, source, destination, vpn, service, action, track, time, install_on, comments, style = payload
+                    record.update(hits=hits, name=name, source='\n'.join(source), destination='\n'.join(destination), vpn=vpn,
+                                  service=service, action=action, track=track, time=time)
+                elif kind == 'nat':
+                    _, _, o_source, o_destination, o_service, t_source, t_destination, t_service, install_on, comments, style = payload
+                    record.update(original_source=o_source, original_destination=o_destination, original_service=o_service,
+                                  translated_source=t_source, translated_destination=t_destination, translated_service=t_service)
+                else:
+                    _, _, name, p_scope, source, destination, p_site, service, action, track, install_on, comments, style = payload
+                    record.update(name=name, protected_scope=p_scope, source=source, destination=destination,
+                                  protection_site=p_site, service=service, action=action, track=track)
+                enabled, _, src_neg, dst_neg, serv_neg, ps_neg = style
+                record.update(
+                    install_on=install_on,
+                    comments=comments,
+                    enabled=enabled,
+                    source_negate=src_neg,
+                    destination_negate=dst_neg,
+                    service_negate=serv_neg,
+                    protected_scope_negate=ps_neg,
+                )
+                yield record
+
+
+    def collect_rows(self, future: Future) -> list[tuple]:
+        """ Wait for rows computed by a sheet worker and take over its used groups, group closures and cycles and metrics
+
+        Args:
+            future (Future): build_sheet_rows result
+
+        Returns:
+            list[tuple]: sheet rows
+        """
+        rows, used_groups, closures, metrics = future.result()
+        self._cached_groups_.update(used_groups)
+        self._closures_.merge(closures)
+        self.metrics.merge(metrics)
+        return rows
+
+
+    def __getstate__(self) -> dict:
+        """ State sent to worker processes, the workbook being written stays here
+        """
+        state = self.__dict__.copy()
+        state.pop('wb', None)
+        state['_shard_pool_'], state['_shard_futures_'] = None, []
+        state['_incremental_'] = None
+        return state
+
+
+    def save_groups_to_files(self) -> str:
+        """ Save members of groups, all of them or those used in the policy, in groups_format:
+        txt: a file per group in the package directory, written by a pool of GROUP_WRITER_THREADS threads,
+        zip: the same files in one zip archive, jsonl: a line with name and members per group.
+        Members are rendered from group closures before anything is written. A group name used
+        more than once gets the members of the last such group, as its txt file would.
+
+        Returns:
+            str: path of the directory or file written
+        """
+        if self.sg == "policy":
+            objects = [self._store_.get(uid) for uid in self._cached_groups_]
+        else:
+            objects = self._store_.groups()
+        groups: dict[str, list[str]] = {}
+        for obj in self.progress(objects, "Rendering groups"):
+            if 'group' in obj['type']:
+                groups[obj['name']] = [self.object_to_str(member) for member in self._closures_.members(obj['uid'])]
+        self.metrics.count('groups.saved', len(groups))
+        if self.groups_format == 'zip':
+            return self.save_groups_to_zip(groups)
+        if self.groups_format == 'jsonl':
+            return self.save_groups_to_jsonl(groups)
+        return self.save_groups_to_dir(groups)
+
+
+    def save_groups_to_dir(self, groups: dict[str, list[str]]) -> str:
+        """ Write a txt file per group into an emptied package directory.
+        Old directory is moved at once into a new temporary directory beside it, which is removed while the new files are written.
+
+        Args:
+            groups (dict[str, list[str]]): members by group name
+
+        Returns:
+            str: directory path
+        """
+        import shutil
+        import tempfile
+        from concurrent.futures import ThreadPoolExecutor
+        dir_path = self.output_dir / self.package_name
+        old_path = None
+        if dir_path.is_dir():
+            # a fresh name, leftovers of an interrupted run are never in the way
+            old_path = tempfile.mkdtemp(prefix=f".{dir_path.name}.", suffix=".old", dir=dir_path.parent)
+            os.replace(dir_path, Path(old_path) / dir_path.name)
+        elif dir_path.exists():
+            dir_path.unlink()
+        dir_path.mkdir()
+
+        # names equal on a case-insensitive file system would race for one file, the last group wins as in sequential writing
+        items = list({os.path.normcase(name): (name, members) for name, members in groups.items()}.values())
+        with ThreadPoolExecutor(max_workers=GROUP_WRITER_THREADS) as executor:
+            if old_path is not None:
+                executor.submit(shutil.rmtree, old_path, ignore_errors=True)
+            futures = [executor.submit(self.write_group_files, dir_path, items[i:i + GROUP_WRITER_BATCH])
+                       for i in range(0, len(items), GROUP_WRITER_BATCH)]
+            for future in self.progress(futures, "Saving groups"):
+                future.result()
+        return str(dir_path)
+
+
+    @staticmethod
+    def write_group_files(dir_path: Path, groups: list[tuple[str, list[str]]]) -> None:
+        """ Write txt files of groups, a member per line
+
+        Args:
+            dir_path (Path): directory
+            groups (list[tuple[str, list[str]]]): group names and members
+        """
+        for name, members in groups:
+            with open(dir_path / f"{name}.txt", "w", encoding="UTF-8") as file:
+                file.write(''.join(f"{member}\n" for member in members))
+
+
+    def save_groups_to_zip(self, groups: dict[str, list[str]]) -> str:
+        """ Write txt files of groups into one zip archive
+
+        Args:
+            groups (dict[str, list[str]]): members by group name
+
+        Returns:
+            str: archive path
+        """
+        import zipfile
+        path = self.output_dir / f"{self.package_name}.groups.zip"
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, members in self.progress(groups.items(), "Saving groups"):
+                archive.writestr(f"{name}.txt", ''.join(f"{member}\n" for member in members))
+        return str(path)
+
+
+    def save_groups_to_jsonl(self, groups: dict[str, list[str]]) -> str:
+        """ Write groups into one JSON Lines file, a {"name", "members"} object per line
+
+        Args:
+            groups (dict[str, list[str]]): members by group name
+
+        Returns:
+            str: file path
+        """
+        import json
+        path = self.output_dir / f"{self.package_name}.groups.jsonl"
+        with path.open('w', encoding='UTF-8') as file:
+            for name, members in self.progress(groups.items(), "Saving groups"):
+                file.write(json.dumps({'name': name, 'members': members}, ensure_ascii=False))
+                file.write('\n')
+        return str(path)
+
+
+    def log(self, message: str) -> None:
+        """ Print progress message unless running quietly
+
+        Args:
+            message (str): message
+        """
+        if not self.quiet:
+            print(message)
+
+
+    def progress(self, iterable: Iterable, desc: str) -> Iterable:
+        """ Wrap iterable with progress bar unless running quietly
+
+        Args:
+            iterable (Iterable): iterable
+            desc (str): progress bar title
+
+        Returns:
+            Iterable: wrapped iterable
+        """
+        from tqdm import tqdm
+        return tqdm(iterable, desc=desc, ncols=100, bar_format='{desc}\t: |{bar}| {n_fmt:5}/{total_fmt:5} [{elapsed_s:.2f}s]', disable=self.quiet)
+
+
+    def get_filename(self) -> str:
+        """ Get first file name of the first policy package
+
+        Returns:
+            str: file name
+        """
+        return self._filenames_[0]
+
+
+    def get_filenames(self) -> list[str]:
+        """ Get file names of all policy packages in all output formats
+
+        Returns:
+            list[str]: file names
+        """
+        return self._filenames_
+
+
+    def verify_package(self) -> None:
+        """ Check if all files from archive were loaded
+
+        Raises:
+            PackageError: mandatory file is missing
+        """
+        if self._index_ is None:
+            raise PackageError("File index.json is not found! Check archive integrity.")
+        if self._store_ is None:
+            raise PackageError("File *objects.json is not found! Check archive integrity.")
+        if not self._packages_:
+            raise PackageError("No policy packages are listed in index.json! Check archive integrity.")
+        for package in self._packages_:
+            prefix = f"{package['packageName']}: " if len(self._packages_) > 1 else ""
+            if package['_gnet_'] is None and '_gnet_' not in self._skipped_:
+                self.log(f"{prefix}File '*Network-Global*.json' is not found. Skipping Global Firewall table...")
+            if package['_net_'] is None:
+                self.log(f"{prefix}File '*Network*.json' is not found. Skipping Firewall table...")
+            if package['_nat_'] is None:
+                self.log(f"{prefix}File '*NAT*.json' is not found. Skipping NAT table...")
+            if package['_tp_'] is None:
+                self.log(f"{prefix}File '*Threat Prevention*.json' is not found. Skipping Threat Prevention table...")
+        if self._gwobj_ is None and 'gateway_objects' not in self._skipped_:
+            self.log("File '*gateway_objects.json' is not found.")
+
+
+    def init_styles(self) -> None:
+        """ Init workbook styles
+        """
+        default = {'valign': 'vcenter', 'border': True}
+        self.style_default = self.wb.add_format(default)
+
+        title = {**default, **{'font_size': '12', 'bold': True, 'bottom': True, 'align': 'center', 'font_color': 'white', 'bg_color': 'gray'}}
+        self.style_title = self.wb.add_format(title)
+
+        section = {**default, **{'bold': True, 'align': 'center', 'bg_color': 'yellow'}}
+        self.style_section = self.wb.add_format(section)
+
+        placeholder = {**default, **{'bold': True, 'align': 'left', 'bg_color': 'green'}}
+        self.style_placeholder = self.wb.add_format(placeholder)
+
+        data = {**default, **{'text_wrap': True, 'align': 'left', 'valign': 'top'}}
+        self.style_data = self.wb.add_format(data)
+
+        data_neg = {**data, **{'font_color': 'red', 'italic': True}}
+        self.style_data_neg = self.wb.add_format(data_neg)
+
+        data_dis = {**data, **{'bg_color': '#c8c8c8'}}
+        self.style_data_dis = self.wb.add_format(data_dis)
+
+        data_dis_neg = {**data_neg, **data_dis}
+        self.style_data_dis_neg = self.wb.add_format(data_dis_neg)
+
+        data_temp = {**data, **{'bg_color': '#ffe994'}}
+        self.style_data_temp = self.wb.add_format(data_temp)
+
+        data_temp_neg = {**data_neg, **data_temp}
+        self.style_data_temp_neg = self.wb.add_format(data_temp_neg)
+
+        # column formats of rule rows for every combination of get_style arguments, and the same
+        # formats as runs of columns sharing one, by (sheet kind, get_style arguments), see write_cells
+        self._row_formats_ = {}
+        for key in itertools.product((False, True), repeat=6):
+            style = self.get_style(*key)
+            for kind, columns in self.ROW_STYLE_COLUMNS.items():
+                formats = tuple(style[column] for column in columns)
+                runs = []
+                for col, cell_format in enumerate(formats):
+                    if runs and runs[-1][2] is cell_format:
+                        runs[-1][1] = col + 1
+                    else:
+                        runs.append([col, col + 1, cell_format])
+                self._row_formats_[kind, key] = (formats, tuple(map(tuple, runs)))
+
+
+    def get_style(self, enabled: bool=True, temp: bool=False, src_neg: bool=False, dst_neg: bool=False, serv_neg: bool=False, ps_neg: bool=False) -> dict:
+        """Get style for each cell in row
+
+        Args:
+            enabled (bool, optional): Is rule enabled?. Defaults to True.
+            temp (bool, optional): Is rule temp?. Defaults to False.
+            src_neg (bool, optional): Is source negated?. Defaults to False.
+            dst_neg (bool, optional): Is destination negated?. Defaults to False.
+            serv_neg (bool, optional): Is service negated?. Defaults to False.
+            ps_neg (bool, optional): Is protection scope negated?. Defaults to False.
+
+        Returns:
+            dict: Dict of styles for cells
+        """
+        if enabled:
+            if temp:
+                default = self.style_data_temp
+                src = self.style_data_temp_neg if src_neg else default
+                dst = self.style_data_temp_neg if dst_neg else default
+                serv = self.style_data_temp_neg if serv_neg else default
+                ps = self.style_data_temp_neg if ps_neg else default
+            else:
+                default = self.style_data
+                src = self.style_data_neg if src_neg else default
+                dst = self.style_data_neg if dst_neg else default
+                serv = self.style_data_neg if serv_neg else default
+                ps = self.style_data_neg if ps_neg else default
+        else: # if rule is disabled
+            default = self.style_data_dis
+            src = self.style_data_dis_neg if src_neg else default
+            dst = self.style_data_dis_neg if dst_neg else default
+            serv = self.style_data_dis_neg if serv_neg else default
+            ps = self.style_data_dis_neg if ps_neg else default
+        return {"default": default, "source": src, "destination": dst, "service": serv, "protection-scope": ps}
+
+
+    def load_package(self, package: str, archive_key: str | None = None) -> None:
+        """ Open policy package archive and load JSONs into memory.
+        The archive is read in one pass: rulebases are kept by member name and assigned
+        to policy packages from index.json afterwards, objects of all packages share one store.
+        In stream mode array elements are parsed straight from the archive stream,
+        otherwise each file is read whole and parsed with json.loads.
+        Members of skipped kinds are passed over without being read. In selective mode with a cache
+        the first load saves offsets of the members (and gzip checkpoints, see open_archive),
+        later loads seek straight to the members they need instead of scanning the archive.
+
+        Args:
+            package (str): archive path
+            archive_key (str | None, optional): cache key of archive. Defaults to None.
+        """
+        import json
+        self._index_ = None
+        self._gwobj_ = None
+        self._store_ = None
+        self._layers_: dict[str, list | None] = {}
+        start_time = time.perf_counter()
+        members = checkpoints = None
+        if self.selective and self.cache and archive_key:
+            checkpoints = self.cache.checkpoints(archive_key)
+            cached = self.cache.load(f"{archive_key}-members")
+            members = cached['members'] if cached else None
+        # sub-phases include decompression of the member, objects include building the store
+        with open_archive(package, checkpoints) as archive:
+            if members is None:
+                files = archive
+                scanned = []
+            else:
+                files = (self.member_info(name, offset, size) for name, offset, size in members)
+                scanned = None
+            for file in files:
+                kind = member_kind(file.name)
+                if kind is None:
+                    continue
+                if scanned is not None and file.isfile():
+                    scanned.append((file.name, file.offset_data, file.size))
+                if kind in self._skipped_:
+                    if kind in self.RULEBASE_ATTRS:
+                        # claimed by a package all the same, see resolve_packages
+                        self._layers_[file.name] = None
+                    self.metrics.count('members.skipped')
+                    continue
+                self.metrics.count('members.read')
+                if kind == 'index':
+                    with archive.extractfile(file) as f, self.metrics.phase('load_package/index'):
+                        self._index_ = json.loads(f.readline())
+                elif kind in self.RULEBASE_ATTRS:
+                    with archive.extractfile(file) as f, self.metrics.phase('load_package/rulebases'):
+                        self._layers_[file.name] = self.read_json(f)
+                elif kind == 'gateway_objects':
+                    with archive.extractfile(file) as f, self.metrics.phase('load_package/gateway_objects'):
+                        self._gwobj_ = self.read_json(f)
+                else:
+                    with archive.extractfile(file) as f, self.metrics.phase('load_package/objects'):
+                        self.index_objects(iter_json_array(f) if self.stream else json.loads(f.readline()))
+            if scanned is not None and checkpoints is not None:
+                self.cache.save(f"{archive_key}-members", {'members': scanned})
+                if not checkpoints.exists() and hasattr(archive.fileobj, 'export_index'):
+                    self.cache.save_checkpoints(archive_key, archive.fileobj)
+        self._packages_ = self.resolve_packages() if self._index_ is not None else []
+        self._closures_ = GroupClosures(self._store_) if self._store_ is not None else None
+        rss = peak_rss()
+        rss = f"{rss / 2**20:.0f} MiB" if rss is not None else "n/a"
+        self.log(f"Package loaded ({'stream' if self.stream else 'full'} mode) in {time.perf_counter() - start_time:.2f}s, peak RSS {rss}")
+
+
+    @staticmethod
+    def member_info(name: str, offset: int, size: int) -> tarfile.TarInfo:
+        """ Archive member at a known offset, its header is not read again
+
+        Args:
+            name (str): member name
+            offset (int): offset of member data in the tar stream
+            size (int): member size
+
+        Returns:
+            tarfile.TarInfo: member
+        """
+        import tarfile
+        info = tarfile.TarInfo(name)
+        info.offset_data = offset
+        info.size = size
+        return info
+
+
+    def resolve_packages(self) -> list[dict]:
+        """ Assign loaded rulebases to policy packages listed in index.json.
+        A package owns the members whose names (as .json) appear in its index entry.
+        Members nobody claims go to the first package if it is the only one
+        or if index.json does not name any loaded member at all.
+
+        Returns:
+            list[dict]: packageName and rulebase attributes for each package
+        """
+        def file_names(entry) -> set[str]:
+            if isinstance(entry, dict):
+                return set().union(*map(file_names, entry.values()))
+            if isinstance(entry, list):
+                return set().union(*map(file_names, entry))
+            if isinstance(entry, str) and entry.endswith(('.json', '.html')):
+                return {entry.rsplit('.', 1)[0] + '.json'}
+            return set()
+
+        entries = self._index_.get('policyPackages', [])
+        owned = [file_names(entry) for entry in entries]
+        claimed = set().union(*owned)
+        unclaimed_to_first = len(entries) == 1 or not any(Path(member).name in claimed for member in self._layers_)
+        packages = []
+        for i, (entry, names) in enumerate(zip(entries, owned)):
+            package = {'packageName': entry['packageName']}
+            for attr, _ in LAYER_PATTERNS:
+                package[attr] = None
+            for member, layer in self._layers_.items():
+                member_name = Path(member).name
+                if member_name in names or (i == 0 and unclaimed_to_first and member_name not in claimed):
+                    for attr, pattern in LAYER_PATTERNS:
+                        if fnmatch.fnmatch(member, pattern):
+                            package[attr] = layer
+                            break
+            packages.append(package)
+        return packages
+
+
+    def read_json(self, f) -> list:
+        """ Parse rulebase JSON from archive member. Both modes return what json.loads does:
+        a document that is not an array is parsed whole in stream mode too.
+
+        Args:
+            f: archive member stream
+
+        Returns:
+            list: rulebase entries
+        """
+        import json
+        if self.stream:
+            head = f.read(1)
+            while head and head in b' \t\r\n':
+                head = f.read(1)
+            if head == b'[':
+                return list(iter_json_array(f, started=True))
+            return json.loads(head + f.read())
+        return json.loads(f.readline())
+
+
+    def index_objects(self, objects: Iterable[dict]) -> None:
+        """ Build object store over loaded objects and report its cost
+
+        Args:
+            objects (Iterable[dict]): objects
+        """
+        if self.compact:
+            objects = CompactObject.project(objects)
+        if self._store_ is None:
+            self._store_ = ObjectStore(objects)
+        else:
+            self._store_.update(objects)
+        self.log(f"Object index: {len(self._store_)} objects in {self._store_.build_time:.2f}s ({self._store_.index_size() / 2**20:.1f} MiB)")
+
+
+    def where_used(self) -> WhereUsedIndex:
+        """ Get reverse index of objects, it is built on first use
+
+        Returns:
+            WhereUsedIndex: index
+        """
+        if self._where_used_ is None:
+            with self.metrics.phase('where_used'):
+                self._where_used_ = WhereUsedIndex(self._store_, self._packages_, self._gwobj_ or [])
+            self.log(f"Where-used index: {len(self._where_used_)} objects in {self._where_used_.build_time:.2f}s")
+        return self._where_used_
+
+
+    def address_index(self) -> AddressIndex:
+        """ Get index of address objects and rules referencing them, it is built on first use
+
+        Returns:
+            AddressIndex: index
+        """
+        if self._address_index_ is None:
+            where_used = self.where_used()
+            with self.metrics.phase('address_index'):
+                self._address_index_ = AddressIndex(where_used)
+            self.log(f"Address index: {len(self._address_index_)} addresses in {self._address_index_.build_time:.2f}s")
+        return self._address_index_
+
+
+    def rule_coverage(self, package: str | None = None) -> RuleCoverage:
+        """ Get shadowed, redundant and fully covered firewall rules of a policy package, found on first use.
+        With eg Global rules take part: the ones above the placeholder are matched before Local rules.
+
+        Args:
+            package (str, optional): package name. Defaults to the package being converted, or the first one.
+
+        Raises:
+            ValueError: no such package
+
+        Returns:
+            RuleCoverage: findings
+        """
+        if package is not None or not hasattr(self, 'package_name'):
+            selected = [entry for entry in self._packages_ if package is None or entry['packageName'] == package]
+            if not selected:
+                raise ValueError(f"no policy package {package}")
+            self.select_package(selected[0])
+        key = (self.package_name, self.eg)
+        if key not in self._rule_coverage_:
+            gnet = (self._gnet_ or []) if self.eg else []
+            split = next((i for i, entry in enumerate(gnet) if entry['type'] == 'place-holder'), len(gnet))
+            rulebases = [('Global FW', gnet[:split]), ('Local FW', self._net_ or []), ('Global FW', gnet[split + 1:])]
+            with self.metrics.phase(f'{self.package_name}/rule_coverage'):
+                coverage = self._rule_coverage_[key] = RuleCoverage(self._store_, self._closures_, rulebases)
+            self.metrics.count('coverage.candidates', coverage.candidates)
+            self.log(f"Rule coverage: {len(coverage)} of {len(coverage.rules)} rules covered by earlier ones in {coverage.build_time:.2f}s")
+        return self._rule_coverage_[key]
+
+
+    def find_obj_by_uid(self, uid: str) -> dict | None:
+        """ Find object by uid
+
+        Args:
+            uid (str): object uid
+
+        Returns:
+            dict: object
+        """
+        obj = self._store_.get(uid)
+        if self.count_lookups:
+            self.metrics.count('objects.lookups')
+            if obj is None:
+                self.metrics.count('objects.misses')
+        return obj
+
+
+    def object_to_str(self, uid: str) -> str:
+        """ Represent object with a string
+
+        Args:
+            uid (str): object uid
+
+        Returns:
+            str: object representation
+        """
+        if uid in self._cached_objects_:
+            if self.count_lookups:
+                self.metrics.count('object_strings.hits')
+            return self._cached_objects_[uid]
+        if self.count_lookups:
+            self.metrics.count('object_strings.misses')
+        obj = self.find_obj_by_uid(uid)
+        if not obj:
+            result = "!OBJECT NOT FOUND!"
+            self._cached_objects_[uid] = result
+            return result
+
+        if obj['type'] in ['host', 'simple-gateway', 'simple-cluster']:
+            result = f"{obj['name']} / {obj['ipv4-address']}"
+        elif obj['type'] == 'network':
+            result = f"{obj['name']} / {obj['subnet4']}/{obj['mask-length4']}"
+        elif obj['type'] == 'service-tcp':
+            result = f"tcp/{obj['port']}"
+        elif obj['type'] == 'service-udp':
+            result = f"udp/{obj['port']}"
+        elif obj['type'] == 'CpmiAnyObject':
+            result = "Any"
+        elif obj['type'] == 'time':
+            if obj['end-never']:
+                result = obj['name']
+                if obj['comments']:
+                    result += f' ({obj['comments']})'
+            else:
+                result = f"{obj['end']['iso-8601'][:-3].replace('T', ' ')}"
+            
+        else:
+            result = obj['name']
+
+        self._cached_objects_[uid] = result
+        return result
+
+
+    def objects_to_str(self, uids: list | str) -> list:
+        """ Represent objects in list with a string
+
+        Args:
+            uids (list): list of objects uids
+
+        Returns:
+            list: list of objects representations
+        """
+        if isinstance(uids, str):
+            uids = [uids]
+        result = []
+        for uid in uids:
+            result.append(self.object_to_str(uid))
+        return result
+
+
+    @staticmethod
+    def list_to_str(l: list) -> str:
+        """ Convert list to string with new line
+
+        Args:
+            l (list): input list
+
+        Returns:
+            str
+        """
+        if not isinstance(l, list):
+            return l
+        return '\n'.join(l)
+
+
+    def expand_group(self, uids: list | str) -> list[str]:
+        """ Expand group objects. With show members every group is followed by its whole membership.
+        Expanded groups are recorded as used in the policy.
+
+        Args:
+            uids (list): list of objects uids
+
+        Returns:
+            list: list of uids of group members
+        """
+        if isinstance(uids, str):
+            uids = [uids]
+        result = []
+        for uid in uids:
+            if not isinstance(uid, str):
+                uid = uid['uid']
+            if self._closures_.is_group(uid):
+                self.mark_groups_used(uid)
+                if self.sm:
+                    result.extend(self.group_closure(uid))
+            result.append(uid)
+        # return result without duplicates
+        return list(dict.fromkeys(result))
+
+
+    def render_cell(self, uids: list | str) -> tuple[str, list[str]]:
+        """ Render objects list into cell text: expand groups, represent objects and join them.
+        Rules repeat the same lists a lot, so results are memoized by uids and show members setting.
+
+        Args:
+            uids (list): list of objects uids
+
+        Returns:
+            tuple[str, list[str]]: cell text and the text split into chunks fitting xlsx cells
+        """
+        if isinstance(uids, str):
+            uids = (uids,)
+        key = (tuple(uid if isinstance(uid, str) else uid['uid'] for uid in uids), self.sm)
+        cell = self._cached_cells_.get(key)
+        if cell is None:
+            if self.count_lookups:
+                self.metrics.count('rendered_cells.misses')
+            text = self.list_to_str(self.objects_to_str(self.expand_group(list(key[0]))))
+            cell = (text, self.split_string(text))
+            self._cached_cells_[key] = cell
+        else:
+            if self.count_lookups:
+                self.metrics.count('rendered_cells.hits')
+            # keep used groups of the current package complete for save_groups_to_files
+            for uid in key[0]:
+                if self._closures_.is_group(uid):
+                    self.mark_groups_used(uid)
+        return cell
+
+
+    def mark_groups_used(self, uid: str) -> None:
+        """ Record group and its nested groups as used in the policy
+
+        Args:
+            uid (str): group uid
+        """
+        if uid in self._cached_groups_:
+            if self.count_lookups:
+                self.metrics.count('used_groups.hits')
+            return
+        if self.count_lookups:
+            self.metrics.count('used_groups.misses')
+        self._cached_groups_[uid] = True
+        for member in self.group_closure(uid):
+            if self._closures_.is_group(member):
+                self._cached_groups_[member] = True
+
+
+    def group_closure(self, uid: str) -> tuple[str, ...]:
+        """ Get group closure, counting whether it was built already
+
+        Args:
+            uid (str): group uid
+
+        Returns:
+            tuple: members uids, see GroupClosures.get
         """
+        if self.count_lookups:
+            self.metrics.count('group_closures.hits' if uid in self._closures_ else 'group_closures.misses')
+        return self._closures_.get(uid)
+
 
+    def add_worksheet(self, name: str) -> xlsxwriter.workbook.Worksheet:
+        """ Add worksheet to workbook. In low memory mode it is wrapped to keep rows in order.
+
+        Args:
+            name (str): sheet name
+
+        Returns:
+            xlsxwriter.workbook.Worksheet: worksheet
+        """
         ws = self.wb.add_worksheet(name)
+        if self.low_memory:
+            return RowOrderedWorksheet(ws)
+        return ws
+
+
+    def finish_worksheet(self, ws: xlsxwriter.workbook.Worksheet, rows: int) -> None:
+        """ Emit rows still buffered by a low memory worksheet and count rows and cells of the sheet
+
+        Args:
+            ws (xlsxwriter.workbook.Worksheet): worksheet
+            rows (int): number of rows written, header included
+        """
+        if isinstance(ws, RowOrderedWorksheet):
+            ws.flush()
+        self.metrics.count(f'rows:{self.package_name}/{ws.name}', rows)
+        self.metrics.count('rows', rows)
+        self.metrics.count('cells', self._cells_)
+        self._cells_ = 0
+
+
+    def write(self, ws: xlsxwriter.workbook.Worksheet, row: int, extra_row: int, col: int, extra_col: int, data: str, format: xlsxwriter.workbook.Format):
+        """ Single function for xlsxwriter merge_range write.
+
+        Args:
+            ws (xlsxwriter.workbook.Worksheet): worksheet
+            row (int): row
+            extra_row (int): merge with extra rows
+            col (int): column
+            extra_col (int): merge with extra columns
+            data (str): data
+            format (xlsxwriter.workbook.Format): format
+        """
+        self._cells_ += 1
+        if extra_row or extra_col:
+            ws.merge_range(row, col, row + extra_row, col + extra_col, data, format)
+        else:
+            ws.write(row, col, data, format)
+
+
+    def write_cells(self, ws: xlsxwriter.workbook.Worksheet, row: int, values: tuple, runs: tuple) -> None:
+        """ Write a row of unmerged cells from the first column, a write_row call per run of columns
+        sharing a format instead of a write per cell
+
+        Args:
+            ws (xlsxwriter.workbook.Worksheet): worksheet
+            row (int): row
+            values (tuple): cell data
+            runs (tuple): (first column, end column, format) runs, see init_styles
+        """
+        self._cells_ += len(values)
+        for first, end, cell_format in runs:
+            # write_row stops at a string it truncates to XLSX_MAX_CELL, write goes on with the next cell
+            while first < end and ws.write_row(row, first, values[first:end], cell_format):
+                first = next((col for col in range(first, end) if isinstance(values[col], str) and len(values[col]) > XLSX_MAX_CELL), end - 1) + 1
+
+
+    @staticmethod
+    def split_string(string: str) -> list:
+        """ Split string with len() > XLSX_MAX_CELL to comply with xlsx cell's max len
+
+        Args:
+            string (str): input string
+
+        Returns:
+            list: list of strings
+        """
+        result = []
+        while len(string) > XLSX_MAX_CELL:
+            last_new_line = string[:XLSX_MAX_CELL].rindex('\n')
+            result.append(string[:last_new_line])
+            string = string[last_new_line+1:]
+        result.append(string)
+        return result
+
+
+    @staticmethod
+    def format_hits(num: int) -> str:
+        ds = [(1e15, 'Q'), (1e12, 'T'), (1e9, 'B'), (1e6, 'M'), (1e3, 'K')]
+        for d in ds:
+            head = num / d[0]
+            if head > 1:
+                return f"{head:.0f}{d[1]}"
+        return str(num)
+
+
+    def write_shards(self, kind: str, name: str, rows: Iterable[tuple]) -> None:
+        """ Write rows of a rulebase page. A sheet ends before a section that would take it past max_rows,
+        a section longer than a whole sheet ends it between rules. Further shards are sheets named
+        "Name (2)", "Name (3)"... or, with shard_files, workbooks of their own that shard workers write
+        while this one goes on. Shards of split rulebases are listed in _shards_ for the Index page.
+
+        Args:
+            kind (str): firewall, nat or tp
+            name (str): sheet name
+            rows (Iterable[tuple]): entries of the kind's rows method
+
+        Raises:
+            ValueError: a rule takes more rows than fit a sheet below its header
+        """
+        write_row = getattr(self, f'{kind}_row')
+        max_rows = min(self.max_rows, XLSX_MAX_ROWS)
+        shards = []
+        ws = buffer = None
+        row = 0
+
+        def finish() -> None:
+            shards[-1]['rows'] = row
+            if buffer is not None:
+                self.submit_shard(kind, shards[-1], buffer)
+            else:
+                self.finish_worksheet(ws, row)
+
+        def start() -> None:
+            nonlocal ws, buffer, row
+            if shards:
+                finish()
+            part = len(shards) + 1
+            sheet = name if part == 1 else f"{name} ({part})"
+            shards.append({'rulebase': name, 'part': part, 'sheet': sheet, 'file': None, 'first': None, 'last': None, 'rows': 1})
+            if part > 1 and self.shard_files:
+                shards[-1]['file'] = f"{self.package_name}.{sheet}.xlsx"
+                ws, buffer = None, []
+            else:
+                ws, buffer = self.add_worksheet(sheet), None
+                getattr(self, f'{kind}_header')(ws)
+            row = 1
+
+        start()
+        for section in self.sections(rows):
+            heights = [self.entry_height(kind, entry) for entry in section]
+            if row > 1 and row + sum(heights) > max_rows:
+                start()
+            for entry, height in zip(section, heights):
+                if 1 + height > max_rows:
+                    raise ValueError(f"{name} rule {entry[1]} takes {height} rows, max rows must be at least {1 + height}")
+                if row > 1 and row + height > max_rows:
+                    start()
+                if not entry[0].endswith('section'):
+                    shards[-1]['first'] = shards[-1]['first'] or entry[1]
+                    shards[-1]['last'] = entry[1]
+                if buffer is None:
+                    write_row(ws, row, entry)
+                else:
+                    buffer.append(entry)
+                row = row + height
+        finish()
+        if len(shards) > 1:
+            self._shards_.extend(shards)
+            self.metrics.count('shards', len(shards))
+
+
+    @staticmethod
+    def sections(rows: Iterable[tuple]) -> Iterator[list[tuple]]:
+        """ Group sheet rows by section
+
+        Args:
+            rows (Iterable[tuple]): entries of a rows method
+
+        Yields:
+            list[tuple]: section entry followed by its rules, rules before the first section come alone
+        """
+        section = []
+        for entry in rows:
+            if entry[0].endswith('section') and section:
+                yield section
+                section = []
+            section.append(entry)
+        if section:
+            yield section
+
+
+    @staticmethod
+    def entry_height(kind: str, entry: tuple) -> int:
+        """ Rows an entry takes, a firewall rule spreads cells split by split_string over several
+
+        Args:
+            kind (str): firewall, nat or tp
+            entry (tuple): entry of the kind's rows method
+
+        Returns:
+            int: rows
+        """
+        if kind == 'firewall' and entry[0] == 'rule':
+            return max(len(entry[4]), len(entry[5]))
+        return 1
+
+
+    def submit_shard(self, kind: str, shard: dict, rows: list[tuple]) -> None:
+        """ Hand a shard to a shard worker, it writes the shard's workbook
+
+        Args:
+            kind (str): firewall, nat or tp
+            shard (dict): shard, see write_shards
+            rows (list[tuple]): its entries
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        if self._shard_pool_ is None:
+            self._shard_pool_ = ProcessPoolExecutor(max_workers=max(self.jobs, 1))
+        self._shard_futures_.append(self._shard_pool_.submit(
+            write_shard_file, str(self.output_dir / shard['file']), self.package_name, kind, shard['sheet'], rows, self.low_memory))
+
+
+    def sheet_rows(self, kind: str, table: Iterable[dict]) -> Iterator[tuple]:
+        """ Rows of a rulebase from its kind's rows method. In incremental mode a row of the previous
+        conversion is reused when the fingerprint of its entry has not changed. Groups of reused rows
+        are recorded as used only for save_groups_to_files, otherwise groups.used counts rendered rows.
+
+        Args:
+            kind (str): firewall, nat or tp
+            table (Iterable[dict]): rulebase entries
+
+        Yields:
+            tuple: row, see firewall_rows
+        """
+        rows_of = getattr(self, f'{kind}_rows')
+        incremental = self._incremental_
+        if incremental is None:
+            yield from rows_of(table)
+            return
+        for entry in table:
+            key, uids = incremental.fingerprint(kind, entry)
+            row = incremental.get(key)
+            if row is None:
+                row = next(rows_of((entry,)))
+            elif self.sg == 'policy':
+                # in the order render_cell marks them, the order groups are saved in
+                for uid in uids:
+                    if self._closures_.is_group(uid):
+                        self.mark_groups_used(uid)
+            incremental.put(key, row)
+            yield row
+
+
+    def firewall_rows(self, net_table: list) -> Iterator[tuple]:
+        """ Compute firewall sheet rows: expand groups and render cells, no workbook access.
+
+        Args:
+            net_table (list): net table object
+
+        Yields:
+            tuple: ('place-holder', rule number, name), ('access-section', name) or
+                ('rule', rule number, hits, name, source chunks, destination chunks, vpn, service,
+                action, track, time, install on, comments, get_style arguments as a tuple)
+        """
+        for entry in net_table:
+            if entry['type'] == "place-holder":
+                yield ('place-holder', str(entry['rule-number']), entry['name'])
+            elif entry['type'] == "access-section":
+                yield ('access-section', entry['name'])
+            else:
+                hits = entry.get('hits')
+                if hits:
+                    hits = self.format_hits(hits['value'])
+                time = self.render_cell(entry['time'])[0]
+                yield (
+                    'rule',
+                    str(entry['rule-number']),
+                    hits,
+                    entry.get('name', ''),
+                    self.render_cell(entry['source'])[1],
+                    self.render_cell(entry['destination'])[1],
+                    self.render_cell(entry['vpn'])[0],
+                    self.render_cell(entry['service'])[0],
+                    self.list_to_str(self.objects_to_str(entry['action'])),
+                    self.list_to_str(self.objects_to_str(entry['track']['type'])),
+                    time,
+                    self.render_cell(entry['install-on'])[0],
+                    entry['comments'],
+                    (entry['enabled'], time != "Any", entry['source-negate'], entry['destination-negate'], entry['service-negate'], False),
+                )
+
+
+    def gen_firewall_sheet(self, name: str, net_table: list, rows: list[tuple] | None = None) -> None:
+        """Firewall page generation
+
+        Args:
+            name (str): page name
+            net_table (list): net table object
+            rows (list[tuple], optional): rows computed beforehand by firewall_rows. Defaults to None.
+        """
+        if rows is None:
+            rows = self.sheet_rows('firewall', self.progress(net_table, name))
+        else:
+            rows = self.progress(rows, name)
+        self.write_shards('firewall', name, rows)
+
+
+    def firewall_header(self, ws: xlsxwriter.workbook.Worksheet) -> None:
+        """ Firewall page columns and title row
+
+        Args:
+            ws (xlsxwriter.workbook.Worksheet): worksheet
+        """
         ws.outline_settings(True, False)
 
         ws.set_column('A:A', 5)
@@ -433,75 +3889,99 @@ class Cp2xlsx:
         self.write(ws, 0, 0, 11, 0, 'Comment', self.style_title)
         ws.freeze_panes(1, 0)
 
-        row = 1
-        for entry in tqdm(net_table, desc=name, ncols=100, bar_format='{desc}\t: |{bar}| {n_fmt:5}/{total_fmt:5} [{elapsed_s:.2f}s]'):
-            if entry['type'] == "place-holder":
-                self.write(ws, row, 0, 0, 0, str(entry['rule-number']), self.style_placeholder)
-                self.write(ws, row, 0, 1, 10, entry['name'], self.style_placeholder)
-            elif entry['type'] == "access-section":
-                self.write(ws, row, 0, 0, 11, entry['name'], self.style_section)
-            else:
-                rule_number = str(entry['rule-number'])
-                hits = entry.get('hits')
-                if hits:
-                    hits = self.format_hits(hits['value'])
 
-                name = entry.get('name', '')
-                source = self.split_string(self.list_to_str(self.objects_to_str(self.expand_group(entry['source']))))
-                s_trunkated_len = len(source)
-                destination = self.split_string(self.list_to_str(self.objects_to_str(self.expand_group(entry['destination']))))
-                d_trunkated_len = len(destination)
-                extra_rows = max(s_trunkated_len, d_trunkated_len) - 1
-                vpn = self.list_to_str(self.objects_to_str(self.expand_group(entry['vpn'])))
-                service = self.list_to_str(self.objects_to_str(self.expand_group(entry['service'])))
-                action = self.list_to_str(self.objects_to_str(entry['action']))
-                track = self.list_to_str(self.objects_to_str(entry['track']['type']))
-                time = self.list_to_str(self.objects_to_str(self.expand_group(entry['time'])))
-                install_on = self.list_to_str(self.objects_to_str(self.expand_group(entry['install-on'])))
-                comments = entry['comments']
-
-                style = self.get_style(
-                    enabled=entry['enabled'],
-                    temp=True if time != "Any" else False,
-                    src_neg=entry['source-negate'],
-                    dst_neg=entry['destination-negate'],
-                    serv_neg=entry['service-negate']
-                    )
-
-                self.write(ws, row, extra_rows, 0, 0, rule_number, style['default'])
-                self.write(ws, row, extra_rows, 1, 0, hits, style['default'])
-                self.write(ws, row, extra_rows, 2, 0, name, style['default'])
-                row_for_data = extra_rows // s_trunkated_len
-                s_rows_remain = extra_rows
-                for i in range(s_trunkated_len):
-                    if s_rows_remain < row_for_data:
-                        row_for_data = s_rows_remain
-                    self.write(ws, row+i, row_for_data, 3, 0, source[i], style['source'])
-                    s_rows_remain = s_rows_remain - row_for_data
-                row_for_data = extra_rows // d_trunkated_len
-                d_rows_remain = extra_rows
-                for i in range(d_trunkated_len):
-                    if d_rows_remain < row_for_data:
-                        row_for_data = d_rows_remain
-                    self.write(ws, row+i, row_for_data, 4, 0, destination[i], style['destination'])
-                    d_rows_remain = d_rows_remain - row_for_data
-                self.write(ws, row, extra_rows, 5, 0, vpn, style['default'])
-                self.write(ws, row, extra_rows, 6, 0, service, style['service'])
-                self.write(ws, row, extra_rows, 7, 0, action, style['default'])
-                self.write(ws, row, extra_rows, 8, 0, track, style['default'])
-                self.write(ws, row, extra_rows, 9, 0, time, style['default'])
-                self.write(ws, row, extra_rows, 10, 0, install_on, style['default'])
-                self.write(ws, row, extra_rows, 11, 0, comments, style['default'])
-                for i in range(extra_rows + 1):
-                    ws.set_row(row + i, None, None, {'level': 1, 'hidden': False})
-                row = row + extra_rows
-            row = row + 1
+    def firewall_row(self, ws: xlsxwriter.workbook.Worksheet, row: int, entry: tuple) -> int:
+        """ Write a firewall_rows entry
+
+        Args:
+            ws (xlsxwriter.workbook.Worksheet): worksheet
+            row (int): first row
+            entry (tuple): firewall_rows entry
+
+        Returns:
+            int: rows taken
+        """
+        if entry[0] == "place-holder":
+            self.write(ws, row, 0, 0, 0, entry[1], self.style_placeholder)
+            self.write(ws, row, 0, 1, 10, entry[2], self.style_placeholder)
+            return 1
+        if entry[0] == "access-section":
+            self.write(ws, row, 0, 0, 11, entry[1], self.style_section)
+            return 1
+        _, rule_number, hits, name, source, destination, vpn, service, action, track, time, install_on, comments, style = entry
+        s_trunkated_len = len(source)
+        d_trunkated_len = len(destination)
+        extra_rows = max(s_trunkated_len, d_trunkated_len) - 1
+        formats, runs = self._row_formats_['firewall', style]
+        if not extra_rows:
+            self.write_cells(ws, row, (rule_number, hits, name, source[0], destination[0], vpn, service, action, track, time, install_on, comments), runs)
+            ws.set_row(row, None, None, self.OUTLINE_ROW)
+            return 1
+
+        self.write(ws, row, extra_rows, 0, 0, rule_number, formats[0])
+        self.write(ws, row, extra_rows, 1, 0, hits, formats[1])
+        self.write(ws, row, extra_rows, 2, 0, name, formats[2])
+        # spread chunks over the rule's rows, the last chunk takes the remainder
+        s_offset = 0
+        for i in range(s_trunkated_len):
+            rows_for_data = (extra_rows + 1) // s_trunkated_len if i < s_trunkated_len - 1 else extra_rows + 1 - s_offset
+            self.write(ws, row + s_offset, rows_for_data - 1, 3, 0, source[i], formats[3])
+            s_offset = s_offset + rows_for_data
+        d_offset = 0
+        for i in range(d_trunkated_len):
+            rows_for_data = (extra_rows + 1) // d_trunkated_len if i < d_trunkated_len - 1 else extra_rows + 1 - d_offset
+            self.write(ws, row + d_offset, rows_for_data - 1, 4, 0, destination[i], formats[4])
+            d_offset = d_offset + rows_for_data
+        for col, data in enumerate((vpn, service, action, track, time, install_on, comments), 5):
+            self.write(ws, row, extra_rows, col, 0, data, formats[col])
+        for i in range(extra_rows + 1):
+            ws.set_row(row + i, None, None, self.OUTLINE_ROW)
+        return extra_rows + 1
+
+
+    def nat_rows(self, nat_table: list) -> Iterator[tuple]:
+        """ Compute NAT sheet rows, see firewall_rows
+
+        Args:
+            nat_table (list): NAT table object
+
+        Yields:
+            tuple: ('nat-section', name) or ('rule', rule number, original source, original destination,
+                original services, translated source, translated destination, translated services,
+                install on, comments, get_style arguments as a tuple)
+        """
+        for entry in nat_table:
+            if entry['type'] == "nat-section":
+                yield ('nat-section', entry['name'])
+            else:
+                yield (
+                    'rule',
+                    str(entry['rule-number']),
+                    self.render_cell(entry['original-source'])[0],
+                    self.render_cell(entry['original-destination'])[0],
+                    self.render_cell(entry['original-service'])[0],
+                    self.render_cell(entry['translated-source'])[0],
+                    self.render_cell(entry['translated-destination'])[0],
+                    self.render_cell(entry['translated-service'])[0],
+                    self.render_cell(entry['install-on'])[0],
+                    entry['comments'],
+                    (entry['enabled'], False, False, False, False, False),
+                )
 
 
-    def gen_nat_sheet(self, name: str, nat_table: json) -> None:
+    def gen_nat_sheet(self, name: str, nat_table: list, rows: list[tuple] | None = None) -> None:
         """ NAT page generation
         """
-        ws = self.wb.add_worksheet(name)
+        if rows is None:
+            rows = self.sheet_rows('nat', self.progress(nat_table, name))
+        else:
+            rows = self.progress(rows, name)
+        self.write_shards('nat', name, rows)
+
+
+    def nat_header(self, ws: xlsxwriter.workbook.Worksheet) -> None:
+        """ NAT page columns and title row, see firewall_header
+        """
         ws.outline_settings(True, False)
 
         ws.set_column('A:A', 5)
@@ -523,39 +4003,69 @@ class Cp2xlsx:
         self.write(ws, 0, 0, 8, 0, 'Comments', self.style_title)
         ws.freeze_panes(1, 0)
 
-        row = 1
-        for entry in tqdm(nat_table, desc=name, ncols=100, bar_format='{desc}\t: |{bar}| {n_fmt:5}/{total_fmt:5} [{elapsed_s:.2f}s]'):
-            if entry['type'] == "nat-section":
-                self.write(ws, row, 0, 0, 8, entry['name'], self.style_section)
-            else:
+
+    def nat_row(self, ws: xlsxwriter.workbook.Worksheet, row: int, entry: tuple) -> int:
+        """ Write a nat_rows entry, see firewall_row
+        """
+        if entry[0] == "nat-section":
+            self.write(ws, row, 0, 0, 8, entry[1], self.style_section)
+            return 1
+        # rule number, original source, destination, services, translated ones, install on, comments
+        self.write_cells(ws, row, entry[1:-1], self._row_formats_['nat', entry[-1]][1])
+        ws.set_row(row, None, None, self.OUTLINE_ROW)
+        return 1
+
+
+    def tp_rows(self, tp_table: list) -> Iterator[tuple]:
+        """ Compute threat prevention sheet rows, see firewall_rows
+
+        Args:
+            tp_table (list): TP table object
+
+        Yields:
+            tuple: ('threat-section', name) or ('rule', rule number, name, protected scope, source,
+                destination, protection/site, services, action, track, install on, comments, get_style arguments as a tuple)
+        """
+        for entry in tp_table:
+            if entry['type'] == "threat-section":
+                yield ('threat-section', entry['name'])
+                continue
+            elif entry['type'] == "threat-rule":
                 rule_number = str(entry['rule-number'])
-                o_source = self.list_to_str(self.objects_to_str(self.expand_group(entry['original-source'])))
-                o_destination = self.list_to_str(self.objects_to_str(self.expand_group(entry['original-destination'])))
-                o_service = self.list_to_str(self.objects_to_str(self.expand_group(entry['original-service'])))
-                t_source = self.list_to_str(self.objects_to_str(self.expand_group(entry['translated-source'])))
-                t_destination = self.list_to_str(self.objects_to_str(self.expand_group(entry['translated-destination'])))
-                t_service = self.list_to_str(self.objects_to_str(self.expand_group(entry['translated-service'])))
-                install_on = self.list_to_str(self.objects_to_str(self.expand_group(entry['install-on'])))
-                comments = entry['comments']
-                style = self.get_style(enabled=entry['enabled'])
-
-                self.write(ws, row, 0, 0, 0, rule_number, style['default'])
-                self.write(ws, row, 0, 1, 0, o_source, style['default'])
-                self.write(ws, row, 0, 2, 0, o_destination, style['default'])
-                self.write(ws, row, 0, 3, 0, o_service, style['default'])
-                self.write(ws, row, 0, 4, 0, t_source, style['default'])
-                self.write(ws, row, 0, 5, 0, t_destination, style['default'])
-                self.write(ws, row, 0, 6, 0, t_service, style['default'])
-                self.write(ws, row, 0, 7, 0, install_on, style['default'])
-                self.write(ws, row, 0, 8, 0, comments, style['default'])
-                ws.set_row(row, None, None, {'level': 1, 'hidden': False})
-            row = row + 1
+                p_site = 'N/A'
+            elif entry['type'] == "threat-exception":
+                rule_number = 'E' + str(entry['exception-number'])
+                p_site = self.render_cell(entry['protection-or-site'])[0]
+            yield (
+                'rule',
+                rule_number,
+                entry.get('name', ''),
+                self.render_cell(entry['protected-scope'])[0],
+                self.render_cell(entry['source'])[0],
+                self.render_cell(entry['destination'])[0],
+                p_site,
+                self.render_cell(entry['service'])[0],
+                self.list_to_str(self.objects_to_str(entry['action'])),
+                self.list_to_str(self.objects_to_str(entry['track'])),
+                self.render_cell(entry['install-on'])[0],
+                entry['comments'],
+                (entry['enabled'], False, entry['source-negate'], entry['destination-negate'], entry['service-negate'], entry['protected-scope-negate']),
+            )
 
 
-    def gen_tp_sheet(self, name: str, tp_table: json) -> None:
+    def gen_tp_sheet(self, name: str, tp_table: list, rows: list[tuple] | None = None) -> None:
         """ Threat prevention page generation
         """
-        ws = self.wb.add_worksheet(name)
+        if rows is None:
+            rows = self.sheet_rows('tp', self.progress(tp_table, name))
+        else:
+            rows = self.progress(rows, name)
+        self.write_shards('tp', name, rows)
+
+
+    def tp_header(self, ws: xlsxwriter.workbook.Worksheet) -> None:
+        """ Threat prevention page columns and title row, see firewall_header
+        """
         ws.set_column('A:A', 5)
         ws.set_column('B:C', 20)
         ws.set_column('D:E', 50)
@@ -577,50 +4087,1020 @@ class Cp2xlsx:
         self.write(ws, 0, 0, 10, 0, 'Comments', self.style_title)
         ws.freeze_panes(1, 0)
 
+
+    def tp_row(self, ws: xlsxwriter.workbook.Worksheet, row: int, entry: tuple) -> int:
+        """ Write a tp_rows entry, see firewall_row
+        """
+        if entry[0] == "threat-section":
+            self.write(ws, row, 0, 0, 10, entry[1], self.style_section)
+            return 1
+        # rule number, name, protected scope, source, destination, protection/site, services, action, track, install on, comments
+        self.write_cells(ws, row, entry[1:-1], self._row_formats_['tp', entry[-1]][1])
+        return 1
+
+
+    def gen_coverage_sheet(self, name: str, coverage: RuleCoverage) -> None:
+        """ Rule coverage page generation: firewall rules matched by earlier rules in full
+
+        Args:
+            name (str): page name
+            coverage (RuleCoverage): findings of the current package
+        """
+        ws = self.add_worksheet(name)
+        ws.set_column('A:A', 10)
+        ws.set_column('B:B', 5)
+        ws.set_column('C:C', 20)
+        ws.set_column('D:D', 15)
+        ws.set_column('E:E', 20)
+        ws.set_column('F:G', 15)
+
+        self.write(ws, 0, 0, 0, 0, 'Sheet', self.style_title)
+        self.write(ws, 0, 0, 1, 0, '№', self.style_title)
+        self.write(ws, 0, 0, 2, 0, 'Name', self.style_title)
+        self.write(ws, 0, 0, 3, 0, 'Status', self.style_title)
+        self.write(ws, 0, 0, 4, 0, 'Covered by', self.style_title)
+        self.write(ws, 0, 0, 5, 0, 'Action', self.style_title)
+        self.write(ws, 0, 0, 6, 0, 'Covering action', self.style_title)
+        ws.freeze_panes(1, 0)
+
         row = 1
-        for entry in tqdm(tp_table, desc=name, ncols=100, bar_format='{desc}\t: |{bar}| {n_fmt:5}/{total_fmt:5} [{elapsed_s:.2f}s]'):
-            if entry['type'] == "threat-section":
-                self.write(ws, row, 0, 0, 10, entry['name'], self.style_section)
-                row = row + 1
-                continue
-            elif entry['type'] == "threat-rule":
-                rule_number = str(entry['rule-number'])
-                p_site = 'N/A'
-            elif entry['type'] == "threat-exception":
-                rule_number = 'E' + str(entry['exception-number'])
-                p_site = self.list_to_str(self.objects_to_str(self.expand_group(entry['protection-or-site'])))
-            name = entry.get('name', '')
-            p_scope = self.list_to_str(self.objects_to_str(self.expand_group(entry['protected-scope'])))
-            source = self.list_to_str(self.objects_to_str(self.expand_group(entry['source'])))
-            destination = self.list_to_str(self.objects_to_str(self.expand_group(entry['destination'])))
-            service = self.list_to_str(self.objects_to_str(self.expand_group(entry['service'])))
-            action = self.list_to_str(self.objects_to_str(entry['action']))
-            track = self.list_to_str(self.objects_to_str(entry['track']))
-            install_on = self.list_to_str(self.objects_to_str(self.expand_group(entry['install-on'])))
-            comments = entry['comments']
-            style = self.get_style(
-                enabled=entry['enabled'],
-                src_neg=entry['source-negate'],
-                dst_neg=entry['destination-negate'],
-                serv_neg=entry['service-negate'],
-                ps_neg=entry['protected-scope-negate']
-                )
+        for finding in self.progress(coverage.findings, name):
+            # a thousand rule numbers fit a cell
+            by = '\n'.join(finding['by'][:1000])
+            if len(finding['by']) > 1000:
+                by += f"\n... {len(finding['by'])} rules"
+            self.write(ws, row, 0, 0, 0, finding['sheet'], self.style_data)
+            self.write(ws, row, 0, 1, 0, finding['rule'], self.style_data)
+            self.write(ws, row, 0, 2, 0, finding['name'], self.style_data)
+            self.write(ws, row, 0, 3, 0, finding['status'], self.style_data_neg if finding['status'] == 'shadowed' else self.style_data)
+            self.write(ws, row, 0, 4, 0, by, self.style_data)
+            self.write(ws, row, 0, 5, 0, finding['action'], self.style_data)
+            self.write(ws, row, 0, 6, 0, finding['covering_action'], self.style_data)
+            row = row + 1
+        self.finish_worksheet(ws, row)
+
+
+    def gen_index_sheet(self, name: str) -> None:
+        """ Index page of split rulebases: every shard with a link to it, its rules and rows.
+        It is the page the workbook opens on.
+
+        Args:
+            name (str): page name
+        """
+        # rows come in order, so constant memory mode needs no RowOrderedWorksheet
+        ws = self.wb.add_worksheet(name)
+        ws.set_column('A:A', 15)
+        ws.set_column('B:B', 5)
+        ws.set_column('C:C', 20)
+        ws.set_column('D:D', 40)
+        ws.set_column('E:G', 10)
+
+        self.write(ws, 0, 0, 0, 0, 'Rulebase', self.style_title)
+        self.write(ws, 0, 0, 1, 0, 'Part', self.style_title)
+        self.write(ws, 0, 0, 2, 0, 'Sheet', self.style_title)
+        self.write(ws, 0, 0, 3, 0, 'File', self.style_title)
+        self.write(ws, 0, 0, 4, 0, 'First rule', self.style_title)
+        self.write(ws, 0, 0, 5, 0, 'Last rule', self.style_title)
+        self.write(ws, 0, 0, 6, 0, 'Rows', self.style_title)
+        ws.freeze_panes(1, 0)
 
-            self.write(ws, row, 0, 0, 0, rule_number, style['default'])
-            self.write(ws, row, 0, 1, 0, name, style['default'])
-            self.write(ws, row, 0, 2, 0, p_scope, style['protection-scope'])
-            self.write(ws, row, 0, 3, 0, source, style['source'])
-            self.write(ws, row, 0, 4, 0, destination, style['destination'])
-            self.write(ws, row, 0, 5, 0, p_site, style['default'])
-            self.write(ws, row, 0, 6, 0, service, style['service'])
-            self.write(ws, row, 0, 7, 0, action, style['default'])
-            self.write(ws, row, 0, 8, 0, track, style['default'])
-            self.write(ws, row, 0, 9, 0, install_on, style['default'])
-            self.write(ws, row, 0, 10, 0, comments, style['default'])
+        row = 1
+        for shard in self._shards_:
+            if shard['file']:
+                link = f"external:{shard['file']}#'{shard['sheet']}'!A1"
+            else:
+                link = f"internal:'{shard['sheet']}'!A1"
+            self.write(ws, row, 0, 0, 0, shard['rulebase'], self.style_data)
+            self.write(ws, row, 0, 1, 0, shard['part'], self.style_data)
+            ws.write_url(row, 2, link, self.style_data, shard['sheet'])
+            self.write(ws, row, 0, 3, 0, shard['file'] or Path(self.wb.filename).name, self.style_data)
+            self.write(ws, row, 0, 4, 0, shard['first'], self.style_data)
+            self.write(ws, row, 0, 5, 0, shard['last'], self.style_data)
+            self.write(ws, row, 0, 6, 0, shard['rows'] - 1, self.style_data)
             row = row + 1
+        ws.activate()
+        self.finish_worksheet(ws, row)
+
+
+class ServiceBusy(Exception):
+    """ Conversion service has as many pending jobs as it accepts
+    """
+
+
+class ConversionJob:
+    """ Conversion request of ConversionService and its outcome
+    """
+    def __init__(self, archive: Path, options: dict, output_dir: Path) -> None:
+        import uuid
+        self.id = uuid.uuid4().hex
+        self.archive = archive
+        self.options = options
+        self.output_dir = output_dir
+        self.status = 'queued'
+        self.files: list[str] = []
+        self.error: str | None = None
+        self.elapsed: float | None = None
+        self.done = threading.Event()
+
+
+    def to_dict(self) -> dict:
+        """ Job state for clients
+
+        Returns:
+            dict: id, status, options, output file names, error and conversion time
+        """
+        return {
+            'id': self.id,
+            'status': self.status,
+            'archive': self.archive.name,
+            'options': {key: value for key, value in self.options.items() if key != 'jobs'},
+            'files': self.files,
+            'error': self.error,
+            'elapsed': self.elapsed,
+        }
+
+
+class ConversionService:
+    """ Archive conversions for the serve subcommand.
+    Jobs run on a pool of worker threads of this process, so imports, parsed packages (kept by
+    archive hash in a MemoryPackageCache) and their group closures stay warm between requests.
+    Jobs of one archive run one at a time and share its parsed state, other archives run side by side.
+    At most workers + max_queue jobs are pending, submit raises ServiceBusy beyond that.
+    Output of the last keep_jobs finished jobs is kept in workdir.
+    Archives already on the server are converted only from under archive_root, without it only uploads are.
+    """
+    def __init__(self, workdir: Path, cache: MemoryPackageCache, workers: int = 2, max_queue: int = 16, keep_jobs: int = 100, max_upload: int = 1024 * 2**20, archive_root: Path | None = None) -> None:
+        from concurrent.futures import ThreadPoolExecutor
+        self.workdir = Path(workdir)
+        self.uploads_dir = self.workdir / 'uploads'
+        self.jobs_dir = self.workdir / 'jobs'
+        self.uploads_dir.mkdir(parents=True, exist_ok=True)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = cache
+        self.workers = workers
+        self.max_queue = max_queue
+        self.keep_jobs = keep_jobs
+        self.max_upload = max_upload
+        self.archive_root = Path(archive_root).resolve() if archive_root else None
+        self._executor_ = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cp2xlsx-job')
+        self._jobs_: OrderedDict[str, ConversionJob] = OrderedDict()
+        self._archive_locks_: dict[str, threading.Lock] = {}
+        self._pending_ = 0
+        self._lock_ = threading.Lock()
+
+
+    @staticmethod
+    def flag(name: str, value) -> bool:
+        """ Boolean request option
+
+        Args:
+            name (str): option name
+            value: bool or string such as 1, true, yes, 0, false, no
+
+        Raises:
+            ValueError: value is not a boolean
+
+        Returns:
+            bool: value
+        """
+        if isinstance(value, bool):
+            return value
+        if str(value).lower() in ('1', 'true', 'yes', 'y'):
+            return True
+        if str(value).lower() in ('0', 'false', 'no', 'n'):
+            return False
+        raise ValueError(f"{name}: expected a boolean, got {value!r}")
+
+
+    @classmethod
+    def parse_options(cls, values: dict) -> dict:
+        """ Cp2xlsx keyword arguments from request options.
+        Unset options default to those of batch mode: eg and sm on, no groups saved.
+
+        Args:
+            values (dict): eg, sm, sg, groups_format (zip or jsonl), format (a name or a list) and coverage
+
+        Raises:
+            ValueError: unknown option or value
+
+        Returns:
+            dict: keyword arguments
+        """
+        unknown = set(values) - {'eg', 'sm', 'sg', 'groups_format', 'format', 'coverage'}
+        if unknown:
+            raise ValueError(f"unknown options: {', '.join(sorted(unknown))}")
+        sg = values.get('sg', 'no')
+        if sg not in ('no', 'policy', 'all'):
+            raise ValueError(f"sg: expected no, policy or all, got {sg!r}")
+        # a directory of txt files can not be sent back, groups come in one file
+        groups_format = values.get('groups_format', 'zip')
+        if groups_format not in ('zip', 'jsonl'):
+            raise ValueError(f"groups_format: expected zip or jsonl, got {groups_format!r}")
+        formats = values.get('format', ['xlsx'])
+        formats = list(dict.fromkeys([formats] if isinstance(formats, str) else formats))
+        for fmt in formats:
+            if fmt not in ('xlsx', *RECORD_WRITERS):
+                raise ValueError(f"format: expected xlsx, {', '.join(RECORD_WRITERS)}, got {fmt!r}")
+        if 'parquet' in formats and not ParquetWriter.available():
+            raise ValueError("format: parquet output needs pyarrow on the server")
+        return {
+            'eg': cls.flag('eg', values.get('eg', True)),
+            'sm': cls.flag('sm', values.get('sm', True)),
+            'sg': sg,
+            'groups_format': groups_format,
+            'formats': formats,
+            'coverage': cls.flag('coverage', values.get('coverage', False)),
+            'jobs': 1,
+        }
+
+
+    def busy(self) -> bool:
+        """ Check if a new job would be refused
+
+        Returns:
+            bool: True if pending jobs are at the limit
+        """
+        with self._lock_:
+            return self._pending_ >= self.workers + self.max_queue
+
+
+    def server_archive(self, path: str) -> Path:
+        """ Archive on the server a client asked for by path, relative paths are taken from archive_root
+
+        Args:
+            path (str): archive path
+
+        Raises:
+            ValueError: paths are not allowed, the path leads out of archive_root or there is no file
+
+        Returns:
+            Path: resolved archive path
+        """
+        if self.archive_root is None:
+            raise ValueError("path: archives on the server are not allowed, upload the archive")
+        archive = (self.archive_root / path).resolve()
+        if not archive.is_relative_to(self.archive_root):
+            raise ValueError(f"path: {path!r} is outside of the archive root")
+        if not archive.is_file():
+            raise ValueError(f"path: no archive at {path!r}")
+        return archive
+
+
+    def store_upload(self, stream, length: int) -> Path:
+        """ Save uploaded archive named after its SHA-256, an archive uploaded before is replaced by the same bytes
+
+        Args:
+            stream: binary stream of request body
+            length (int): body length
+
+        Raises:
+            ValueError: body is shorter than length
+
+        Returns:
+            Path: archive path
+        """
+        import hashlib
+        import uuid
+        digest = hashlib.sha256()
+        tmp_path = self.uploads_dir / f".{uuid.uuid4().hex}.tmp"
+        try:
+            with tmp_path.open('wb') as f:
+                remaining = length
+                while remaining:
+                    chunk = stream.read(min(1 << 20, remaining))
+                    if not chunk:
+                        raise ValueError("upload ended before Content-Length bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            path = self.uploads_dir / f"{digest.hexdigest()}.tar.gz"
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return path
+
+
+    def submit(self, archive: Path, options: dict) -> ConversionJob:
+        """ Queue conversion of archive
+
+        Args:
+            archive (Path): archive path
+            options (dict): Cp2xlsx keyword arguments, see parse_options
+
+        Raises:
+            ServiceBusy: too many pending jobs
+
+        Returns:
+            ConversionJob: job
+        """
+        import uuid
+        with self._lock_:
+            if self._pending_ >= self.workers + self.max_queue:
+                raise ServiceBusy(f"{self._pending_} jobs pending")
+            self._pending_ += 1
+            job = ConversionJob(archive, options, self.jobs_dir / uuid.uuid4().hex)
+            self._jobs_[job.id] = job
+            self.forget_jobs()
+        self._executor_.submit(self.run, job)
+        return job
+
+
+    def forget_jobs(self) -> None:
+        """ Remove output and uploads of the oldest finished jobs over keep_jobs, called under the lock
+        """
+        import shutil
+        finished = [job for job in self._jobs_.values() if job.done.is_set()]
+        for job in finished[:max(len(finished) - self.keep_jobs, 0)]:
+            del self._jobs_[job.id]
+            shutil.rmtree(job.output_dir, ignore_errors=True)
+            if job.archive.parent == self.uploads_dir and all(other.archive != job.archive for other in self._jobs_.values()):
+                job.archive.unlink(missing_ok=True)
+
+
+    def run(self, job: ConversionJob) -> None:
+        """ Convert archive of job in a worker thread
+
+        Args:
+            job (ConversionJob): job
+        """
+        import tarfile
+        import traceback
+        job.status = 'running'
+        start_time = time.perf_counter()
+        try:
+            key = PackageCache.key(str(job.archive))
+            with self._lock_:
+                archive_lock = self._archive_locks_.setdefault(key, threading.Lock())
+            with archive_lock:
+                Cp2xlsx(str(job.archive), output_dir=str(job.output_dir), quiet=True, cache=self.cache, archive_key=key, **job.options)
+            job.files = sorted(path.name for path in job.output_dir.iterdir() if path.is_file())
+            job.status = 'done'
+        except (PackageError, OSError, tarfile.TarError) as e:
+            job.status = 'failed'
+            job.error = str(e)
+        except Exception as e:
+            job.status = 'failed'
+            job.error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        finally:
+            job.elapsed = time.perf_counter() - start_time
+            with self._lock_:
+                self._pending_ -= 1
+            job.done.set()
+
+
+    def job(self, job_id: str) -> ConversionJob | None:
+        """ Get job by id
+
+        Args:
+            job_id (str): job id
+
+        Returns:
+            ConversionJob | None: job, None if unknown or forgotten
+        """
+        with self._lock_:
+            return self._jobs_.get(job_id)
+
+
+    def status(self) -> dict:
+        """ Service state for clients
+
+        Returns:
+            dict: version, worker and queue limits, pending jobs and parsed packages in memory
+        """
+        with self._lock_:
+            return {
+                'version': VERSION,
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'pending': self._pending_,
+                'jobs': len(self._jobs_),
+                'packages': self.cache.entries(),
+            }
+
+
+    def close(self) -> None:
+        """ Wait for pending jobs and stop the worker threads
+        """
+        self._executor_.shutdown(wait=True)
+
+
+def find_archives(paths: list[str]) -> list[Path]:
+    """ Expand directories into the policy package archives they contain, an archive given twice is kept once
+
+    Args:
+        paths (list[str]): archive or directory paths
+
+    Returns:
+        list[Path]: archive paths
+    """
+    archives = {}
+    for path in map(Path, paths):
+        if path.is_dir():
+            found = sorted(p for p in path.iterdir() if p.name.endswith(('.tar.gz', '.tgz')))
+        else:
+            found = [path]
+        for archive in found:
+            archives.setdefault(archive.resolve(), archive)
+    return list(archives.values())
+
+
+def convert_archive(package: Path, output_dir: Path, options: dict, profile: str | None = None) -> tuple[str, float, dict]:
+    """ Convert one archive without any console interaction. Runs in a worker process.
+
+    Args:
+        package (Path): archive path
+        output_dir (Path): directory for xlsx and group files
+        options (dict): Cp2xlsx keyword arguments
+        profile (str | None, optional): cProfile stats file. Defaults to None.
+
+    Returns:
+        tuple[str, float, dict]: xlsx file name, conversion time and metrics report
+    """
+    import cProfile
+    start_time = time.perf_counter()
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        cp = Cp2xlsx(str(package), output_dir=str(output_dir), quiet=True, **options)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile)
+    return cp.get_filename(), time.perf_counter() - start_time, cp.metrics.report()
+
+
+def archive_stem(archive: Path) -> str:
+    """ Archive name without .tar.gz or .tgz
+
+    Args:
+        archive (Path): archive path
+
+    Returns:
+        str: name
+    """
+    return archive.name.removesuffix('.tgz').removesuffix('.tar.gz')
+
+
+def archive_dir_names(archives: list[Path]) -> dict[Path, str]:
+    """ Output subdirectory names of batch mode: the archive name without extension, unless another
+    archive has the same one (a.tgz and a.tar.gz, x/p.tgz and y/p.tgz, also ignoring case). Such
+    names get a digest of the archive path, so every archive gets its own directory, the same on every run.
+
+    Args:
+        archives (list[Path]): archive paths
+
+    Returns:
+        dict[Path, str]: directory name by archive
+    """
+    import hashlib
+    stems = Counter(archive_stem(archive).casefold() for archive in archives)
+    names = {}
+    for archive in archives:
+        name = archive_stem(archive)
+        if stems[name.casefold()] > 1:
+            name = f"{name}-{hashlib.sha256(str(archive.resolve()).encode()).hexdigest()[:8]}"
+        names[archive] = name
+    return names
+
+
+def batch_convert(paths: list[str], jobs: int, output_dir: str, metrics: str | None = None, profile: str | None = None, **options) -> int:
+    """ Convert many archives in parallel worker processes.
+    Output of each archive goes to its own subdirectory of output_dir, named after the archive, see archive_dir_names.
+
+    Args:
+        paths (list[str]): archive or directory paths
+        jobs (int): number of worker processes
+        output_dir (str): output directory
+        metrics (str | None, optional): JSON file for metrics of every archive. Defaults to None.
+        profile (str | None, optional): cProfile stats file, every archive gets its own one named after it. Defaults to None.
+
+    Returns:
+        int: exit code, 1 if any archive failed
+    """
+    import json
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    archives = find_archives(paths)
+    dir_names = archive_dir_names(archives)
+    results = {}
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for archive in archives:
+            archive_dir = Path(output_dir) / dir_names[archive]
+            archive_profile = None
+            if profile:
+                archive_profile = str(Path(profile).with_name(f"{Path(profile).stem}-{dir_names[archive]}{Path(profile).suffix}"))
+            futures[executor.submit(convert_archive, archive, archive_dir, options, archive_profile)] = archive
+        for future in as_completed(futures):
+            archive = futures[future]
+            try:
+                results[archive] = future.result()
+            except Exception as e:
+                results[archive] = e
+            print(f"[{len(results)}/{len(archives)}] {archive}")
+
+    failed = 0
+    for archive in archives:
+        result = results[archive]
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"FAIL  {archive}: {type(result).__name__}: {result}")
+        else:
+            print(f"OK    {archive} -> {result[0]} [{result[1]:.2f}s]")
+    print(f"{len(archives) - failed} of {len(archives)} archives converted in {time.perf_counter() - start_time:.2f}s, {failed} failed.")
+    if metrics:
+        reports = {str(archive): results[archive][2] for archive in archives if not isinstance(results[archive], Exception)}
+        Path(metrics).write_text(json.dumps(reports, indent=2), encoding="UTF-8")
+    return 1 if failed or not archives else 0
+
+
+def inspect_archive(package: str) -> dict:
+    """ Policy packages of an archive, their rulebases and the object members, with sizes and counts.
+    Only index.json is parsed, rules and objects are counted by their type fields (count_types)
+    as the archive streams by, so nothing is decoded, indexed or rendered.
+
+    Args:
+        package (str): archive path
+
+    Raises:
+        PackageError: index.json is missing
+
+    Returns:
+        dict: archive, size, packages with their rulebases, objects and gateway_objects members
+    """
+    import json
+    import tarfile
+    index = None
+    members = {}
+    with tarfile.open(package, 'r|gz') as archive:
+        for member in archive:
+            kind = member_kind(member.name)
+            if kind is None or not member.isfile():
+                continue
+            with archive.extractfile(member) as f:
+                if kind == 'index':
+                    index = json.loads(f.read())
+                else:
+                    members[member.name] = {'member': member.name, 'kind': kind, 'size': member.size, 'types': dict(count_types(f))}
+    if index is None:
+        raise PackageError("File index.json is not found! Check archive integrity.")
+
+    # the members a package owns are resolved like loaded rulebases are
+    cp = Cp2xlsx.__new__(Cp2xlsx)
+    cp._index_ = index
+    cp._layers_ = {name: info for name, info in members.items() if info['kind'] in Cp2xlsx.RULEBASE_ATTRS}
+    sheets = {'_gnet_': 'Global FW', '_net_': 'Local FW', '_nat_': 'NAT table', '_tp_': 'TP table'}
+    packages = []
+    for package_layers in cp.resolve_packages():
+        rulebases = []
+        for attr, sheet in sheets.items():
+            info = package_layers[attr]
+            if info is not None:
+                rules = sum(count for kind, count in info['types'].items() if kind.endswith('-rule') or kind == 'threat-exception')
+                sections = sum(count for kind, count in info['types'].items() if kind.endswith('-section'))
+                rulebases.append({'sheet': sheet, 'member': info['member'], 'size': info['size'], 'rules': rules, 'sections': sections})
+        packages.append({'name': package_layers['packageName'], 'rulebases': rulebases})
+    objects = [{'member': info['member'], 'size': info['size'], 'objects': sum(info['types'].values())}
+               for info in members.values() if info['kind'] in ('objects', 'gateway_objects')]
+    return {'archive': str(package), 'size': Path(package).stat().st_size, 'packages': packages, 'objects': objects}
+
+
+def inspect_main(args: list[str]) -> int:
+    """ inspect subcommand: print policy packages of archives with rule and object counts without converting them
+
+    Args:
+        args (list[str]): command line arguments after "inspect"
+
+    Returns:
+        int: exit code
+    """
+    import json
+    parser = argparse.ArgumentParser(prog="cp2xlsx inspect", description="List policy packages of archives with rule and object counts, without converting them", formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("file", nargs="+", help="path to policy package file or directory with them")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per archive")
+    args = parser.parse_args(args)
+
+    failed = 0
+    for archive in find_archives(args.file):
+        try:
+            result = inspect_archive(str(archive))
+        except (OSError, PackageError, EOFError) as e:
+            failed += 1
+            print(f"{archive}: {e}", file=sys.stderr)
+            continue
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False))
+            continue
+        print(f"{archive} ({result['size'] / 2**20:.1f} MiB)")
+        for package in result['packages']:
+            print(f"  {package['name']}")
+            if not package['rulebases']:
+                print("    no rulebases")
+            for rulebase in package['rulebases']:
+                sections = f", {rulebase['sections']} sections" if rulebase['sections'] else ""
+                print(f"    {rulebase['sheet']:10} {rulebase['rules']:8} rules{sections:16} {rulebase['size'] / 2**20:8.1f} MiB  {rulebase['member']}")
+        for objects in result['objects']:
+            print(f"  {objects['objects']:19} objects {'':14} {objects['size'] / 2**20:8.1f} MiB  {objects['member']}")
+    return 1 if failed else 0
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser) -> None:
+    """ Add the parsed package cache options to a command line parser
+
+    Args:
+        parser (argparse.ArgumentParser): parser
+    """
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--cache", action="store_true", help="keep parsed packages in a cache on disk and load them from it on later runs;\nentries are pickles, use a --cache-dir no other user can write")
+    group.add_argument("--no-cache", action="store_true", help="do not use the parsed package cache (default)")
+    parser.add_argument("--cache-dir", default=None, help="parsed package cache directory (default: user cache directory)")
+    parser.add_argument("--cache-size", type=int, default=1024, help="parsed package cache size limit in MiB (default: 1024)")
+
+
+def package_cache(args: argparse.Namespace) -> PackageCache | None:
+    """ Parsed package cache selected by the options of add_cache_arguments
+
+    Args:
+        args (argparse.Namespace): parsed command line arguments
+
+    Returns:
+        PackageCache: cache or None when it is not enabled
+    """
+    if not args.cache:
+        return None
+    return PackageCache(args.cache_dir, args.cache_size * 2**20)
+
+
+def query_main(args: list[str]) -> int:
+    """ query subcommand: print rules referencing addresses without converting the package
+
+    Args:
+        args (list[str]): command line arguments after "query"
+
+    Returns:
+        int: exit code
+    """
+    import json
+    parser = argparse.ArgumentParser(prog="cp2xlsx query", description="Find rules referencing IP addresses or prefixes, directly or through groups", formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("file", help="path to policy package file")
+    parser.add_argument("address", nargs="*", help="IPv4/IPv6 address or prefix, e.g. 10.1.2.3 or 10.1.0.0/16")
+    parser.add_argument("-i", "--input", default=None, help="file with one address or prefix per line, # starts a comment")
+    parser.add_argument("--no-any", action="store_true", help="skip rules matching only through Any")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per address")
+    parser.add_argument("--no-stream", action="store_true", help="parse each archive file whole instead of streaming it")
+    add_cache_arguments(parser)
+    args = parser.parse_args(args)
+
+    addresses = list(args.address)
+    if args.input:
+        with open(args.input, encoding="UTF-8") as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    addresses.append(line)
+    if not addresses:
+        parser.error("no addresses given")
+
+    cache = package_cache(args)
+    try:
+        cp = Cp2xlsx.open(args.file, sm=False, stream=not args.no_stream, cache=cache)
+    except PackageError as e:
+        print(e, file=sys.stderr)
+        return 1
+    index = cp.address_index()
+    failed = 0
+    start_time = time.perf_counter()
+    for address in addresses:
+        try:
+            matches = index.query(address, include_any=not args.no_any)
+        except ValueError as e:
+            failed += 1
+            print(f"{address}: {e}", file=sys.stderr)
+            continue
+        if args.json:
+            print(json.dumps({'address': address, 'matches': matches}, ensure_ascii=False))
+            continue
+        print(address)
+        if not matches:
+            print("  no rules")
+        for match in matches:
+            via = f" ({match['via']})" if match['via'] != match['object'] else ""
+            negated = " [negated]" if match['negated'] else ""
+            print(f"  {match['package']} / {match['sheet']} rule {match['rule']} {match['name']!r} {match['field']}: {match['object']}{via}{negated}")
+    print(f"{len(addresses)} addresses queried in {(time.perf_counter() - start_time) * 1000:.1f} ms, "
+          f"index of {len(index)} addresses built in {index.build_time * 1000:.1f} ms", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def where_used_main(args: list[str]) -> int:
+    """ where-used subcommand: print groups and rules using objects, export unused objects and groups
+
+    Args:
+        args (list[str]): command line arguments after "where-used"
+
+    Returns:
+        int: exit code
+    """
+    import json
+    parser = argparse.ArgumentParser(prog="cp2xlsx where-used", description="Find groups and rules using objects, list objects and groups nothing uses", formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("file", help="path to policy package file")
+    parser.add_argument("object", nargs="*", help="object name or uid")
+    parser.add_argument("-u", "--unused", default=None, metavar="DIR", help="write unused-objects.txt and unused-groups.txt to DIR\nlines are: object, type, uid separated by tabs")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per object")
+    parser.add_argument("--no-stream", action="store_true", help="parse each archive file whole instead of streaming it")
+    add_cache_arguments(parser)
+    args = parser.parse_args(args)
+    if not args.object and not args.unused:
+        parser.error("no objects given and no --unused")
+
+    cache = package_cache(args)
+    try:
+        cp = Cp2xlsx.open(args.file, sm=False, stream=not args.no_stream, cache=cache)
+    except PackageError as e:
+        print(e, file=sys.stderr)
+        return 1
+    index = cp.where_used()
+    failed = 0
+    for name in args.object:
+        objects = [index.get(name)] if index.get(name) else [obj for obj in index if obj['name'] == name]
+        if not objects:
+            failed += 1
+            print(f"{name}: object is not found", file=sys.stderr)
+        for obj in objects:
+            result = index.where_used(obj['uid'])
+            groups = [index.get(uid)['name'] for uid in result['groups']]
+            if args.json:
+                rules = [{**rule, 'via': index.get(rule['via'])['name'] if rule['via'] else None} for rule in result['rules']]
+                print(json.dumps({'object': obj['name'], 'uid': obj['uid'], 'type': obj['type'], 'groups': groups, 'rules': rules}, ensure_ascii=False))
+                continue
+            print(f"{obj['name']} ({obj['type']}, {obj['uid']})")
+            for group in groups:
+                print(f"  group {group}")
+            if not result['rules']:
+                print("  no rules")
+            for rule in result['rules']:
+                via = f" via {index.get(rule['via'])['name']}" if rule['via'] else ""
+                negated = " [negated]" if rule['negated'] else ""
+                print(f"  {rule['package']} / {rule['sheet']} rule {rule['rule']} {rule['name']!r} {rule['field']}{via}{negated}")
+
+    if args.unused:
+        dir_path = Path(args.unused)
+        dir_path.mkdir(parents=True, exist_ok=True)
+        for file_name, uids in zip(("unused-objects.txt", "unused-groups.txt"), index.unused()):
+            with (dir_path / file_name).open("w", encoding="UTF-8") as file:
+                for uid in uids:
+                    file.write(f"{cp.object_to_str(uid)}\t{index.get(uid)['type']}\t{uid}\n")
+            print(f"{len(uids)} lines written to {dir_path / file_name}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def diff_main(args: list[str]) -> int:
+    """ diff subcommand: write workbook with rules and objects changed between two archives
+
+    Args:
+        args (list[str]): command line arguments after "diff"
+
+    Returns:
+        int: exit code
+    """
+    parser = argparse.ArgumentParser(prog="cp2xlsx diff", description="Compare two policy package archives", formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("old", help="path to older policy package file")
+    parser.add_argument("new", help="path to newer policy package file")
+    parser.add_argument("-sm", "--show-members", action="store_true", help="show group members")
+    parser.add_argument("-o", "--output-dir", default=".", help="output directory (default: current directory)")
+    parser.add_argument("--no-stream", action="store_true", help="parse each archive file whole instead of streaming it")
+    add_cache_arguments(parser)
+    args = parser.parse_args(args)
+
+    cache = package_cache(args)
+    start_time = time.perf_counter()
+    try:
+        old = Cp2xlsx.open(args.old, sm=args.show_members, stream=not args.no_stream, cache=cache, compact=False)
+        new = Cp2xlsx.open(args.new, sm=args.show_members, stream=not args.no_stream, cache=cache, compact=False)
+    except PackageError as e:
+        print(e)
+        return 1
+    diff = PolicyDiff(old, new)
+    for (items, change), count in sorted(diff.summary().items()):
+        print(f"{items} {change}: {count}")
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    filename = diff.save(str(output_dir / f"diff-{archive_stem(Path(args.old))}-{archive_stem(Path(args.new))}.xlsx"))
+    print(f"File {filename} was written in {time.perf_counter() - start_time:.2f} seconds (compared in {diff.build_time:.2f}s).")
+    return 0
+
+
+def serve_main(args: list[str]) -> int:
+    """ serve subcommand: convert archives for local HTTP clients, see ServiceRequestHandler
+
+    Args:
+        args (list[str]): command line arguments after "serve"
+
+    Returns:
+        int: exit code
+    """
+    import shutil
+    import socketserver
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    parser = argparse.ArgumentParser(prog="cp2xlsx serve", description="Convert policy package archives for local HTTP clients, keeping parsed packages in memory", formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port, 0 picks a free one (default: 8765)")
+    parser.add_argument("--socket", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=2, help="conversions running at once (default: 2)")
+    parser.add_argument("--queue", type=int, default=16, help="jobs waiting for a worker before requests get 503 (default: 16)")
+    parser.add_argument("--packages", type=int, default=8, help="parsed archives kept in memory (default: 8)")
+    parser.add_argument("--keep-jobs", type=int, default=100, help="finished jobs whose output is kept (default: 100)")
+    parser.add_argument("--max-upload", type=int, default=1024, help="archive upload size limit in MiB (default: 1024)")
+    parser.add_argument("--workdir", default=None, help="directory for uploads and job output (default: temporary directory removed on exit)")
+    parser.add_argument("--archive-root", default=None, help="directory whose archives clients may convert by path instead of uploading them\n(default: uploads only)")
+    add_cache_arguments(parser)
+    args = parser.parse_args(args)
+    if args.socket and not hasattr(socketserver, 'UnixStreamServer'):
+        parser.error("Unix sockets are not supported on this platform")
+
+    cache = MemoryPackageCache(args.cache_dir, args.cache_size * 2**20, max_entries=args.packages, persist=args.cache)
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix='cp2xlsx-serve-'))
+    service = ConversionService(workdir, cache, args.workers, args.queue, args.keep_jobs, args.max_upload * 2**20, args.archive_root)
+
+    class ServiceRequestHandler(BaseHTTPRequestHandler):
+        """ HTTP interface of ConversionService, the server has it in its service attribute.
+        serve_main defines it, so http.server is imported by the serve subcommand only.
+
+        GET  /health                 service state
+        POST /jobs                   body is an archive (any content type but JSON), options are query parameters:
+                                     eg, sm, sg, groups_format, format (repeated), wait.
+                                     Or body is JSON with the archive path under --archive-root and the same options.
+                                     Answer is 202 with the job, with wait=1 the output file itself once ready
+                                     (or the job if there are several files), 503 when the queue is full
+        GET  /jobs/ID[?wait=1]       job state
+        GET  /jobs/ID/files/NAME     output file
+        """
+        server_version = f"cp2xlsx/{VERSION}"
+        CONTENT_TYPES = {
+            '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            '.csv': 'text/csv; charset=utf-8',
+            '.jsonl': 'application/x-ndjson',
+            '.parquet': 'application/vnd.apache.parquet',
+            '.zip': 'application/zip',
+        }
+
+        def do_GET(self) -> None:
+            from urllib.parse import parse_qs, urlsplit
+            service = self.server.service
+            url = urlsplit(self.path)
+            parts = [part for part in url.path.split('/') if part]
+            if parts == ['health']:
+                self.send_json(200, service.status())
+                return
+            if len(parts) in (2, 4) and parts[0] == 'jobs':
+                job = service.job(parts[1])
+                if job is None:
+                    self.send_json(404, {'error': f"no job {parts[1]}"})
+                    return
+                if len(parts) == 2:
+                    try:
+                        wait = service.flag('wait', parse_qs(url.query).get('wait', ['0'])[-1])
+                    except ValueError as e:
+                        self.send_json(400, {'error': str(e)})
+                        return
+                    if wait:
+                        job.done.wait()
+                    self.send_json(200, job.to_dict())
+                    return
+                if parts[2] == 'files' and parts[3] in job.files:
+                    self.send_file(job.output_dir / parts[3])
+                    return
+            self.send_json(404, {'error': f"not found: {url.path}"})
+
+
+        def do_POST(self) -> None:
+            import json
+            from urllib.parse import parse_qs, urlsplit
+            service = self.server.service
+            url = urlsplit(self.path)
+            if [part for part in url.path.split('/') if part] != ['jobs']:
+                self.send_json(404, {'error': f"not found: {url.path}"})
+                return
+            options = {key: values if key == 'format' else values[-1] for key, values in parse_qs(url.query).items()}
+            length = int(self.headers.get('Content-Length') or 0)
+            if service.busy():
+                self.send_json(503, {'error': "too many pending jobs, retry later"}, {'Retry-After': '5'})
+                return
+            try:
+                if self.headers.get_content_type() == 'application/json':
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                    if not isinstance(request, dict):
+                        raise ValueError("JSON body must be an object")
+                    options.update(request)
+                    archive = service.server_archive(str(options.pop('path', '')))
+                elif not length:
+                    raise ValueError("send an archive as the body or JSON with its path")
+                elif length > service.max_upload:
+                    self.send_json(413, {'error': f"archive is over {service.max_upload} bytes"})
+                    return
+                else:
+                    archive = None
+                wait = service.flag('wait', options.pop('wait', False))
+                options = service.parse_options(options)
+                if archive is None:
+                    archive = service.store_upload(self.rfile, length)
+                job = service.submit(archive, options)
+            except ServiceBusy:
+                self.send_json(503, {'error': "too many pending jobs, retry later"}, {'Retry-After': '5'})
+                return
+            except ValueError as e:
+                self.send_json(400, {'error': str(e)})
+                return
+            if not wait:
+                self.send_json(202, job.to_dict(), {'Location': f"/jobs/{job.id}"})
+                return
+            job.done.wait()
+            if job.status == 'failed':
+                self.send_json(422, job.to_dict())
+            elif len(job.files) == 1:
+                self.send_file(job.output_dir / job.files[0])
+            else:
+                self.send_json(200, job.to_dict())
+
+
+        def send_json(self, code: int, data: dict, headers: dict[str, str] | None = None) -> None:
+            """ Send JSON response
+
+            Args:
+                code (int): HTTP status
+                data (dict): body
+                headers (dict[str, str] | None, optional): extra headers. Defaults to None.
+            """
+            import json
+            body = json.dumps(data, ensure_ascii=False).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+
+        def send_file(self, path: Path) -> None:
+            """ Send output file as attachment
+
+            Args:
+                path (Path): file path
+            """
+            import shutil
+            self.send_response(200)
+            self.send_header('Content-Type', self.CONTENT_TYPES.get(path.suffix, 'application/octet-stream'))
+            self.send_header('Content-Length', str(path.stat().st_size))
+            self.send_header('Content-Disposition', f'attachment; filename="{path.name}"')
+            self.end_headers()
+            with path.open('rb') as f:
+                shutil.copyfileobj(f, self.wfile)
+
+
+        def address_string(self) -> str:
+            # clients of a Unix socket have no address
+            return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    if args.socket:
+        Path(args.socket).unlink(missing_ok=True)
+        server_class = type('UnixHTTPServer', (socketserver.ThreadingMixIn, socketserver.UnixStreamServer), {'daemon_threads': True})
+        server = server_class(args.socket, ServiceRequestHandler)
+        address = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), ServiceRequestHandler)
+        address = f"http://{args.host}:{server.server_address[1]}"
+    server.service = service
+    print(f"cp2xlsx {VERSION} serving on {address}, work directory {workdir}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket:
+            Path(args.socket).unlink(missing_ok=True)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
 
 
 def main(args):
+    if args[1:2] == ["inspect"]:
+        sys.exit(inspect_main(args[2:]))
+    if args[1:2] == ["diff"]:
+        sys.exit(diff_main(args[2:]))
+    if args[1:2] == ["query"]:
+        sys.exit(query_main(args[2:]))
+    if args[1:2] == ["where-used"]:
+        sys.exit(where_used_main(args[2:]))
+    if args[1:2] == ["serve"]:
+        sys.exit(serve_main(args[2:]))
+
     def check_user_input(user_input: str) -> bool:
         user_input = user_input.lower()
         if user_input == "y":
@@ -633,6 +5113,7 @@ def main(args):
     print("https://github.com/a5trocat/cp2xlsx")
 
     parser = argparse.ArgumentParser(prog="cp2xlsx", description="Convert Check Point policy package to xlsx", formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-V", "--version", action="version", version=f"cp2xlsx {VERSION}")
     eg_group = parser.add_mutually_exclusive_group()
     eg_group.add_argument("-eg", "--export-global", action="store_true", help="export global firewall rules")
     eg_group.add_argument("-neg", "--no-export-global", action="store_true")
@@ -640,8 +5121,43 @@ def main(args):
     sm_group.add_argument("-sm", "--show-members", action="store_true", help="show group members")
     sm_group.add_argument("-nsm", "--no-show-members", action="store_true")
     parser.add_argument("-sg", "--save-groups", choices=["no", "policy", "all"], required=False, default=None, help="save group members to files (default: no)\npolicy: save groups only used in the policy\nall: save all groups")
-    parser.add_argument("file", help="path to policy package file", )
+    parser.add_argument("-sgf", "--save-groups-format", choices=["txt", "zip", "jsonl"], default="txt", help="saved groups format (default: txt)\ntxt: a file per group in the package directory\nzip: the same files in PackageName.groups.zip\njsonl: a line per group in PackageName.groups.jsonl")
+    parser.add_argument("-lm", "--low-memory", action="store_true", help="write rows to disk as they are generated (constant memory)")
+    parser.add_argument("--max-rows", type=int, default=XLSX_MAX_ROWS, help=f"rows per sheet; a longer rulebase is split at section boundaries into\nsheets Name (2), Name (3)... listed on an Index sheet (default: {XLSX_MAX_ROWS}, the xlsx limit)")
+    parser.add_argument("--shard-files", action="store_true", help="write the parts of a split rulebase after the first one to workbooks\nof their own, PackageName.Name (N).xlsx, concurrently")
+    parser.add_argument("--coverage", action="store_true", help="add a Rule coverage sheet: firewall rules shadowed by, redundant to\nor fully covered by earlier rules")
+    parser.add_argument("--no-stream", action="store_true", help="parse each archive file whole instead of streaming it")
+    parser.add_argument("--no-compact", action="store_true", help="keep whole exported objects in memory instead of the fields the converter reads")
+    parser.add_argument("--selective", action="store_true", help="read only archive members the outputs need (no Global layer without -eg,\nno gateway objects); with the cache later runs seek straight to them")
+    parser.add_argument("--incremental", action="store_true", help="keep rendered rows in the cache (implies --cache) and, converting into\nthe same directory again, render only rules that changed or use objects that changed")
+    add_cache_arguments(parser)
+    parser.add_argument("-b", "--batch", action="store_true", help="convert without prompts, implied by several files or a directory\nunset flags default to -eg -sm -sg no")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes for batch mode, archives with several policy packages\nand sheet rows of large policies (default: CPU count)")
+    parser.add_argument("-o", "--output-dir", default=".", help="output directory (default: current directory)\nin batch mode each archive gets its own subdirectory")
+    parser.add_argument("-f", "--format", action="append", choices=["xlsx", *RECORD_WRITERS], default=None, help="output format, may be repeated (default: xlsx)\ncsv, jsonl, parquet: a record per rule with untruncated cells\nand a table of objects; parquet needs pyarrow")
+    parser.add_argument("--metrics", default=None, help="write phase timings, peak memory and cache counters to a JSON file")
+    parser.add_argument("--profile", default=None, help="write cProfile stats of the conversion to a file\nin batch mode every archive gets its own file named after it")
+    parser.add_argument("file", nargs="+", help="path to policy package file or, in batch mode, files and directories with them")
     args = parser.parse_args()
+    formats = list(dict.fromkeys(args.format or ["xlsx"]))
+    if "parquet" in formats and not ParquetWriter.available():
+        parser.error("parquet output needs pyarrow: pip install pyarrow")
+    if not 2 <= args.max_rows <= XLSX_MAX_ROWS:
+        parser.error(f"--max-rows must be between 2 and {XLSX_MAX_ROWS}")
+    if args.incremental and args.no_cache:
+        parser.error("--incremental keeps rows in the cache, it cannot be used with --no-cache")
+    # rows of --incremental are kept in the cache, it implies --cache
+    args.cache = args.cache or args.incremental
+
+    cache = package_cache(args)
+
+    if args.batch or len(args.file) > 1 or Path(args.file[0]).is_dir():
+        sys.exit(batch_convert(
+            args.file, args.jobs, args.output_dir, metrics=args.metrics, profile=args.profile,
+            eg=not args.no_export_global, sm=not args.no_show_members, sg=args.save_groups or "no",
+            stream=not args.no_stream, low_memory=args.low_memory, cache=cache, formats=formats, compact=not args.no_compact, selective=args.selective, groups_format=args.save_groups_format, coverage=args.coverage,
+            max_rows=args.max_rows, shard_files=args.shard_files, incremental=args.incremental, count_lookups=bool(args.metrics)
+            ))
 
     if args.export_global == args.no_export_global:
         eg = None
@@ -674,12 +5190,36 @@ def main(args):
         sg = args.save_groups
 
     start_time = time.perf_counter()
-    cp = Cp2xlsx(args.file, eg, sm, sg)
-    file = cp.get_filename()
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        cp = Cp2xlsx(args.file[0], eg, sm, sg, stream=not args.no_stream, low_memory=args.low_memory, output_dir=args.output_dir, jobs=args.jobs, cache=cache, formats=formats, compact=not args.no_compact, selective=args.selective, groups_format=args.save_groups_format, coverage=args.coverage, max_rows=args.max_rows, shard_files=args.shard_files, incremental=args.incremental, count_lookups=bool(args.metrics))
+    except (PackageError, ValueError) as e:
+        print(e)
+        input("Press Enter to exit.")
+        sys.exit()
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+    files = ', '.join(cp.get_filenames())
     end_time = time.perf_counter()
-    print(f'File {file} was converted in {end_time - start_time: 0.2f} seconds.')
+    print(f'File {files} was converted in {end_time - start_time: 0.2f} seconds.')
+    if args.metrics:
+        cp.metrics.save(args.metrics)
+        print(f"Metrics saved to {args.metrics}")
+    if args.profile:
+        print(f"Profile saved to {args.profile}")
     input("Press Enter to exit.")
 
 
 if __name__ == "__main__":
+    # worker processes of a PyInstaller build start through this entry point too,
+    # freeze_support does nothing unless frozen so multiprocessing is not imported otherwise
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
     main(sys.argv)
@@ -0,0 +1,88 @@
+""" Fixtures shared by the tests: small archives made by benchmarks/synthetic.py
+"""
+import sys
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / 'benchmarks')]
+
+import synthetic  # noqa: E402
+
+# converts in about a second, groups nest three levels deep
+SMALL = {'objects': 400, 'groups': 60, 'depth': 3, 'fanout': 5, 'rules': 80, 'global_rules': 10, 'nat': 10, 'tp': 10, 'oversized': 0}
+OBJECTS = f'{synthetic.PACKAGE_NAME}_objects.json'
+LOCAL_FW = f'Network-{synthetic.DOMAIN}.json'
+# namespace of worksheet XML, see read_sheet
+NS = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+@pytest.fixture(scope='session')
+def archive(tmp_path_factory) -> Path:
+    """ Small synthetic archive
+    """
+    path = tmp_path_factory.mktemp('archives') / 'small.tar.gz'
+    synthetic.generate_archive(str(path), **SMALL)
+    return path
+
+
+@pytest.fixture
+def edit_archive(archive, tmp_path):
+    """ Function writing a copy of the small archive changed by a callback, which gets the member name to JSON document dict
+    """
+    def edit(change, name: str = 'edited.tar.gz') -> Path:
+        members = synthetic.read_archive(str(archive))
+        change(members)
+        path = tmp_path / name
+        synthetic.write_archive(str(path), members)
+        return path
+    return edit
+
+
+def access_rules(members: dict) -> list[dict]:
+    """ Rules of the Local FW rulebase of an archive read by synthetic.read_archive
+    """
+    return [entry for entry in members[LOCAL_FW] if entry.get('type') == 'access-rule']
+
+
+def add_huge_group(members: dict, name: str, hosts: int = 1500) -> str:
+    """ Add a group of new hosts whose member list overflows an xlsx cell, returns its uid
+    """
+    objects = members[OBJECTS]
+    uids = []
+    for i in range(hosts):
+        uid = f'{name}-host-{i}'
+        objects.append({'uid': uid, 'name': f'{name}_host_{i:06d}', 'type': 'host', 'ipv4-address': f'172.{16 + i // 65536}.{i // 256 % 256}.{i % 256}'})
+        uids.append(uid)
+    objects.append({'uid': name, 'name': name, 'type': 'group', 'members': [{'uid': uid} for uid in uids]})
+    return name
+
+
+def read_sheet(path, sheet: int = 1) -> tuple[list[tuple[str, list[tuple[str, str]]]], list[str]]:
+    """ Rows as (row reference, [(cell reference, text)]) in file order and merged ranges,
+    shared and inline strings read alike
+    """
+    with zipfile.ZipFile(path) as workbook:
+        names = workbook.namelist()
+        shared = []
+        if 'xl/sharedStrings.xml' in names:
+            shared = [''.join(si.itertext()) for si in ET.fromstring(workbook.read('xl/sharedStrings.xml')).findall('x:si', NS)]
+        root = ET.fromstring(workbook.read(f'xl/worksheets/sheet{sheet}.xml'))
+    rows = []
+    for row in root.iter(f"{{{NS['x']}}}row"):
+        cells = []
+        for cell in row.findall('x:c', NS):
+            value = cell.find('x:v', NS)
+            if cell.get('t') == 's':
+                text = shared[int(value.text)]
+            elif cell.get('t') == 'inlineStr':
+                text = ''.join(cell.find('x:is', NS).itertext())
+            else:
+                text = value.text if value is not None else ''
+            cells.append((cell.get('r'), text))
+        rows.append((row.get('r'), cells))
+    merges = [merge.get('ref') for merge in root.iter(f"{{{NS['x']}}}mergeCell")]
+    return rows, merges
@@ -0,0 +1,96 @@
+import ipaddress
+import random
+
+import pytest
+
+from main import AddressIndex, Cp2xlsx, WhereUsedIndex
+
+
+OBJECTS = [
+    {'uid': 'any', 'name': 'Any', 'type': 'CpmiAnyObject'},
+    {'uid': 'host', 'name': 'host', 'type': 'host', 'ipv4-address': '10.1.2.3'},
+    {'uid': 'net16', 'name': 'net16', 'type': 'network', 'subnet4': '10.1.0.0', 'mask-length4': 16},
+    {'uid': 'net24', 'name': 'net24', 'type': 'network', 'subnet4': '10.1.2.0', 'mask-length4': 24},
+    {'uid': 'other', 'name': 'other', 'type': 'network', 'subnet4': '10.2.0.0', 'mask-length4': 16},
+    {'uid': 'range', 'name': 'range', 'type': 'address-range', 'ipv4-address-first': '10.1.2.250', 'ipv4-address-last': '10.1.3.5'},
+    {'uid': 'host6', 'name': 'host6', 'type': 'host', 'ipv4-address': '', 'ipv6-address': '2001:db8::1'},
+    {'uid': 'net6', 'name': 'net6', 'type': 'network', 'subnet6': '2001:db8::', 'mask-length6': 32},
+    {'uid': 'inner', 'name': 'inner', 'type': 'group', 'members': ['host']},
+    {'uid': 'outer', 'name': 'outer', 'type': 'group', 'members': [{'uid': 'inner'}, {'uid': 'other'}]},
+]
+
+
+def rule(number: int, **fields) -> dict:
+    return {'uid': f'rule-{number}', 'type': 'access-rule', 'rule-number': number, 'name': f'rule {number}', **fields}
+
+
+PACKAGES = [{
+    'packageName': 'Package',
+    '_net_': [
+        {'uid': 'section', 'type': 'access-section', 'name': 'Section'},
+        rule(1, source=['outer'], destination=['any']),
+        rule(2, source=['any'], destination=['net16'], **{'destination-negate': True}),
+        rule(3, source=['net6'], destination=['range']),
+    ],
+    '_nat_': [
+        {'uid': 'nat-1', 'type': 'nat-rule', 'rule-number': 1, 'original-source': 'net24', 'translated-source': 'any'},
+    ],
+}]
+
+
+@pytest.fixture(scope='module')
+def index() -> AddressIndex:
+    return AddressIndex(WhereUsedIndex(OBJECTS, PACKAGES))
+
+
+@pytest.mark.parametrize('address, found', [
+    ('10.1.2.3', {'host', 'net16', 'net24'}),
+    # prefixes find what contains them, what they contain and ranges overlapping them
+    ('10.1.2.0/24', {'host', 'net16', 'net24', 'range'}),
+    ('10.1.3.1', {'net16', 'range'}),
+    ('10.0.0.0/8', {'host', 'net16', 'net24', 'other', 'range'}),
+    ('10.1.2.3/16', {'host', 'net16', 'net24', 'range'}),
+    ('192.0.2.1', set()),
+    ('2001:db8::1', {'host6', 'net6'}),
+    ('2001:db8:1::/48', {'net6'}),
+])
+def test_find_objects(index, address, found):
+    assert set(index.find_objects(address, include_any=False)) == found
+    assert set(index.find_objects(address)) == found | {'any'}
+
+
+def test_invalid_address(index):
+    with pytest.raises(ValueError):
+        index.find_objects('10.1.2.300')
+
+
+def test_query_follows_groups_in_policy_order(index):
+    matches = index.query('10.1.2.3')
+
+    assert [(match['sheet'], match['rule'], match['field'], match['object'], match['via'], match['negated']) for match in matches] == [
+        ('Local FW', '1', 'source', 'outer', 'host', False),
+        ('Local FW', '1', 'destination', 'Any', 'Any', False),
+        ('Local FW', '2', 'source', 'Any', 'Any', False),
+        ('Local FW', '2', 'destination', 'net16', 'net16', True),
+        # Any in a translated field keeps the original address, it is no match
+        ('NAT table', '1', 'original-source', 'net24', 'net24', False),
+    ]
+    assert [(match['rule'], match['field']) for match in index.query('10.1.2.3', include_any=False)] == [
+        ('1', 'source'), ('2', 'destination'), ('1', 'original-source'),
+    ]
+
+
+def test_find_objects_matches_a_scan_of_all_objects(archive):
+    index = Cp2xlsx.open(str(archive)).address_index()
+    networks = {}
+    for obj in index._where_used_:
+        for version, first, last, _ in AddressIndex.intervals(obj):
+            networks.setdefault(obj['uid'], []).append((version, first, last))
+    rnd = random.Random(0)
+    queries = [f'10.0.{rnd.randrange(256)}.{rnd.randrange(256)}/{rnd.choice([32, 28, 24, 20])}' for _ in range(50)]
+
+    for query in queries:
+        network = ipaddress.ip_network(query, strict=False)
+        first, last = int(network.network_address), int(network.broadcast_address)
+        expected = {uid for uid, intervals in networks.items() if any(v == 4 and a <= last and b >= first for v, a, b in intervals)}
+        assert set(index.find_objects(query, include_any=False)) == expected, query
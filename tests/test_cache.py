@@ -0,0 +1,76 @@
+import os
+
+import main
+from main import Cp2xlsx, MemoryPackageCache, PackageCache
+
+
+def test_second_load_is_a_cache_hit(archive, tmp_path):
+    cache = PackageCache(str(tmp_path))
+    first = Cp2xlsx.open(str(archive), cache=cache)
+    files = first.render(output_dir=str(tmp_path / 'first'), formats=['jsonl'])
+    second = Cp2xlsx.open(str(archive), cache=cache)
+
+    assert 'load_package' in first.metrics.phases and 'restore_state' not in first.metrics.phases
+    assert 'restore_state' in second.metrics.phases and 'load_package' not in second.metrics.phases
+    assert second._layers_ == first._layers_
+    for path, cached in zip(files, second.render(output_dir=str(tmp_path / 'second'), formats=['jsonl'])):
+        with open(path, 'rb') as a, open(cached, 'rb') as b:
+            assert a.read() == b.read()
+
+
+def test_other_cache_format_or_archive_is_a_miss(archive, edit_archive, tmp_path, monkeypatch):
+    cache = PackageCache(str(tmp_path / 'cache'))
+    Cp2xlsx.open(str(archive), cache=cache)
+    edited = edit_archive(lambda members: members['index.json'].update(comment='edited'))
+
+    assert 'load_package' in Cp2xlsx.open(str(edited), cache=cache).metrics.phases
+    key = PackageCache.key(str(archive))
+    monkeypatch.setattr(main, 'CACHE_FORMAT', main.CACHE_FORMAT + 1)
+    assert PackageCache.key(str(archive)) != key
+    assert 'load_package' in Cp2xlsx.open(str(archive), cache=cache).metrics.phases
+
+
+def test_state_of_another_layout_is_a_miss(archive, tmp_path):
+    cache = PackageCache(str(tmp_path))
+    Cp2xlsx.open(str(archive), cache=cache)
+    for path in tmp_path.glob('*.pickle'):
+        cache.save(path.stem, {'store': None})
+
+    assert 'load_package' in Cp2xlsx.open(str(archive), cache=cache).metrics.phases
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    state = {'data': b'x' * 1000}
+    cache = PackageCache(str(tmp_path), max_size=2500)
+    cache.save('a', state)
+    cache.save('b', state)
+    os.utime(tmp_path / 'a.pickle', (1000, 1000))
+    os.utime(tmp_path / 'b.pickle', (2000, 2000))
+    # a load makes a the most recently used
+    assert cache.load('a') == state
+    cache.save('c', state)
+
+    assert sorted(path.stem for path in tmp_path.glob('*.pickle')) == ['a', 'c']
+    assert cache.load('b') is None
+
+
+def test_memory_cache_keeps_max_entries(tmp_path):
+    cache = MemoryPackageCache(str(tmp_path), max_entries=2, persist=False)
+    for key in 'abc':
+        cache.save(key, {'key': key})
+        if key == 'b':
+            cache.load('a')
+
+    assert cache.entries() == 2
+    assert cache.load('b') is None
+    assert cache.load('a') == {'key': 'a'} and cache.load('c') == {'key': 'c'}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_memory_cache_falls_back_to_disk(tmp_path):
+    cache = MemoryPackageCache(str(tmp_path), max_entries=1)
+    cache.save('a', {'key': 'a'})
+    cache.save('b', {'key': 'b'})
+
+    assert cache.load('a') == {'key': 'a'}
+    assert cache.entries() == 1
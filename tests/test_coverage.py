@@ -0,0 +1,41 @@
+from conftest import LOCAL_FW
+from main import Cp2xlsx
+
+
+def rule(number: int, source: list[str], destination: list[str], action: str, destination_negate: bool = False) -> dict:
+    return {
+        'uid': f'coverage-rule-{number}', 'type': 'access-rule', 'rule-number': number, 'name': f'rule {number}',
+        'source': source, 'source-negate': False, 'destination': destination, 'destination-negate': destination_negate,
+        'vpn': ['any'], 'service': ['any'], 'service-negate': False, 'action': action, 'track': {'type': 'log'},
+        'time': ['any'], 'install-on': ['policy-targets'], 'enabled': True, 'comments': '', 'hits': {'value': 0},
+    }
+
+
+def negated_rules(members: dict) -> None:
+    # host-0 is 10.0.0.0, host-1 10.0.0.1, host-5 10.0.0.5
+    members[LOCAL_FW] = [
+        {'uid': 'coverage-section', 'type': 'access-section', 'name': 'Coverage'},
+        rule(1, ['any'], ['host-0'], 'drop', destination_negate=True),
+        rule(2, ['host-1'], ['host-5'], 'accept'),
+        rule(3, ['host-1'], ['host-0'], 'accept'),
+        rule(4, ['host-1'], ['host-0', 'host-5'], 'accept'),
+        rule(5, ['any'], ['host-0', 'host-1'], 'drop', destination_negate=True),
+        rule(6, ['host-1'], ['host-1'], 'accept'),
+    ]
+
+
+def test_negated_destination_covers_addresses_outside_it(edit_archive):
+    cp = Cp2xlsx.open(str(edit_archive(negated_rules)), eg=False)
+    coverage = cp.rule_coverage()
+
+    findings = {finding['rule']: (finding['status'], finding['by']) for finding in coverage.findings}
+    assert findings == {
+        # 10.0.0.5 is not 10.0.0.0
+        '2': ('shadowed', ['1']),
+        # rule 3, exactly the address rule 1 leaves out, is not covered, but with it rules 1 and 2 cover rule 4
+        '4': ('fully covered', ['1', '2', '3']),
+        # all but 10.0.0.0 and 10.0.0.1 is within all but 10.0.0.0
+        '5': ('redundant', ['1']),
+        # 10.0.0.1 is not 10.0.0.0 either, rule 5 leaves it out
+        '6': ('shadowed', ['1']),
+    }
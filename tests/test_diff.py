@@ -0,0 +1,78 @@
+from conftest import LOCAL_FW, access_rules
+from main import Cp2xlsx, PolicyDiff, diff_main
+
+
+def open_pair(old, new) -> PolicyDiff:
+    return PolicyDiff(Cp2xlsx.open(str(old), compact=False), Cp2xlsx.open(str(new), compact=False))
+
+
+def move_rule(members: dict) -> None:
+    # rule 41 goes first, the rules before it keep their relative order
+    table = members[LOCAL_FW]
+    rule = access_rules(members)[40]
+    table.remove(rule)
+    table.insert(1, rule)
+
+
+def test_moved_rule_is_the_only_change(archive, edit_archive):
+    diff = open_pair(archive, edit_archive(move_rule))
+
+    assert [(rule['change'], rule['new']['uid']) for rule in diff.rules] == [(['moved'], 'local-rule-41')]
+    assert diff.objects == []
+
+
+def test_moved_and_modified_rule(archive, edit_archive):
+    def change(members: dict) -> None:
+        move_rule(members)
+        access_rules(members)[0]['comments'] = 'moved up'
+
+    diff = open_pair(archive, edit_archive(change))
+
+    assert [(rule['change'], rule['new']['uid']) for rule in diff.rules] == [(['modified', 'moved'], 'local-rule-41')]
+
+
+def test_in_order_keeps_longest_increasing_run():
+    assert PolicyDiff.in_order([]) == set()
+    assert PolicyDiff.in_order([0, 1, 2, 3]) == {0, 1, 2, 3}
+    # 3 moved to the front
+    assert PolicyDiff.in_order([3, 0, 1, 2, 4]) == {0, 1, 2, 4}
+    # 1 moved to the end
+    assert PolicyDiff.in_order([0, 2, 3, 4, 1]) == {0, 2, 3, 4}
+
+
+def test_diff_command_writes_changed_rules(archive, edit_archive, tmp_path, capsys):
+    def change(members: dict) -> None:
+        rule = access_rules(members)[2]
+        rule['comments'] = 'changed'
+        rule['enabled'] = False
+        rule['destination-negate'] = True
+    new = edit_archive(change)
+
+    assert diff_main([str(archive), str(new), '-o', str(tmp_path / 'out')]) == 0
+
+    assert 'rules modified: 1' in capsys.readouterr().out
+    assert len(list((tmp_path / 'out').glob('diff-*.xlsx'))) == 1
+    diff = open_pair(archive, new)
+    rule = diff.rules[0]
+    old_cells = PolicyDiff.cells(diff.old, 'firewall', rule['old'])
+    new_cells = PolicyDiff.cells(diff.new, 'firewall', rule['new'])
+    assert new_cells[-2:] == ['changed', 'disabled, destination negated']
+    assert old_cells[:-2] == new_cells[:-2]
+
+
+def test_moved_place_holder_of_the_global_layer(archive, edit_archive, tmp_path, capsys):
+    def place_holder(position: int):
+        def change(members: dict) -> None:
+            members['Network-Global.json'].insert(position, {'uid': 'place-holder', 'type': 'place-holder', 'rule-number': position, 'name': 'Local'})
+        return change
+    old = edit_archive(place_holder(3), 'old.tar.gz')
+    new = edit_archive(place_holder(8), 'new.tar.gz')
+
+    assert diff_main([str(old), str(new), '-o', str(tmp_path / 'out')]) == 0
+
+    assert 'rules moved: 1' in capsys.readouterr().out
+    diff = open_pair(old, new)
+    rule, = diff.rules
+    assert (rule['change'], rule['rulebase'], rule['new']['uid']) == (['moved'], '_gnet_', 'place-holder')
+    cells = PolicyDiff.cells(diff.new, 'firewall', rule['new'])
+    assert cells == ['8', 'Local'] + [''] * (len(PolicyDiff.COLUMNS['firewall']) - 1)
@@ -0,0 +1,40 @@
+import re
+
+from conftest import access_rules, add_huge_group, read_sheet
+from main import Cp2xlsx
+
+
+def merged_rows(merges: list[str], col: str) -> list[tuple[int, int]]:
+    # first and last row of the ranges merged within one column
+    spans = [re.fullmatch(rf'{col}(\d+):{col}(\d+)', ref) for ref in merges]
+    return sorted((int(span[1]), int(span[2])) for span in spans if span)
+
+
+def test_source_and_destination_over_several_rows(edit_archive, tmp_path):
+    def oversized(members: dict) -> None:
+        rule = access_rules(members)[3]
+        rule['source'] = [add_huge_group(members, 'huge_source')]
+        rule['destination'] = [add_huge_group(members, 'huge_destination', 3000)]
+
+    files = Cp2xlsx.open(str(edit_archive(oversized)), eg=False).render(output_dir=str(tmp_path))
+    rows, merges = read_sheet(files[0])
+
+    (first, last), = [span for span in merged_rows(merges, 'A') if span[0] > 2]
+    height = last - first + 1
+    cells = {ref: text for _, row in rows for ref, text in row}
+    assert cells[f'A{first}'] == '4'
+    counts = []
+    for col, name, hosts in (('D', 'huge_source', 1500), ('E', 'huge_destination', 3000)):
+        chunks = [cells[f'{col}{row}'] for row in range(first, last + 1) if cells.get(f'{col}{row}')]
+        starts = [row for row in range(first, last + 1) if cells.get(f'{col}{row}')]
+        counts.append(len(chunks))
+        # every chunk but the last takes height // chunks rows, the last takes the rest
+        size = height // len(chunks)
+        assert starts == [first + i * size for i in range(len(chunks))]
+        spans = [(start, end - 1) for start, end in zip(starts, starts[1:] + [last + 1])]
+        assert [span for span in spans if span[1] > span[0]] == merged_rows(merges, col)
+        text = '\n'.join(chunks)
+        assert text.endswith(f'\n{name}')
+        assert all(f'{name}_host_{i:06d}' in text for i in range(hosts))
+    # the source chunks are stretched over the destination's rows unevenly, which made the merged ranges overlap
+    assert 1 < counts[0] < counts[1] == height and height % counts[0]
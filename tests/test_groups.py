@@ -0,0 +1,91 @@
+import json
+import os
+
+from conftest import OBJECTS, access_rules, read_sheet
+from main import Cp2xlsx, GroupClosures, ObjectStore
+import synthetic
+
+
+CYCLE = [
+    {'uid': 'cycle-a', 'name': 'cycle_a', 'type': 'group', 'members': [{'uid': 'cycle-b'}, {'uid': 'host-0'}]},
+    {'uid': 'cycle-b', 'name': 'cycle_b', 'type': 'group', 'members': [{'uid': 'cycle-a'}, {'uid': 'host-1'}]},
+    {'uid': 'cycle-self', 'name': 'cycle_self', 'type': 'group', 'members': [{'uid': 'cycle-self'}, {'uid': 'host-2'}]},
+]
+
+
+def add_cycles(members: dict) -> None:
+    members[OBJECTS].extend(CYCLE)
+    access_rules(members)[0]['source'] = ['cycle-a', 'cycle-self']
+
+
+def test_group_cycles_are_reported_once(archive):
+    members = synthetic.read_archive(str(archive))
+    add_cycles(members)
+    closures = GroupClosures(ObjectStore(members[OBJECTS]))
+
+    assert set(closures.get('cycle-a')) == {'cycle-a', 'cycle-b', 'host-0', 'host-1'}
+    assert set(closures.get('cycle-b')) == {'cycle-a', 'cycle-b', 'host-0', 'host-1'}
+    assert set(closures.get('cycle-self')) == {'cycle-self', 'host-2'}
+    assert sorted(map(sorted, closures.cycles)) == [['cycle-a', 'cycle-b'], ['cycle-self']]
+
+
+def test_groups_without_cycles_are_not_reported(archive):
+    members = synthetic.read_archive(str(archive))
+    closures = GroupClosures(ObjectStore(members[OBJECTS]))
+    groups = [obj['uid'] for obj in members[OBJECTS] if 'group' in obj['type']]
+
+    for uid in groups:
+        closure = closures.get(uid)
+        assert uid not in closure
+        assert len(closure) == len(set(closure))
+    assert closures.cycles == []
+
+
+def test_cyclic_groups_are_rendered(edit_archive, tmp_path):
+    cp = Cp2xlsx.open(str(edit_archive(add_cycles)), eg=False)
+    files = cp.render(output_dir=str(tmp_path / 'out'), formats=['jsonl'])
+
+    rules_file = next(name for name in files if name.endswith('.rules.jsonl'))
+    with open(rules_file, encoding='UTF-8') as f:
+        records = [json.loads(line) for line in f]
+    rule = next(record for record in records if record['rulebase'] == 'Local FW' and record['number'] == '1')
+    for name in ('cycle_a', 'cycle_b', 'cycle_self', 'host_000000_srv', 'host_000001_srv', 'host_000002_srv'):
+        assert name in rule['source']
+
+
+NESTED = [
+    {'uid': 'nest-inner', 'name': 'nest_inner', 'type': 'group', 'members': [{'uid': 'host-0'}, {'uid': 'host-1'}]},
+    {'uid': 'nest-outer', 'name': 'nest_outer', 'type': 'group', 'members': [{'uid': 'host-2'}, {'uid': 'nest-inner'}]},
+]
+
+
+def test_group_cells_do_not_depend_on_earlier_rules(edit_archive, tmp_path):
+    def change(members: dict) -> None:
+        members[OBJECTS].extend(NESTED)
+        for rule, source in zip(access_rules(members), (['nest-inner'], ['nest-outer'], ['nest-inner'])):
+            rule['source'] = source
+
+    files = Cp2xlsx.open(str(edit_archive(change)), eg=False).render(output_dir=str(tmp_path))
+    rows, _ = read_sheet(files[0])
+    sources = [dict(cells)[f'D{row}'] for row, cells in rows if row in ('3', '4', '5')]
+
+    # since 1.7.2 a repeated group and a group nested in another one show their names too
+    inner = 'host_000000_srv / 10.0.0.0\nhost_000001_srv / 10.0.0.1\nnest_inner'
+    assert sources == [inner, 'host_000002_srv / 10.0.0.2\n' + inner + '\nnest_outer', inner]
+
+
+def test_saved_groups_replace_the_old_directory(archive, tmp_path):
+    package_dir = tmp_path / synthetic.PACKAGE_NAME
+    package_dir.mkdir()
+    (package_dir / 'stale.txt').write_text('stale')
+    # left behind by a crashed run of a process with this pid
+    leftover = tmp_path / f'.{synthetic.PACKAGE_NAME}.{os.getpid()}.old'
+    leftover.mkdir()
+    (leftover / 'kept.txt').write_text('kept')
+    cp = Cp2xlsx.open(str(archive))
+
+    for _ in range(2):
+        cp.render(output_dir=str(tmp_path), sg='policy')
+        names = {path.name for path in package_dir.iterdir()}
+        assert 'stale.txt' not in names and names and all(name.endswith('.txt') for name in names)
+    assert sorted(path.name for path in tmp_path.iterdir() if path.name.startswith('.')) == [leftover.name]
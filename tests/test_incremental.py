@@ -0,0 +1,51 @@
+import zipfile
+
+from conftest import OBJECTS, access_rules
+from main import Cp2xlsx, PackageCache
+
+
+def edit_objects(members: dict) -> None:
+    objects = members[OBJECTS]
+    by_uid = {obj['uid']: obj for obj in objects}
+
+    def member_uids(group: dict) -> list[str]:
+        return [member['uid'] for member in group['members']]
+
+    def nested(group: dict, kind: str) -> dict:
+        return next(by_uid[uid] for uid in member_uids(group) if by_uid[uid]['type'] == kind)
+
+    # a host two groups deep gets another address
+    outer = next(obj for obj in objects if obj['type'] == 'group' and any(by_uid[uid]['type'] == 'group' for uid in member_uids(obj)))
+    host = nested(nested(outer, 'group'), 'host')
+    host['ipv4-address'] = '203.0.113.77'
+    # an object used by rules is deleted
+    used = sorted({uid for rule in access_rules(members) for uid in rule['source'] if by_uid.get(uid, {}).get('type') == 'host'} - {host['uid']})
+    objects.remove(by_uid[used[0]])
+    access_rules(members)[5]['comments'] = 'changed'
+
+
+def workbook_parts(path) -> dict[str, bytes]:
+    # creation time differs between runs
+    with zipfile.ZipFile(path) as workbook:
+        return {name: workbook.read(name) for name in workbook.namelist() if name != 'docProps/core.xml'}
+
+
+def test_incremental_run_after_object_edit_matches_full_conversion(archive, edit_archive, tmp_path):
+    cache = PackageCache(str(tmp_path / 'cache'))
+    output_dir = str(tmp_path / 'incremental')
+    Cp2xlsx.open(str(archive), cache=cache, incremental=True).render(output_dir=output_dir, formats=['xlsx', 'jsonl'])
+    edited = str(edit_archive(edit_objects))
+
+    cp = Cp2xlsx.open(edited, cache=cache, incremental=True)
+    files = cp.render(output_dir=output_dir, formats=['xlsx', 'jsonl'])
+    full = Cp2xlsx.open(edited).render(output_dir=str(tmp_path / 'full'), formats=['xlsx', 'jsonl'])
+
+    counters = cp.metrics.counters
+    assert counters['incremental.reused'] > 0 and counters['incremental.rendered'] > 0
+    assert len(files) == len(full) == 3
+    for incremental_file, full_file in zip(sorted(files), sorted(full)):
+        if incremental_file.endswith('.xlsx'):
+            assert workbook_parts(incremental_file) == workbook_parts(full_file)
+        else:
+            with open(incremental_file, 'rb') as a, open(full_file, 'rb') as b:
+                assert a.read() == b.read(), incremental_file
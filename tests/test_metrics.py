@@ -0,0 +1,16 @@
+from main import Cp2xlsx
+
+
+LOOKUP_COUNTERS = ('objects.lookups', 'object_strings.misses', 'rendered_cells.misses', 'used_groups.misses', 'group_closures.misses')
+
+
+def test_lookups_are_counted_only_on_request(archive, tmp_path):
+    plain = Cp2xlsx.open(str(archive))
+    plain.render(output_dir=str(tmp_path / 'plain'), formats=['xlsx', 'csv'])
+    counted = Cp2xlsx.open(str(archive), count_lookups=True)
+    counted.render(output_dir=str(tmp_path / 'counted'), formats=['xlsx', 'csv'])
+
+    assert not any(name in plain.metrics.counters for name in LOOKUP_COUNTERS)
+    assert all(counted.metrics.counters[name] > 0 for name in LOOKUP_COUNTERS)
+    for name in ('cells', 'rows', 'records', 'rows:Synthetic/Local FW'):
+        assert plain.metrics.counters[name] == counted.metrics.counters[name] > 0
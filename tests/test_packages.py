@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+
+from conftest import LOCAL_FW, OBJECTS, access_rules
+from main import Cp2xlsx, PackageError
+
+
+def uids(layer) -> list[str]:
+    return [entry['uid'] for entry in layer]
+
+
+def add_package(members: dict, global_layer: bool = True) -> None:
+    # the second package has its own Local FW and NAT and shares the Global FW if global_layer
+    index = members['index.json']
+    layers = [{'name': 'Network', 'domain': 'Second', 'htmlFileName': 'Network-Second.html'}]
+    if global_layer:
+        layers.insert(0, {'name': 'Network', 'domain': 'Global', 'htmlFileName': 'Network-Global.html'})
+    index['policyPackages'].append({
+        'packageName': 'Second',
+        'accessLayers': layers,
+        'natLayer': {'name': 'NAT', 'domain': 'Second', 'htmlFileName': 'NAT-Second.html'},
+    })
+    members['Network-Second.json'] = access_rules(members)[:3]
+    members['NAT-Second.json'] = []
+
+
+def test_packages_own_the_members_their_index_entries_name(edit_archive):
+    members = {}
+
+    def change(edited: dict) -> None:
+        add_package(edited, global_layer=False)
+        members.update(edited)
+
+    cp = Cp2xlsx.open(str(edit_archive(change)))
+    first, second = cp._packages_
+
+    assert (first['packageName'], second['packageName']) == ('Synthetic', 'Second')
+    assert uids(first['_net_']) == uids(members[LOCAL_FW])
+    assert uids(first['_gnet_']) == uids(members['Network-Global.json'])
+    assert uids(second['_net_']) == ['local-rule-1', 'local-rule-2', 'local-rule-3']
+    assert second['_nat_'] == []
+    assert second['_gnet_'] is None and second['_tp_'] is None
+
+
+def test_shared_layer_goes_to_every_package_naming_it(edit_archive, tmp_path):
+    cp = Cp2xlsx.open(str(edit_archive(add_package)))
+    first, second = cp._packages_
+
+    assert second['_gnet_'] is first['_gnet_']
+    files = cp.render(output_dir=str(tmp_path))
+    assert sorted(Path(path).name for path in files) == ['Second.xlsx', 'Synthetic.xlsx']
+
+
+def test_unclaimed_members_go_to_the_first_package(edit_archive):
+    def change(members: dict) -> None:
+        add_package(members)
+        # an export whose index entries do not name the rulebase files
+        for package in members['index.json']['policyPackages']:
+            for layer in package['accessLayers']:
+                layer['htmlFileName'] = 'unknown.html'
+            package['natLayer']['htmlFileName'] = 'unknown.html'
+            package.pop('threatLayers', None)
+
+    cp = Cp2xlsx.open(str(edit_archive(change)))
+    first, second = cp._packages_
+
+    assert first['_gnet_'] and first['_net_'] and first['_tp_'] is not None
+    assert all(second[attr] is None for attr in ('_gnet_', '_net_', '_nat_', '_tp_'))
+
+
+@pytest.mark.parametrize('change, message', [
+    (lambda members: members.pop('index.json'), 'index.json is not found'),
+    (lambda members: members.pop(OBJECTS), 'objects.json is not found'),
+    (lambda members: members['index.json'].update(policyPackages=[]), 'No policy packages'),
+])
+def test_incomplete_archive_raises(edit_archive, change, message):
+    with pytest.raises(PackageError, match=message):
+        Cp2xlsx.open(str(edit_archive(change)))
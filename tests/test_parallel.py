@@ -0,0 +1,54 @@
+import re
+
+import main
+from conftest import LOCAL_FW, OBJECTS, access_rules
+from main import Cp2xlsx, PackageCache
+from test_incremental import workbook_parts
+
+
+CYCLES = [
+    {'uid': 'cycle-a', 'name': 'cycle_a', 'type': 'group', 'members': [{'uid': 'cycle-b'}, {'uid': 'host-0'}]},
+    {'uid': 'cycle-b', 'name': 'cycle_b', 'type': 'group', 'members': [{'uid': 'cycle-a'}, {'uid': 'host-1'}]},
+    {'uid': 'cycle-c', 'name': 'cycle_c', 'type': 'group', 'members': [{'uid': 'cycle-d'}, {'uid': 'grp-3'}]},
+    {'uid': 'cycle-d', 'name': 'cycle_d', 'type': 'group', 'members': [{'uid': 'cycle-c'}, {'uid': 'cycle-a'}]},
+]
+
+
+def add_cycles(members: dict) -> None:
+    # sheets computed by different workers run into the same and into different cycles
+    members[OBJECTS].extend(CYCLES)
+    access_rules(members)[0]['source'] = ['cycle-b']
+    access_rules(members)[1]['destination'] = ['cycle-d']
+    next(entry for entry in members['Network-Global.json'] if entry['type'] == 'access-rule')['source'] = ['cycle-a']
+    members[LOCAL_FW].append(dict(access_rules(members)[2], uid='cycle-rule', source=['cycle-c']))
+
+
+def convert(path, jobs: int, tmp_path, capsys) -> tuple[Cp2xlsx, list[str]]:
+    output_dir = tmp_path / f'jobs{jobs}'
+    cp = Cp2xlsx(str(path), True, True, 'policy', quiet=False, jobs=jobs, output_dir=str(output_dir), cache=PackageCache(str(output_dir / 'cache')))
+    # without timings and progress bars
+    log = [line for line in capsys.readouterr().out.splitlines() if not re.search(r'\d\.\d+s|\|', line)]
+    return cp, log
+
+
+def test_sheet_workers_give_the_output_of_one_process(edit_archive, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(main, 'PARALLEL_SHEETS_MIN_RULES', 0)
+    path = edit_archive(add_cycles)
+    serial, serial_log = convert(path, 1, tmp_path, capsys)
+    parallel, parallel_log = convert(path, 2, tmp_path, capsys)
+
+    assert 'Synthetic/firewall_rows:Local FW' in parallel.metrics.phases
+    assert parallel_log == serial_log
+    assert [line for line in serial_log if line.startswith('Groups contain each other')] == [
+        'Groups contain each other: cycle_a, cycle_b',
+        'Groups contain each other: cycle_c, cycle_d',
+    ]
+    assert workbook_parts(tmp_path / 'jobs2' / 'Synthetic.xlsx') == workbook_parts(tmp_path / 'jobs1' / 'Synthetic.xlsx')
+    groups = sorted(path.name for path in (tmp_path / 'jobs1' / 'Synthetic').iterdir())
+    assert groups == sorted(path.name for path in (tmp_path / 'jobs2' / 'Synthetic').iterdir())
+    for name in groups:
+        assert (tmp_path / 'jobs2' / 'Synthetic' / name).read_bytes() == (tmp_path / 'jobs1' / 'Synthetic' / name).read_bytes()
+    # closures found by the workers are saved with the package
+    closures = [cp.cache.load(cp._cache_key_)['closures'] for cp in (serial, parallel)]
+    assert dict(closures[1]._closures_) == dict(closures[0]._closures_)
+    assert sorted(map(sorted, closures[1].cycles)) == sorted(map(sorted, closures[0].cycles))
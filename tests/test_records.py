@@ -0,0 +1,60 @@
+import csv
+import json
+from pathlib import Path
+
+from conftest import LOCAL_FW, OBJECTS, access_rules, add_huge_group
+from main import Cp2xlsx, XLSX_MAX_CELL
+import synthetic
+
+
+COMMENT = 'quoted "text", a comma,\na new line and ünïcödé'
+
+
+def edit_rule(members: dict) -> None:
+    rule = access_rules(members)[0]
+    rule.update(comments=COMMENT, enabled=False, source=[add_huge_group(members, 'huge_source')], destination=['grp-2'])
+    rule['source-negate'] = True
+
+
+def read_records(path: str) -> list[dict]:
+    if path.endswith('.csv'):
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            return list(csv.DictReader(f))
+    with open(path, encoding='UTF-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def as_csv(value) -> str:
+    return '' if value is None else str(value)
+
+
+def test_csv_and_jsonl_hold_the_same_records(edit_archive, tmp_path):
+    path = edit_archive(edit_rule)
+    cp = Cp2xlsx.open(str(path))
+    files = cp.render(output_dir=str(tmp_path), formats=['csv', 'jsonl'])
+    records = {Path(name).name: read_records(name) for name in files}
+    members = synthetic.read_archive(str(path))
+
+    rules, objects = records['Synthetic.rules.jsonl'], records['Synthetic.objects.jsonl']
+    assert list(rules[0]) == [name for name, _ in Cp2xlsx.RULE_COLUMNS]
+    assert list(objects[0]) == [name for name, _ in Cp2xlsx.OBJECT_COLUMNS]
+    for kind, jsonl in (('rules', rules), ('objects', objects)):
+        assert records[f'Synthetic.{kind}.csv'] == [{name: as_csv(value) for name, value in record.items()} for record in jsonl]
+
+    layers = ('Network-Global.json', LOCAL_FW, f'NAT-{synthetic.DOMAIN}.json', f'Standard Threat Prevention-{synthetic.DOMAIN}.json')
+    assert len(rules) == sum(1 for layer in layers for entry in members[layer] if 'section' not in entry['type'])
+    assert len(objects) == len(members[OBJECTS])
+    assert [record['rulebase'] for record in rules[:2]] == ['Global FW', 'Global FW']
+
+    record = next(record for record in rules if record['rulebase'] == 'Local FW')
+    assert (record['section'], record['type'], record['number']) == ('Section 1', 'rule', '1')
+    assert (record['enabled'], record['source_negate'], record['destination_negate']) == (False, True, False)
+    assert record['comments'] == COMMENT
+    # never split, unlike the xlsx cell
+    assert len(record['source']) > XLSX_MAX_CELL
+    assert record['source'].endswith('\nhuge_source') and 'huge_source_host_001499 / 172.16.5.219' in record['source']
+
+    group = next(record for record in objects if record['uid'] == 'grp-2')
+    member_names = [cp.object_to_str(member['uid']) for member in next(obj for obj in members[OBJECTS] if obj['uid'] == 'grp-2')['members']]
+    assert (group['type'], group['value'], group['members']) == ('group', group['name'], '\n'.join(member_names))
+    assert record['destination'].endswith('\n' + group['name'])
@@ -0,0 +1,59 @@
+import shutil
+
+import pytest
+
+from main import ConversionService, MemoryPackageCache, PackageCache
+
+
+@pytest.fixture
+def service_factory(tmp_path):
+    services = []
+
+    def create(archive_root=None) -> ConversionService:
+        cache = MemoryPackageCache(str(tmp_path / 'cache'), persist=False)
+        service = ConversionService(tmp_path / 'work', cache, workers=1, archive_root=archive_root)
+        services.append(service)
+        return service
+    yield create
+    for service in services:
+        service.close()
+
+
+def test_archive_paths_need_a_root(service_factory, archive):
+    service = service_factory()
+
+    with pytest.raises(ValueError, match="not allowed"):
+        service.server_archive(str(archive))
+
+
+def test_archive_paths_stay_under_the_root(service_factory, archive, tmp_path):
+    root = tmp_path / 'archives'
+    (root / 'team').mkdir(parents=True)
+    shutil.copy(archive, root / 'team' / 'policy.tar.gz')
+    (root / 'outside.tar.gz').symlink_to(archive)
+    service = service_factory(root)
+
+    assert service.server_archive('team/policy.tar.gz') == (root / 'team' / 'policy.tar.gz').resolve()
+    assert service.server_archive(str(root / 'team' / 'policy.tar.gz')) == (root / 'team' / 'policy.tar.gz').resolve()
+    for path in (str(archive), '../small.tar.gz', 'team/../../archives/../x', 'outside.tar.gz', '/etc/passwd'):
+        with pytest.raises(ValueError, match="outside of the archive root"):
+            service.server_archive(path)
+    with pytest.raises(ValueError, match="no archive"):
+        service.server_archive('team')
+
+
+def test_job_hashes_archive_once(service_factory, archive, tmp_path, monkeypatch):
+    hashed = []
+    key = PackageCache.key
+
+    def counting_key(package: str, variant: str = '') -> str:
+        hashed.append(package)
+        return key(package, variant)
+    monkeypatch.setattr(PackageCache, 'key', staticmethod(counting_key))
+    service = service_factory()
+
+    job = service.submit(archive, service.parse_options({'format': 'jsonl'}))
+    job.done.wait()
+
+    assert job.status == 'done', job.error
+    assert hashed == [str(archive)]
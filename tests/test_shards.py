@@ -0,0 +1,71 @@
+import xml.etree.ElementTree as ET
+import zipfile
+
+import pytest
+
+from conftest import LOCAL_FW, NS, access_rules, add_huge_group, read_sheet
+from main import Cp2xlsx
+
+
+def sheet_names(path) -> list[str]:
+    with zipfile.ZipFile(path) as workbook:
+        root = ET.fromstring(workbook.read('xl/workbook.xml'))
+    return [sheet.get('name') for sheet in root.iter(f"{{{NS['x']}}}sheet")]
+
+
+def first_column(path, sheet: int) -> list[str]:
+    # column A of every row below the header: section names and rule numbers
+    rows, _ = read_sheet(path, sheet)
+    return [dict(cells).get(f'A{ref}', '') for ref, cells in rows if ref != '1']
+
+
+def add_sections(members: dict, size: int) -> None:
+    # a section before every size rules of the Local FW
+    rules = access_rules(members)
+    members[LOCAL_FW] = []
+    for i, rule in enumerate(rules):
+        if i % size == 0:
+            members[LOCAL_FW].append({'uid': f'section-{i}', 'type': 'access-section', 'name': f'Section {i // size + 1}'})
+        members[LOCAL_FW].append(rule)
+
+
+def local_fw_shards(path) -> list[tuple[str, list[str]]]:
+    names = sheet_names(path)
+    return [(name, first_column(path, i)) for i, name in enumerate(names, 1) if name.startswith('Local FW')]
+
+
+def test_sheets_end_before_a_section_that_does_not_fit(edit_archive, tmp_path):
+    path = edit_archive(lambda members: add_sections(members, 12))
+    files = Cp2xlsx.open(str(path), eg=False, sm=False).render(output_dir=str(tmp_path), max_rows=30)
+    shards = local_fw_shards(files[0])
+
+    # header, two sections of 13 rows, the third would end on row 40
+    assert [name for name, _ in shards] == ['Local FW', 'Local FW (2)', 'Local FW (3)', 'Local FW (4)']
+    assert all(len(column) == 26 for _, column in shards[:3]) and len(shards[3][1]) == 9
+    assert all(column[0].startswith('Section') and column[13].startswith('Section') for _, column in shards[:3])
+    numbers = [cell for _, column in shards for cell in column if not cell.startswith('Section')]
+    assert numbers == [str(number) for number in range(1, 81)]
+
+
+def test_section_longer_than_a_sheet_is_split_between_rules(archive, tmp_path):
+    files = Cp2xlsx.open(str(archive), eg=False, sm=False).render(output_dir=str(tmp_path), max_rows=30)
+    names = sheet_names(files[0])
+    shards = local_fw_shards(files[0])
+
+    # the only section has 80 rules, a sheet takes the header and 29 rows
+    assert [len(column) for _, column in shards] == [29, 29, 23]
+    assert shards[0][1][0] == 'Section 1' and shards[1][1][0] == '29' and shards[2][1][0] == '58'
+    assert names[-1] == 'Index'
+    index = [[text for _, text in cells] for _, cells in read_sheet(files[0], len(names))[0][1:]]
+    assert [row[:2] + row[4:] for row in index if row[0] == 'Local FW'] == [
+        ['Local FW', '1', '1', '28', '29'], ['Local FW', '2', '29', '57', '29'], ['Local FW', '3', '58', '80', '23'],
+    ]
+
+
+def test_rule_taller_than_a_sheet_raises(edit_archive, tmp_path):
+    def oversized(members: dict) -> None:
+        access_rules(members)[3]['source'] = [add_huge_group(members, 'huge_source', 3000)]
+
+    cp = Cp2xlsx.open(str(edit_archive(oversized)), eg=False)
+    with pytest.raises(ValueError, match=r'Local FW rule 4 takes \d+ rows, max rows must be at least'):
+        cp.render(output_dir=str(tmp_path), max_rows=2)
@@ -0,0 +1,12 @@
+import startup
+
+# startup.DEFAULT_BUDGET is for a quiet machine, tests share it with other work
+BUDGET = 250.0
+
+
+def test_quick_commands_start_light(archive):
+    bare, results = startup.check_startup(archive, repeat=3, budget=BUDGET)
+
+    for result in results:
+        assert not result['heavy'], f"{result['name']} imports {', '.join(result['heavy'])}"
+        assert not result['over'], f"{result['name']} took {(result['wall'] - bare) * 1000:.0f} ms over the interpreter start, budget {BUDGET:.0f} ms"
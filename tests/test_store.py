@@ -0,0 +1,25 @@
+from main import CompactObject, Cp2xlsx
+
+
+def test_compact_objects_keep_the_fields_read_and_share_uid_strings(archive):
+    store = Cp2xlsx.open(str(archive))._store_
+    group = next(obj for obj in store if obj['type'] == 'group')
+
+    assert isinstance(group, CompactObject)
+    assert 'meta-info' not in group and group.get('color') is None
+    assert isinstance(group['members'], tuple)
+    # a member is the uid string of the member object itself, not a copy or an id
+    for uid in group['members']:
+        assert uid is store.get(uid)['uid']
+
+
+def test_compact_object_reads_like_the_exported_dict():
+    exported = {'uid': 'h', 'name': 'host', 'type': 'host', 'ipv4-address': '10.0.0.1', 'color': 'black', 'tags': []}
+    group = {'uid': 'g', 'name': 'group', 'type': 'group', 'members': [{'uid': 'h'}, 'x']}
+    strings = {}
+    host, compact_group = CompactObject(exported, strings), CompactObject(group, strings)
+
+    assert host == {'uid': 'h', 'name': 'host', 'type': 'host', 'ipv4-address': '10.0.0.1'}
+    assert host['ipv4-address'] == host.get('ipv4-address') == '10.0.0.1'
+    assert compact_group['members'] == ('h', 'x') and compact_group['members'][0] is host['uid']
+    assert 'subnet4' not in host and host.get('subnet4', 'none') == 'none'
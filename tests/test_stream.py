@@ -0,0 +1,57 @@
+import io
+import json
+
+import pytest
+
+from main import Cp2xlsx, iter_json_array
+
+
+DOCUMENT = [
+    {'uid': 'a', 'name': 'host é中\U0001f600', 'members': [{'uid': 'b'}, {'uid': 'c'}]},
+    12345678901234567890,
+    -1.5e-300,
+    'text with ] , [ and "quotes"',
+    True,
+    None,
+    [],
+    {},
+    [[1, 2], {'nested': [3, {'deep': 'x' * 300}]}],
+]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 16, 64, 1 << 16])
+def test_elements_split_at_every_chunk_boundary(chunk_size):
+    for separators in ((',', ':'), (', ', ': ')):
+        text = json.dumps(DOCUMENT, ensure_ascii=False, separators=separators)
+        data = f' \n\t{text}\r\n'.encode()
+        assert list(iter_json_array(io.BytesIO(data), chunk_size)) == DOCUMENT
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 1 << 16])
+def test_numbers_at_the_end_of_a_chunk_are_not_cut(chunk_size):
+    data = b'[1, 22, 333, 4444, 55555]'
+    assert list(iter_json_array(io.BytesIO(data), chunk_size)) == [1, 22, 333, 4444, 55555]
+
+
+def test_empty_array_and_non_array_documents():
+    assert list(iter_json_array(io.BytesIO(b' [ ] '), 1)) == []
+    assert list(iter_json_array(io.BytesIO(b''), 1)) == []
+    assert list(iter_json_array(io.BytesIO(b'{"a": [1, 2]}'), 2)) == [{'a': [1, 2]}]
+
+
+def test_array_already_opened():
+    assert list(iter_json_array(io.BytesIO(b'1, 2]'), 1, started=True)) == [1, 2]
+
+
+@pytest.mark.parametrize('data', [b'[1, 2', b'[{"a": 1}, {"b": ', b'[1, 2,'])
+def test_unterminated_array_raises(data):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.BytesIO(data), 2))
+
+
+def test_stream_mode_loads_what_whole_documents_do(archive):
+    streamed = Cp2xlsx.open(str(archive), stream=True, compact=False)
+    whole = Cp2xlsx.open(str(archive), stream=False, compact=False)
+
+    assert streamed._layers_ == whole._layers_
+    assert sorted(obj['uid'] for obj in streamed._store_) == sorted(obj['uid'] for obj in whole._store_)
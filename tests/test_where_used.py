@@ -0,0 +1,63 @@
+from main import Cp2xlsx, WhereUsedIndex
+
+
+OBJECTS = [
+    {'uid': 'any', 'name': 'Any', 'type': 'CpmiAnyObject'},
+    {'uid': 'accept', 'name': 'Accept', 'type': 'RulebaseAction'},
+    {'uid': 'used-host', 'name': 'used_host', 'type': 'host', 'ipv4-address': '10.0.0.1'},
+    {'uid': 'nested-host', 'name': 'nested_host', 'type': 'host', 'ipv4-address': '10.0.0.2'},
+    {'uid': 'idle-host', 'name': 'idle_host', 'type': 'host', 'ipv4-address': '10.0.0.3'},
+    {'uid': 'idle-member', 'name': 'idle_member', 'type': 'host', 'ipv4-address': '10.0.0.4'},
+    {'uid': 'service', 'name': 'service', 'type': 'service-tcp', 'port': '443'},
+    {'uid': 'inner', 'name': 'inner', 'type': 'group', 'members': ['nested-host']},
+    {'uid': 'outer', 'name': 'outer', 'type': 'group', 'members': [{'uid': 'inner'}]},
+    {'uid': 'idle-group', 'name': 'idle_group', 'type': 'group', 'members': ['idle-member', 'used-host']},
+    {'uid': 'service-group', 'name': 'service_group', 'type': 'service-group', 'members': ['service']},
+]
+GATEWAYS = [{'uid': 'gw', 'name': 'gw', 'type': 'simple-gateway', 'ipv4-address': '192.0.2.1'}]
+PACKAGES = [{
+    'packageName': 'Package',
+    '_gnet_': [
+        {'uid': 'global-rule', 'type': 'access-rule', 'rule-number': 1, 'name': 'global', 'source': ['outer'], 'destination': ['any'],
+         'action': 'accept', 'track': {'type': 'log'}},
+        {'uid': 'placeholder', 'type': 'place-holder', 'rule-number': 2, 'name': 'placeholder'},
+    ],
+    '_net_': [
+        {'uid': 'section', 'type': 'access-section', 'name': 'Section'},
+        {'uid': 'local-rule', 'type': 'access-rule', 'rule-number': 2, 'name': 'local', 'source': [{'uid': 'used-host'}],
+         'destination': ['outer'], 'service': ['service-group'], 'install-on': ['gw']},
+    ],
+}]
+
+
+def test_unused_objects_and_groups():
+    index = WhereUsedIndex(OBJECTS, PACKAGES, GATEWAYS)
+
+    # a member of an unused group is unused too, unless a rule uses it elsewhere
+    assert index.unused() == (['idle-host', 'idle-member'], ['idle-group'])
+    assert {'nested-host', 'inner', 'service', 'gw'} <= index.used()
+
+
+def test_where_used_through_nested_groups():
+    index = WhereUsedIndex(OBJECTS, PACKAGES, GATEWAYS)
+    found = index.where_used('nested-host')
+
+    assert found['groups'] == ['inner', 'outer']
+    assert [(rule['sheet'], rule['rule'], rule['field'], rule['via']) for rule in found['rules']] == [
+        ('Global FW', '1', 'source', 'outer'),
+        ('Local FW', '2', 'destination', 'outer'),
+    ]
+    assert index.where_used('idle-host') == {'groups': [], 'rules': []}
+    assert index.where_used('used-host')['groups'] == ['idle-group']
+
+
+def test_index_is_built_on_first_use(archive):
+    cp = Cp2xlsx.open(str(archive))
+    assert cp._where_used_ is None and 'where_used' not in cp.metrics.phases
+
+    index = cp.where_used()
+    assert cp.where_used() is index
+    assert cp.metrics.phases['where_used']['calls'] == 1
+    objects, groups = index.unused()
+    # synthetic rules use some objects of every kind
+    assert 0 < len(objects) + len(groups) < len(index)
@@ -0,0 +1,68 @@
+import pytest
+import xlsxwriter
+from xlsxwriter.exceptions import OverlappingRange
+
+from conftest import access_rules, add_huge_group, read_sheet
+from main import Cp2xlsx, RowOrderedWorksheet
+
+
+def test_block_is_emitted_in_row_order(tmp_path):
+    path = tmp_path / 'ordered.xlsx'
+    wb = xlsxwriter.Workbook(str(path), {'constant_memory': True})
+    ws = RowOrderedWorksheet(wb.add_worksheet())
+    wrap = wb.add_format({'text_wrap': True})
+    # a rule row: the merged cell first, then the chunks of the rows it spans, bottom up
+    ws.merge_range(0, 0, 2, 0, 'rule', wrap)
+    ws.write(2, 1, 'c')
+    ws.write(1, 1, 'b')
+    ws.write(0, 1, 'a')
+    ws.set_row(1, 30)
+    # the next block flushes the first
+    ws.write_row(3, 0, ['next', 'd'])
+    # the caller flushes the last block before closing, see Cp2xlsx.finish_worksheet
+    ws.flush()
+    wb.close()
+
+    rows, merges = read_sheet(path)
+    assert rows == [
+        ('1', [('A1', 'rule'), ('B1', 'a')]),
+        ('2', [('A2', ''), ('B2', 'b')]),
+        ('3', [('A3', ''), ('B3', 'c')]),
+        ('4', [('A4', 'next'), ('B4', 'd')]),
+    ]
+    assert merges == ['A1:A3']
+
+
+def test_merge_checks():
+    wb = xlsxwriter.Workbook('unused.xlsx', {'in_memory': True})
+    ws = RowOrderedWorksheet(wb.add_worksheet())
+    ws.merge_range(0, 0, 2, 1, 'a')
+
+    with pytest.raises(OverlappingRange):
+        ws.merge_range(2, 1, 3, 1, 'b')
+    with pytest.raises(ValueError):
+        ws.merge_range(4, 0, 4, 0, 'single cell')
+    with pytest.raises(ValueError):
+        ws.merge_range(4, 1, 3, 1, 'upside down')
+    # ranges of the next block may reuse columns
+    ws.merge_range(3, 0, 4, 1, 'c')
+    assert ws.merge == [[0, 0, 2, 1]]
+    ws.flush()
+    assert ws.merge == [[0, 0, 2, 1], [3, 0, 4, 1]]
+
+
+def test_low_memory_workbook_has_the_cells_of_a_normal_one(edit_archive, tmp_path):
+    def oversized(members: dict) -> None:
+        # source and destination span several rows, the other cells of the rule are merged over them
+        rule = access_rules(members)[3]
+        rule['source'].append(add_huge_group(members, 'huge_source'))
+        rule['destination'].append(add_huge_group(members, 'huge_destination', 3000))
+
+    cp = Cp2xlsx.open(str(edit_archive(oversized)))
+    normal = cp.render(output_dir=str(tmp_path / 'normal'))
+    low_memory = cp.render(output_dir=str(tmp_path / 'low'), low_memory=True)
+
+    assert len(normal) == len(low_memory) == 1
+    assert any(ref.startswith('A6:A') for ref in read_sheet(normal[0], 2)[1])
+    for sheet in range(1, 5):
+        assert read_sheet(low_memory[0], sheet) == read_sheet(normal[0], sheet)